@@ -17,8 +17,20 @@ from future import standard_library
 standard_library.install_aliases()
 from builtins import *
 
+import collections
+import concurrent.futures
+import random
+import threading
+import time
 import uuid
 
+try:
+    from time import monotonic as _monotonic
+except ImportError:
+    from time import time as _monotonic
+
+import requests
+
 from . import config
 from . import base
 
@@ -26,8 +38,23 @@ from . import base
 ### Constants ###
 
 _WAIT_SLEEP = 0.1
+_WAIT_SLEEP_MAX = 2.0
+_WAIT_BACKOFF = 2.0
+_WAIT_JITTER = 0.25
 _DEFAULT_TIMEOUT = 60
 
+# Tokens carry no expiry of their own, so keep this well under the
+# servers' token lifetime
+_TOKEN_TTL = 30
+_TOKEN_CACHE_SIZE = 1024
+
+_MAX_WORKERS = 16
+_PERMISSIONS_BATCH_SIZE = 100
+_STATUS_NO_BATCH = (404, 405, 501)
+# A server found without a batch endpoint is offered it again after this
+# many seconds, in case it has been upgraded since
+_BATCH_RETRY = 600
+
 _EP_BOOTSTRAP = "bootstrap"
 
 _KEY_ACCOUNTS = "accounts"
@@ -36,12 +63,15 @@ _KEY_CLIENTS = "clients"
 _KEY_CLIENTS_CERTS = "{}_certs".format(_KEY_CLIENTS)
 
 _EP_AUTHORIZATIONS = "authorizations"
+_EP_AUTHORIZATIONS_BATCH = "{}/batch".format(_EP_AUTHORIZATIONS)
 _KEY_AUTHORIZATIONS = "authorizations"
 _KEY_AUTHORIZATIONS_STATUS = "status"
 _KEY_AUTHORIZATIONS_TOKEN = "token"
 _VAL_AUTHORIZATIONS_STATUS_PENDING = 'pending'
 _VAL_AUTHORIZATIONS_STATUS_GRANTED = 'approved'
 _VAL_AUTHORIZATIONS_STATUS_DENIED = 'denied'
+_PARAM_AUTHORIZATIONS_WAIT = "wait"
+_PARAM_AUTHORIZATIONS_UIDS = "uids"
 
 _EP_AUTHENTICATORS = "authenticators"
 _KEY_AUTHENTICATORS = "authenticators"
@@ -50,8 +80,11 @@ _EP_VERIFIERS = "verifiers"
 _KEY_VERIFIERS = "verifiers"
 
 _EP_PERMISSIONS = "permissions"
+_EP_PERMISSIONS_BATCH = "{}/batch".format(_EP_PERMISSIONS)
 _KEY_PERMISSIONS = "permissions"
 
+_KEY_ERROR = "error"
+
 
 ### Exceptions ###
 
@@ -73,6 +106,145 @@ class AuthorizationFailed(AuthorizationException):
         msg = "Authorization '{}' failed: {}".format(uid, status)
         super().__init__(msg)
 
+class AuthorizationCancelled(AuthorizationException):
+
+    def __init__(self, uid=None):
+        if uid:
+            msg = "Authorization '{}' cancelled while pending".format(uid)
+        else:
+            msg = "Authorization cancelled while pending"
+        super().__init__(msg)
+
+class PermissionsBatchException(base.ClientException):
+    pass
+
+
+### Polling Objects ###
+
+class PollingStrategy(object):
+
+    def __init__(self, initial=_WAIT_SLEEP, maximum=_WAIT_SLEEP_MAX,
+                 backoff=_WAIT_BACKOFF, jitter=_WAIT_JITTER, long_poll=None):
+
+        # Check Args
+        if initial <= 0:
+            raise ValueError("initial must be positive")
+        if maximum < initial:
+            raise ValueError("maximum must be at least initial")
+        if backoff < 1:
+            raise ValueError("backoff must be at least 1")
+        if not (0 <= jitter < 1):
+            raise ValueError("jitter must be in [0, 1)")
+        if long_poll is not None and long_poll <= 0:
+            raise ValueError("long_poll must be positive")
+
+        # Call Parent
+        super().__init__()
+
+        # Setup Properties
+        self._initial = initial
+        self._maximum = maximum
+        self._backoff = backoff
+        self._jitter = jitter
+        self._long_poll = long_poll
+
+    @property
+    def long_poll(self):
+        return self._long_poll
+
+    def delays(self):
+        # Exponential backoff, capped, with +/- jitter to spread out pollers
+        delay = self._initial
+        while True:
+            spread = delay * self._jitter
+            yield min(delay + random.uniform(-spread, spread), self._maximum)
+            delay = min(delay * self._backoff, self._maximum)
+
+    def wait_param(self, remaining):
+        # Server-side wait to request, if long polling is enabled
+        if self._long_poll is None:
+            return None
+        return max(min(self._long_poll, remaining), 0)
+
+_DEFAULT_POLLING = PollingStrategy()
+
+
+### Cache Objects ###
+
+class TokenCache(object):
+
+    def __init__(self, ttl=_TOKEN_TTL, max_size=_TOKEN_CACHE_SIZE):
+
+        # Check Args
+        if ttl <= 0:
+            raise ValueError("ttl must be positive")
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        # Call Parent
+        super().__init__()
+
+        # Setup Properties
+        self._ttl = ttl
+        self._max_size = max_size
+        self._tokens = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tokens)
+
+    @property
+    def ttl(self):
+        return self._ttl
+
+    def _key(self, ac_connection, objtype, objperm, objuid):
+        # Tokens are bound to the client identity as well as the server
+        return (ac_connection.server_name,
+                str(ac_connection.account_uid), str(ac_connection.client_uid),
+                objtype, objperm, str(objuid) if objuid else "")
+
+    def get(self, ac_connection, objtype, objperm, objuid=None):
+
+        key = self._key(ac_connection, objtype, objperm, objuid)
+        with self._lock:
+            entry = self._tokens.pop(key, None)
+            if entry is None:
+                return None
+            token, expires = entry
+            if _monotonic() >= expires:
+                return None
+            self._tokens[key] = entry
+            return token
+
+    def put(self, ac_connection, objtype, objperm, objuid, token):
+
+        key = self._key(ac_connection, objtype, objperm, objuid)
+        with self._lock:
+            self._tokens.pop(key, None)
+            self._tokens[key] = (token, _monotonic() + self._ttl)
+            while len(self._tokens) > self._max_size:
+                self._tokens.popitem(last=False)
+
+    def invalidate(self, objtype=None, objperm=None, objuid=None, server_name=None):
+
+        # Drop every token matching the given fields, None matches all
+        objuid = str(objuid) if objuid else None
+        with self._lock:
+            for key in list(self._tokens.keys()):
+                if server_name is not None and key[0] != server_name:
+                    continue
+                if objtype is not None and key[3] != objtype:
+                    continue
+                if objperm is not None and key[4] != objperm:
+                    continue
+                if objuid is not None and key[5] != objuid:
+                    continue
+                del self._tokens[key]
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+
 
 ### Connection Objects ###
 
@@ -101,6 +273,11 @@ class ACServerConnection(base.ServerConnection):
 
 ### Client Objects ###
 
+# Batch endpoints seen missing, by (server URL, endpoint), to when they
+# are next tried
+_BATCH_UNSUPPORTED = {}
+_BATCH_UNSUPPORTED_LOCK = threading.Lock()
+
 class AccessControlClient(object):
 
     def __init__(self, ac_connection):
@@ -119,6 +296,29 @@ class AccessControlClient(object):
     def ac_connection(self):
         return self._ac_connection
 
+    def _batch_supported(self, ep):
+        key = (self._ac_connection.url_srv, ep)
+        with _BATCH_UNSUPPORTED_LOCK:
+            retry = _BATCH_UNSUPPORTED.get(key)
+            if retry is None:
+                return True
+            if _monotonic() >= retry:
+                del _BATCH_UNSUPPORTED[key]
+                return True
+            return False
+
+    def _error_status(self, err):
+        return getattr(err.response, 'status_code', None)
+
+    def _batch_missing(self, ep, err):
+        # True, and remembered, if err says the server has no such endpoint
+        status = self._error_status(err)
+        if status not in _STATUS_NO_BATCH:
+            return False
+        with _BATCH_UNSUPPORTED_LOCK:
+            _BATCH_UNSUPPORTED[(self._ac_connection.url_srv, ep)] = _monotonic() + _BATCH_RETRY
+        return True
+
 class BootstrapClient(AccessControlClient):
 
     def account(self, account_userdata=None, account_uid=None,
@@ -153,40 +353,165 @@ class BootstrapClient(AccessControlClient):
 
 class AuthorizationsClient(AccessControlClient):
 
-    def request(self, obj_type, obj_perm, obj_uid=None, userdata=None):
+    def _request_json(self, obj_type, obj_perm, obj_uid=None, userdata=None):
 
         if userdata is None:
             userdata = {}
 
-        ep = "{}".format(_EP_AUTHORIZATIONS)
-
         json_out = {'objperm': obj_perm,
                     'objtype': obj_type,
                     'objuid': str(obj_uid) if obj_uid else "",
                     'userdata': userdata}
+        return json_out
+
+    def request(self, obj_type, obj_perm, obj_uid=None, userdata=None):
+
+        ep = "{}".format(_EP_AUTHORIZATIONS)
+
+        json_out = self._request_json(obj_type, obj_perm, obj_uid=obj_uid, userdata=userdata)
 
         res = self._ac_connection.http_post(ep, json=json_out)
         return uuid.UUID(res[_KEY_AUTHORIZATIONS][0])
 
-    def fetch(self, authz_uid):
+    def request_many(self, specs, userdata=None, max_workers=_MAX_WORKERS):
+
+        # Each spec is (obj_type, obj_perm) or (obj_type, obj_perm, obj_uid).
+        # Returns (authz_uids, errors) keyed by position in specs.
+        if not isinstance(specs, list):
+            raise TypeError("specs must be list")
+
+        authz_uids = {}
+        errors = {}
+        if not specs:
+            return authz_uids, errors
+
+        # One POST for the whole batch, if the server takes it
+        ep = "{}".format(_EP_AUTHORIZATIONS_BATCH)
+        if self._batch_supported(ep):
+            json_out = {_KEY_AUTHORIZATIONS: [self._request_json(*spec, userdata=userdata)
+                                              for spec in specs]}
+            try:
+                res = self._ac_connection.http_post(ep, json=json_out)
+            except requests.exceptions.HTTPError as err:
+                if not self._batch_missing(ep, err):
+                    raise
+            else:
+                return self._request_many_result(res, specs)
+
+        # Otherwise submit one by one, concurrently
+        workers = min(len(specs), max_workers)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for idx, spec in enumerate(specs):
+                futures[idx] = executor.submit(self.request, *spec, userdata=userdata)
+            for idx, future in futures.items():
+                try:
+                    authz_uids[idx] = future.result()
+                except Exception as err:
+                    errors[idx] = err
+        return authz_uids, errors
+
+    def _request_many_result(self, res, specs):
+
+        authz_uids = {}
+        errors = {}
+        items = res[_KEY_AUTHORIZATIONS]
+        if len(items) != len(specs):
+            raise AuthorizationException("Batch returned {} authorizations for {}".format(
+                len(items), len(specs)))
+        for idx, item in enumerate(items):
+            if isinstance(item, dict):
+                errors[idx] = AuthorizationException(item.get(_KEY_ERROR))
+            else:
+                authz_uids[idx] = uuid.UUID(item)
+        return authz_uids, errors
+
+    def fetch(self, authz_uid, wait=None):
 
         ep = "{}/{}/".format(_KEY_AUTHORIZATIONS, str(authz_uid))
 
-        authz = self._ac_connection.http_get(ep)
-        return authz
+        params = None
+        if wait is not None:
+            params = {_PARAM_AUTHORIZATIONS_WAIT: "{:.3f}".format(wait)}
 
-    def wait_token(self, authz_uid, timeout=_DEFAULT_TIMEOUT):
+        authz = self._ac_connection.http_get(ep, params=params)
+        return authz
 
-        authz = self.fetch(authz_uid)
-        status = authz[_KEY_AUTHORIZATIONS_STATUS]
-        cnt = 0
-        while (status == _VAL_AUTHORIZATIONS_STATUS_PENDING):
-            if (cnt * _WAIT_SLEEP) > timeout:
-                raise Exception("Timed out wating for token")
-            time.sleep(_WAIT_SLEEP)
-            authz = self.fetch(authz_uid)
+    def fetch_many(self, authz_uids, wait=None, max_workers=_MAX_WORKERS):
+
+        # Returns (authzs, errors) keyed by authorization uid
+        authzs = {}
+        errors = {}
+        if not authz_uids:
+            return authzs, errors
+
+        # One GET for every status, if the server takes it
+        ep = "{}".format(_EP_AUTHORIZATIONS_BATCH)
+        if self._batch_supported(ep):
+            params = self._fetch_many_params(authz_uids, wait)
+            try:
+                res = self._ac_connection.http_get(ep, params=params)
+            except requests.exceptions.HTTPError as err:
+                if not self._batch_missing(ep, err):
+                    raise
+            else:
+                return self._fetch_many_result(res, authz_uids)
+
+        # Otherwise fetch one by one, concurrently
+        workers = min(len(authz_uids), max_workers)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for authz_uid in authz_uids:
+                futures[authz_uid] = executor.submit(self.fetch, authz_uid, wait=wait)
+            for authz_uid, future in futures.items():
+                try:
+                    authzs[authz_uid] = future.result()
+                except Exception as err:
+                    errors[authz_uid] = err
+        return authzs, errors
+
+    def _fetch_many_params(self, authz_uids, wait):
+
+        params = {_PARAM_AUTHORIZATIONS_UIDS: ",".join(str(uid) for uid in authz_uids)}
+        if wait is not None:
+            params[_PARAM_AUTHORIZATIONS_WAIT] = "{:.3f}".format(wait)
+        return params
+
+    def _fetch_many_result(self, res, authz_uids):
+
+        authzs = {}
+        errors = {}
+        res = res[_KEY_AUTHORIZATIONS]
+        for authz_uid in authz_uids:
+            authz = res.get(str(authz_uid))
+            if authz is None:
+                errors[authz_uid] = AuthorizationFailed(authz_uid, "missing")
+            else:
+                authzs[authz_uid] = authz
+        return authzs, errors
+
+    def wait_token(self, authz_uid, timeout=_DEFAULT_TIMEOUT, cancel=None, polling=None):
+
+        if polling is None:
+            polling = _DEFAULT_POLLING
+
+        deadline = _monotonic() + timeout
+        for delay in polling.delays():
+            started = _monotonic()
+            authz = self.fetch(authz_uid, wait=polling.wait_param(deadline - started))
             status = authz[_KEY_AUTHORIZATIONS_STATUS]
-            cnt += 1
+            if (status != _VAL_AUTHORIZATIONS_STATUS_PENDING):
+                break
+            now = _monotonic()
+            if now > deadline:
+                raise AuthorizationFailed(authz_uid, "timed out")
+            # Time spent in the request itself (e.g. a long poll) counts
+            delay = min(delay - (now - started), deadline - now)
+            if cancel is not None:
+                if cancel.wait(max(delay, 0)):
+                    raise AuthorizationCancelled(authz_uid)
+            elif delay > 0:
+                time.sleep(delay)
         if (status == _VAL_AUTHORIZATIONS_STATUS_GRANTED):
             return authz[_KEY_AUTHORIZATIONS_TOKEN]
         elif (status == _VAL_AUTHORIZATIONS_STATUS_DENIED):
@@ -194,6 +519,62 @@ class AuthorizationsClient(AccessControlClient):
         else:
             raise AuthorizationFailed(authz_uid, status)
 
+    def wait_tokens(self, authz_uids, timeout=_DEFAULT_TIMEOUT, cancel=None, polling=None):
+
+        # Poll every pending authorization in one round at a time. Returns
+        # (tokens, errors) keyed by authorization uid.
+        if polling is None:
+            polling = _DEFAULT_POLLING
+
+        tokens = {}
+        errors = {}
+        pending = list(authz_uids)
+        deadline = _monotonic() + timeout
+        for delay in polling.delays():
+            if not pending:
+                break
+            started = _monotonic()
+            authzs, fetch_errors = self.fetch_many(pending,
+                                                   wait=polling.wait_param(deadline - started))
+            pending = self._wait_tokens_round(pending, authzs, fetch_errors, tokens, errors)
+            if not pending:
+                break
+            now = _monotonic()
+            if now > deadline:
+                for authz_uid in pending:
+                    errors[authz_uid] = AuthorizationFailed(authz_uid, "timed out")
+                break
+            # Time spent in the request itself (e.g. a long poll) counts
+            delay = min(delay - (now - started), deadline - now)
+            if cancel is not None:
+                if cancel.wait(max(delay, 0)):
+                    for authz_uid in pending:
+                        errors[authz_uid] = AuthorizationCancelled(authz_uid)
+                    break
+            elif delay > 0:
+                time.sleep(delay)
+        return tokens, errors
+
+    def _wait_tokens_round(self, pending, authzs, fetch_errors, tokens, errors):
+
+        # Sort one round of statuses into tokens and errors, return the rest
+        still_pending = []
+        for authz_uid in pending:
+            if authz_uid in fetch_errors:
+                errors[authz_uid] = fetch_errors[authz_uid]
+                continue
+            authz = authzs[authz_uid]
+            status = authz[_KEY_AUTHORIZATIONS_STATUS]
+            if (status == _VAL_AUTHORIZATIONS_STATUS_PENDING):
+                still_pending.append(authz_uid)
+            elif (status == _VAL_AUTHORIZATIONS_STATUS_GRANTED):
+                tokens[authz_uid] = authz[_KEY_AUTHORIZATIONS_TOKEN]
+            elif (status == _VAL_AUTHORIZATIONS_STATUS_DENIED):
+                errors[authz_uid] = AuthorizationDenied(authz_uid, status)
+            else:
+                errors[authz_uid] = AuthorizationFailed(authz_uid, status)
+        return still_pending
+
 class AuthenticatorsClient(AccessControlClient):
 
     def create(self, tokens, module_name, module_kwargs=None, uid=None, userdata=None):
@@ -282,10 +663,10 @@ class VerifiersClient(AccessControlClient):
 
 class PermissionsClient(AccessControlClient):
 
-    def create(self, tokens, objtype, objuid=None,
-               v_create=None, v_read=None,
-               v_modify=None, v_delete=None,
-               v_ac=None, v_default=None):
+    def _create_json(self, objtype, objuid=None,
+                     v_create=None, v_read=None,
+                     v_modify=None, v_delete=None,
+                     v_ac=None, v_default=None):
 
         if v_create:
             v_create = [str(v) for v in v_create]
@@ -300,8 +681,6 @@ class PermissionsClient(AccessControlClient):
         if v_default:
             v_default = [str(v) for v in v_default]
 
-        ep = "{}".format(_EP_PERMISSIONS)
-
         json_out = {'objtype': objtype}
         if objuid:
             json_out['objuid'] = str(objuid)
@@ -318,8 +697,10 @@ class PermissionsClient(AccessControlClient):
         if v_default:
             json_out['default'] = v_default
 
-        res = self._ac_connection.http_post(ep, json=json_out, tokens=tokens)
-        res = res[_KEY_PERMISSIONS][0]
+        return json_out
+
+    def _create_result(self, res, objtype, objuid=None):
+
         outtype = res['objtype']
         outuid = uuid.UUID(res['objuid'])
         assert(objtype == outtype)
@@ -327,6 +708,93 @@ class PermissionsClient(AccessControlClient):
             assert(objuid == outuid)
         return outtype, outuid
 
+    def create(self, tokens, objtype, objuid=None,
+               v_create=None, v_read=None,
+               v_modify=None, v_delete=None,
+               v_ac=None, v_default=None):
+
+        ep = "{}".format(_EP_PERMISSIONS)
+
+        json_out = self._create_json(objtype, objuid=objuid,
+                                     v_create=v_create, v_read=v_read,
+                                     v_modify=v_modify, v_delete=v_delete,
+                                     v_ac=v_ac, v_default=v_default)
+
+        res = self._ac_connection.http_post(ep, json=json_out, tokens=tokens)
+        res = res[_KEY_PERMISSIONS][0]
+        return self._create_result(res, objtype, objuid)
+
+    def create_many(self, tokens, records, batch_size=_PERMISSIONS_BATCH_SIZE,
+                    max_workers=_MAX_WORKERS):
+
+        # Each record is a dict of create() keyword arguments. Returns
+        # (results, errors) keyed by position in records.
+        if not isinstance(records, list):
+            raise TypeError("records must be list")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        results = {}
+        errors = {}
+        if not records:
+            return results, errors
+
+        # Send batches while the server takes them
+        idxs = list(range(len(records)))
+        while idxs and self._batch_supported(_EP_PERMISSIONS_BATCH):
+            batch = idxs[:batch_size]
+            try:
+                self._create_batch(tokens, records, batch, results, errors)
+            except requests.exceptions.HTTPError as err:
+                if self._batch_missing(_EP_PERMISSIONS_BATCH, err):
+                    break
+                for idx in batch:
+                    errors[idx] = err
+            except Exception as err:
+                for idx in batch:
+                    errors[idx] = err
+            idxs = idxs[batch_size:]
+
+        # Otherwise pipeline single creates over the connection's pool
+        if idxs:
+            workers = min(len(idxs), max_workers)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {}
+                for idx in idxs:
+                    futures[idx] = executor.submit(self.create, tokens, **records[idx])
+                for idx, future in futures.items():
+                    try:
+                        results[idx] = future.result()
+                    except Exception as err:
+                        errors[idx] = err
+
+        return results, errors
+
+    def _create_batch(self, tokens, records, batch, results, errors):
+
+        ep = "{}".format(_EP_PERMISSIONS_BATCH)
+
+        json_out = {_KEY_PERMISSIONS: [self._create_json(**records[idx]) for idx in batch]}
+
+        res = self._ac_connection.http_post(ep, json=json_out, tokens=tokens)
+        self._create_batch_result(res, records, batch, results, errors)
+
+    def _create_batch_result(self, res, records, batch, results, errors):
+
+        items = res[_KEY_PERMISSIONS]
+        if len(items) != len(batch):
+            raise PermissionsBatchException("Batch returned {} results for {} records".format(
+                len(items), len(batch)))
+        for idx, item in zip(batch, items):
+            if item.get(_KEY_ERROR):
+                errors[idx] = PermissionsBatchException(item[_KEY_ERROR])
+                continue
+            try:
+                results[idx] = self._create_result(item, records[idx]['objtype'],
+                                                   records[idx].get('objuid'))
+            except (AssertionError, KeyError, ValueError) as err:
+                errors[idx] = err
+
     def fetch(self, tokens, objtype, objuid):
 
         ep = "{}/{}/{}/".format(_EP_PERMISSIONS, objtype, str(objuid))
@@ -0,0 +1,490 @@
+# -*- coding: utf-8 -*-
+
+
+# Andy Sayler
+# 2016
+# pytutamen Package
+# Access Control Client Tests
+
+
+### Imports ###
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+from builtins import *
+
+import json
+import threading
+import time
+import unittest
+import uuid
+
+import http.server
+import socketserver
+import urllib.parse
+
+from . import config
+from . import accesscontrol
+
+
+### Stand-in Server ###
+
+class _AuthzServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+
+    # Minimal AC server: authorizations stay pending for 'pending'
+    # seconds, then resolve to 'status'. Honors the 'wait' long-poll param.
+    # Verifiers and permissions are kept in memory; verifier reads answer
+    # with 'verifier_status' and batch endpoints with 'batch_status' when
+    # not 200. 'batches' lists each batch request's size.
+
+    daemon_threads = True
+
+    def __init__(self, pending=0.0, status='approved'):
+        http.server.HTTPServer.__init__(self, ('127.0.0.1', 0), _AuthzHandler)
+        self.pending = pending
+        self.status = status
+        self.verifier_status = 200
+        self.batch_status = 200
+        self.batches = []
+        self.created = {}
+        self.gets = []
+        self.verifiers = {}
+        self.permissions = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+    def state(self, uid):
+        with self.lock:
+            age = time.time() - self.created[uid]
+        if age < self.pending:
+            return {'status': 'pending'}
+        if self.status == 'approved':
+            return {'status': 'approved', 'token': "token-{}".format(uid)}
+        return {'status': self.status}
+
+class _AuthzHandler(http.server.BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, obj):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length).decode('utf-8') or 'null')
+        ep = [part for part in self.path.split('/') if part][-1]
+        if ep == 'batch':
+            self._batch(body)
+            return
+        if ep == 'verifiers':
+            with self.server.lock:
+                self.server.verifiers[body['uid']] = body.get('accounts', [])
+            self._send({'verifiers': [body['uid']]})
+            return
+        if ep == 'permissions':
+            self._send({'permissions': [self._permission(body)]})
+            return
+        self._send({'authorizations': [self._authorization(body)]})
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        ep, uid = [part for part in url.path.split('/') if part][-2:]
+        if ep == 'verifiers':
+            self._verifier(uid)
+            return
+        if uid == 'batch':
+            self._fetch_batch(params)
+            return
+        with self.server.lock:
+            self.server.gets.append(params)
+        if 'wait' in params:
+            end = time.time() + float(params['wait'][0])
+            while (self.server.state(uid)['status'] == 'pending') and (time.time() < end):
+                time.sleep(0.01)
+        self._send(self.server.state(uid))
+
+    def _fetch_batch(self, params):
+        uids = params['uids'][0].split(',')
+        with self.server.lock:
+            self.server.batches.append(len(uids))
+            self.server.gets.append(params)
+            uids = [uid for uid in uids if uid in self.server.created]
+        if self.server.batch_status != 200:
+            self.send_error(self.server.batch_status)
+            return
+        if 'wait' in params:
+            end = time.time() + float(params['wait'][0])
+            while (any(self.server.state(uid)['status'] == 'pending' for uid in uids) and
+                   (time.time() < end)):
+                time.sleep(0.01)
+        self._send({'authorizations': dict((uid, self.server.state(uid)) for uid in uids)})
+
+    def _authorization(self, record):
+        if record['objtype'] == 'bad':
+            return {'error': "bad objtype"}
+        uid = str(uuid.uuid4())
+        with self.server.lock:
+            self.server.created[uid] = time.time()
+        return uid
+
+    def _permission(self, record):
+        if record['objtype'] == 'bad':
+            return {'error': "bad objtype"}
+        with self.server.lock:
+            self.server.permissions.append(record)
+        return {'objtype': record['objtype'], 'objuid': record['objuid']}
+
+    def _batch(self, body):
+        key = list(body.keys())[0]
+        with self.server.lock:
+            self.server.batches.append(len(body[key]))
+        if self.server.batch_status != 200:
+            self.send_error(self.server.batch_status)
+            return
+        if key == 'authorizations':
+            self._send({key: [self._authorization(record) for record in body[key]]})
+        else:
+            self._send({key: [self._permission(record) for record in body[key]]})
+
+    def _verifier(self, uid):
+        with self.server.lock:
+            accounts = self.server.verifiers.get(uid)
+        if self.server.verifier_status != 200:
+            self.send_error(self.server.verifier_status)
+        elif accounts is None:
+            self.send_error(404)
+        else:
+            self._send({'uid': uid, 'accounts': accounts})
+
+
+def _serve(test, srv):
+
+    # Run srv until the end of test
+    thread = threading.Thread(target=srv.serve_forever)
+    thread.daemon = True
+    thread.start()
+    test.addCleanup(srv.server_close)
+    test.addCleanup(srv.shutdown)
+    return srv
+
+def _connection(test, url, server_name='test', conf=None,
+                account_uid=None, client_uid=None):
+
+    # Open an AC connection to url until the end of test
+    if conf is None:
+        conf = config.ClientConfig(conf_path="/pytutamen_test",
+                                   backend=config.MemoryConfigBackend())
+    conf.ac_server_set_url(server_name, url)
+    connection = accesscontrol.ACServerConnection(server_name=server_name, conf=conf,
+                                                  account_uid=account_uid or uuid.uuid4(),
+                                                  client_uid=client_uid or uuid.uuid4(),
+                                                  no_client_crt=True,
+                                                  session_pool=False)
+    connection.open()
+    test.addCleanup(connection.close)
+    return connection
+
+
+### Tests ###
+
+class AuthorizationsClientTestCase(unittest.TestCase):
+
+    def _client(self, pending=0.0, status='approved'):
+        srv = _serve(self, _AuthzServer(pending=pending, status=status))
+        connection = _connection(self, srv.url)
+        return srv, accesscontrol.AuthorizationsClient(connection)
+
+    def test_granted(self):
+        srv, client = self._client()
+        authz_uid = client.request('collection', 'read')
+        tok = client.wait_token(authz_uid, timeout=5)
+        self.assertEqual(tok, "token-{}".format(authz_uid))
+        self.assertEqual(len(srv.gets), 1)
+
+    def test_backoff(self):
+        polling = accesscontrol.PollingStrategy(initial=0.05, maximum=0.2,
+                                                backoff=2.0, jitter=0)
+        srv, client = self._client(pending=0.5)
+        authz_uid = client.request('collection', 'read')
+        tok = client.wait_token(authz_uid, timeout=5, polling=polling)
+        self.assertEqual(tok, "token-{}".format(authz_uid))
+        # 0.05 + 0.1 + 0.2 + 0.2 + ... reaches 0.5s in ~5 polls, not 10
+        self.assertGreaterEqual(len(srv.gets), 3)
+        self.assertLessEqual(len(srv.gets), 7)
+        self.assertTrue(all('wait' not in params for params in srv.gets))
+
+    def test_long_poll(self):
+        polling = accesscontrol.PollingStrategy(initial=0.05, long_poll=2.0)
+        srv, client = self._client(pending=0.3)
+        authz_uid = client.request('collection', 'read')
+        tok = client.wait_token(authz_uid, timeout=5, polling=polling)
+        self.assertEqual(tok, "token-{}".format(authz_uid))
+        self.assertEqual(len(srv.gets), 1)
+        self.assertIn('wait', srv.gets[0])
+
+    def test_denied(self):
+        srv, client = self._client(status='denied')
+        authz_uid = client.request('collection', 'read')
+        with self.assertRaises(accesscontrol.AuthorizationDenied):
+            client.wait_token(authz_uid, timeout=5)
+
+    def test_timeout(self):
+        polling = accesscontrol.PollingStrategy(initial=0.05, maximum=0.1)
+        srv, client = self._client(pending=60)
+        authz_uid = client.request('collection', 'read')
+        started = time.time()
+        with self.assertRaises(accesscontrol.AuthorizationFailed):
+            client.wait_token(authz_uid, timeout=0.3, polling=polling)
+        self.assertLess(time.time() - started, 2)
+
+    def test_cancel(self):
+        srv, client = self._client(pending=60)
+        authz_uid = client.request('collection', 'read')
+        cancel = threading.Event()
+        timer = threading.Timer(0.2, cancel.set)
+        timer.start()
+        started = time.time()
+        with self.assertRaises(accesscontrol.AuthorizationCancelled):
+            client.wait_token(authz_uid, timeout=30, cancel=cancel)
+        self.assertLess(time.time() - started, 5)
+
+class AuthorizationsBatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(accesscontrol._BATCH_UNSUPPORTED.clear)
+        self.polling = accesscontrol.PollingStrategy(initial=0.05, maximum=0.1)
+
+    def _client(self, pending=0.0, batch_status=200):
+        srv = _serve(self, _AuthzServer(pending=pending))
+        srv.batch_status = batch_status
+        connection = _connection(self, srv.url)
+        return srv, accesscontrol.AuthorizationsClient(connection)
+
+    def _wait(self, client, specs):
+        authz_uids, errors = client.request_many(specs)
+        self.assertEqual(errors, {})
+        tokens, errors = client.wait_tokens(list(authz_uids.values()), timeout=5,
+                                            polling=self.polling)
+        self.assertEqual(errors, {})
+        return authz_uids, tokens
+
+    def test_request_many(self):
+        srv, client = self._client()
+        authz_uids, errors = client.request_many([('collection', 'read', 'a'),
+                                                  ('bad', 'read'),
+                                                  ('collection', 'write', 'a')])
+        self.assertEqual(srv.batches, [3])
+        self.assertEqual(sorted(authz_uids.keys()), [0, 2])
+        self.assertIsInstance(errors[1], accesscontrol.AuthorizationException)
+
+    def test_wait_tokens(self):
+        # Each round polls every pending authorization in one request
+        srv, client = self._client(pending=0.2)
+        authz_uids, tokens = self._wait(client, [('collection', 'read', 'a'),
+                                                 ('collection', 'write', 'a')])
+        for authz_uid in authz_uids.values():
+            self.assertEqual(tokens[authz_uid], "token-{}".format(authz_uid))
+        self.assertTrue(all('uids' in params for params in srv.gets))
+        self.assertEqual(srv.batches, [2] * len(srv.batches))
+
+    def test_fetch_many_missing(self):
+        srv, client = self._client()
+        authz_uids, errors = client.request_many([('collection', 'read', 'a')])
+        missing = uuid.uuid4()
+        authzs, errors = client.fetch_many([authz_uids[0], missing])
+        self.assertEqual(authzs[authz_uids[0]]['status'], 'approved')
+        self.assertIsInstance(errors[missing], accesscontrol.AuthorizationFailed)
+
+    def test_fallback(self):
+        # Servers without the batch endpoints get single requests, and are
+        # not offered a batch again
+        for status in accesscontrol._STATUS_NO_BATCH:
+            srv, client = self._client(batch_status=status)
+            for i in range(2):
+                authz_uids, tokens = self._wait(client, [('collection', 'read', 'a'),
+                                                         ('collection', 'write', 'a')])
+                self.assertEqual(len(tokens), 2)
+            self.assertEqual(srv.batches, [2])
+            self.assertEqual(len(srv.created), 4)
+            self.assertFalse(any('uids' in params for params in srv.gets))
+
+    def test_retry(self):
+        # A missing endpoint is tried again once _BATCH_RETRY has passed
+        srv, client = self._client(batch_status=404)
+        client.request_many([('collection', 'read', 'a')])
+        srv.batch_status = 200
+        client.request_many([('collection', 'read', 'a')])
+        self.assertEqual(srv.batches, [1])
+        for key in list(accesscontrol._BATCH_UNSUPPORTED.keys()):
+            accesscontrol._BATCH_UNSUPPORTED[key] = 0
+        client.request_many([('collection', 'read', 'a')])
+        self.assertEqual(srv.batches, [1, 1])
+        self.assertEqual(accesscontrol._BATCH_UNSUPPORTED, {})
+
+    def test_batch_error(self):
+        # Other failures are raised, not taken as a missing endpoint
+        srv, client = self._client(batch_status=500)
+        with self.assertRaises(Exception):
+            client.request_many([('collection', 'read', 'a')])
+        self.assertEqual(srv.created, {})
+        self.assertEqual(accesscontrol._BATCH_UNSUPPORTED, {})
+
+class PermissionsClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(accesscontrol._BATCH_UNSUPPORTED.clear)
+
+    def _client(self, batch_status=200):
+        srv = _serve(self, _AuthzServer())
+        srv.batch_status = batch_status
+        connection = _connection(self, srv.url)
+        return srv, accesscontrol.PermissionsClient(connection)
+
+    def _records(self, count):
+        return [{'objtype': 'collection', 'objuid': uuid.uuid4()} for i in range(count)]
+
+    def test_create(self):
+        srv, client = self._client()
+        objuid = uuid.uuid4()
+        self.assertEqual(client.create(['tok'], 'collection', objuid=objuid,
+                                       v_default=[objuid]),
+                         ('collection', objuid))
+        self.assertEqual(srv.permissions[0]['default'], [str(objuid)])
+
+    def test_create_many(self):
+        srv, client = self._client()
+        records = self._records(5)
+        records[3]['objtype'] = 'bad'
+        results, errors = client.create_many(['tok'], records, batch_size=2)
+        self.assertEqual(srv.batches, [2, 2, 1])
+        self.assertEqual(sorted(results.keys()), [0, 1, 2, 4])
+        self.assertEqual(results[4], ('collection', records[4]['objuid']))
+        self.assertIsInstance(errors[3], accesscontrol.PermissionsBatchException)
+
+    def test_fallback(self):
+        # Servers without the batch endpoint get single creates, and are
+        # not offered a batch again
+        for status in accesscontrol._STATUS_NO_BATCH:
+            srv, client = self._client(batch_status=status)
+            records = self._records(3)
+            for i in range(2):
+                results, errors = client.create_many(['tok'], records, batch_size=2)
+                self.assertEqual(errors, {})
+                self.assertEqual(sorted(results.keys()), [0, 1, 2])
+            self.assertEqual(srv.batches, [2])
+            self.assertEqual(len(srv.permissions), 6)
+
+    def test_batch_error(self):
+        # Other failures fail the batch without a fallback
+        srv, client = self._client(batch_status=500)
+        results, errors = client.create_many(['tok'], self._records(3), batch_size=2)
+        self.assertEqual(results, {})
+        self.assertEqual(sorted(errors.keys()), [0, 1, 2])
+        self.assertEqual(srv.batches, [2, 1])
+        self.assertEqual(srv.permissions, [])
+
+class PollingStrategyTestCase(unittest.TestCase):
+
+    def test_delays(self):
+        polling = accesscontrol.PollingStrategy(initial=0.1, maximum=1.0,
+                                                backoff=2.0, jitter=0)
+        delays = polling.delays()
+        self.assertEqual([round(next(delays), 3) for i in range(6)],
+                         [0.1, 0.2, 0.4, 0.8, 1.0, 1.0])
+
+    def test_jitter(self):
+        polling = accesscontrol.PollingStrategy(initial=1.0, maximum=1.0, jitter=0.25)
+        delays = polling.delays()
+        for i in range(100):
+            delay = next(delays)
+            self.assertGreaterEqual(delay, 0.75)
+            self.assertLessEqual(delay, 1.0)
+
+    def test_wait_param(self):
+        self.assertIsNone(accesscontrol.PollingStrategy().wait_param(10))
+        polling = accesscontrol.PollingStrategy(long_poll=5)
+        self.assertEqual(polling.wait_param(10), 5)
+        self.assertEqual(polling.wait_param(2), 2)
+        self.assertEqual(polling.wait_param(-1), 0)
+
+    def test_args(self):
+        with self.assertRaises(ValueError):
+            accesscontrol.PollingStrategy(initial=0)
+        with self.assertRaises(ValueError):
+            accesscontrol.PollingStrategy(initial=1, maximum=0.5)
+        with self.assertRaises(ValueError):
+            accesscontrol.PollingStrategy(jitter=1)
+
+class TokenCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = _connection(self, "http://127.0.0.1:9")
+
+    def test_get_put(self):
+        cache = accesscontrol.TokenCache()
+        self.assertIsNone(cache.get(self.connection, 'collection', 'read', 'a'))
+        cache.put(self.connection, 'collection', 'read', 'a', 'tok-a')
+        self.assertEqual(cache.get(self.connection, 'collection', 'read', 'a'), 'tok-a')
+        self.assertIsNone(cache.get(self.connection, 'collection', 'write', 'a'))
+        self.assertIsNone(cache.get(self.connection, 'collection', 'read', 'b'))
+
+    def test_identity(self):
+        cache = accesscontrol.TokenCache()
+        cache.put(self.connection, 'collection', 'read', 'a', 'tok-a')
+        other = _connection(self, "http://127.0.0.1:9")
+        self.assertIsNone(cache.get(other, 'collection', 'read', 'a'))
+
+    def test_ttl(self):
+        cache = accesscontrol.TokenCache(ttl=0.1)
+        cache.put(self.connection, 'collection', 'read', 'a', 'tok-a')
+        self.assertEqual(cache.get(self.connection, 'collection', 'read', 'a'), 'tok-a')
+        time.sleep(0.2)
+        self.assertIsNone(cache.get(self.connection, 'collection', 'read', 'a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_lru(self):
+        cache = accesscontrol.TokenCache(max_size=2)
+        cache.put(self.connection, 'collection', 'read', 'a', 'tok-a')
+        cache.put(self.connection, 'collection', 'read', 'b', 'tok-b')
+        # Reading 'a' makes 'b' the least recently used
+        cache.get(self.connection, 'collection', 'read', 'a')
+        cache.put(self.connection, 'collection', 'read', 'c', 'tok-c')
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get(self.connection, 'collection', 'read', 'a'), 'tok-a')
+        self.assertIsNone(cache.get(self.connection, 'collection', 'read', 'b'))
+        self.assertEqual(cache.get(self.connection, 'collection', 'read', 'c'), 'tok-c')
+
+    def test_invalidate(self):
+        cache = accesscontrol.TokenCache()
+        cache.put(self.connection, 'collection', 'read', 'a', 'tok-ra')
+        cache.put(self.connection, 'collection', 'read', 'b', 'tok-rb')
+        cache.put(self.connection, 'collection', 'write', 'a', 'tok-wa')
+        cache.invalidate('collection', 'read', 'a')
+        self.assertIsNone(cache.get(self.connection, 'collection', 'read', 'a'))
+        self.assertEqual(len(cache), 2)
+        cache.invalidate(objperm='read')
+        self.assertEqual(len(cache), 1)
+        cache.invalidate(server_name='other')
+        self.assertEqual(len(cache), 1)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_args(self):
+        with self.assertRaises(ValueError):
+            accesscontrol.TokenCache(ttl=0)
+        with self.assertRaises(ValueError):
+            accesscontrol.TokenCache(max_size=0)
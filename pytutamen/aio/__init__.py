@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+
+# Andy Sayler
+# 2016
+# pytutamen Package
+# asyncio Client Library (Python 3.5+)
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+
+
+# Andy Sayler
+# 2016
+# pytutamen Package
+# Access Control Client (asyncio)
+
+
+### Imports ###
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+from builtins import *
+
+import asyncio
+import uuid
+
+import aiohttp
+
+from .. import accesscontrol
+from . import base
+
+
+### Connection Objects ###
+
+class AsyncACServerConnection(base.AsyncServerConnection, accesscontrol.ACServerConnection):
+    pass
+
+
+### Client Objects ###
+
+class AsyncAccessControlClient(accesscontrol.AccessControlClient):
+
+    def __init__(self, ac_connection):
+
+        # Check Args
+        if not isinstance(ac_connection, AsyncACServerConnection):
+            raise(TypeError("'ac_connection' must of an instance of {}".format(AsyncACServerConnection)))
+
+        # Call Parent
+        super().__init__(ac_connection)
+
+    def _error_status(self, err):
+        return getattr(err, 'status', None)
+
+class AsyncAuthorizationsClient(AsyncAccessControlClient, accesscontrol.AuthorizationsClient):
+
+    async def request(self, obj_type, obj_perm, obj_uid=None, userdata=None):
+
+        ep = "{}".format(accesscontrol._EP_AUTHORIZATIONS)
+
+        json_out = self._request_json(obj_type, obj_perm, obj_uid=obj_uid, userdata=userdata)
+
+        res = await self._ac_connection.http_post(ep, json=json_out)
+        return uuid.UUID(res[accesscontrol._KEY_AUTHORIZATIONS][0])
+
+    async def request_many(self, specs, userdata=None, max_workers=accesscontrol._MAX_WORKERS):
+
+        # Each spec is (obj_type, obj_perm) or (obj_type, obj_perm, obj_uid).
+        # Returns (authz_uids, errors) keyed by position in specs.
+        if not isinstance(specs, list):
+            raise TypeError("specs must be list")
+
+        if not specs:
+            return {}, {}
+
+        # One POST for the whole batch, if the server takes it
+        ep = "{}".format(accesscontrol._EP_AUTHORIZATIONS_BATCH)
+        if self._batch_supported(ep):
+            json_out = {accesscontrol._KEY_AUTHORIZATIONS: [
+                self._request_json(*spec, userdata=userdata) for spec in specs]}
+            try:
+                res = await self._ac_connection.http_post(ep, json=json_out)
+            except aiohttp.ClientResponseError as err:
+                if not self._batch_missing(ep, err):
+                    raise
+            else:
+                return self._request_many_result(res, specs)
+
+        # Otherwise submit one by one, concurrently
+        async def _request(idx):
+            return await self.request(*specs[idx], userdata=userdata)
+
+        return await base.gather_many(_request, list(range(len(specs))), max_workers)
+
+    async def fetch(self, authz_uid, wait=None):
+
+        ep = "{}/{}/".format(accesscontrol._KEY_AUTHORIZATIONS, str(authz_uid))
+
+        params = None
+        if wait is not None:
+            params = {accesscontrol._PARAM_AUTHORIZATIONS_WAIT: "{:.3f}".format(wait)}
+
+        authz = await self._ac_connection.http_get(ep, params=params)
+        return authz
+
+    async def fetch_many(self, authz_uids, wait=None, max_workers=accesscontrol._MAX_WORKERS):
+
+        # Returns (authzs, errors) keyed by authorization uid
+        if not authz_uids:
+            return {}, {}
+
+        # One GET for every status, if the server takes it
+        ep = "{}".format(accesscontrol._EP_AUTHORIZATIONS_BATCH)
+        if self._batch_supported(ep):
+            params = self._fetch_many_params(authz_uids, wait)
+            try:
+                res = await self._ac_connection.http_get(ep, params=params)
+            except aiohttp.ClientResponseError as err:
+                if not self._batch_missing(ep, err):
+                    raise
+            else:
+                return self._fetch_many_result(res, authz_uids)
+
+        # Otherwise fetch one by one, concurrently
+        async def _fetch(authz_uid):
+            return await self.fetch(authz_uid, wait=wait)
+
+        return await base.gather_many(_fetch, list(authz_uids), max_workers)
+
+    async def wait_token(self, authz_uid, timeout=accesscontrol._DEFAULT_TIMEOUT,
+                         cancel=None, polling=None):
+
+        # cancel is an asyncio.Event
+
+        if polling is None:
+            polling = accesscontrol._DEFAULT_POLLING
+
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        for delay in polling.delays():
+            started = loop.time()
+            authz = await self.fetch(authz_uid, wait=polling.wait_param(deadline - started))
+            status = authz[accesscontrol._KEY_AUTHORIZATIONS_STATUS]
+            if (status != accesscontrol._VAL_AUTHORIZATIONS_STATUS_PENDING):
+                break
+            now = loop.time()
+            if now > deadline:
+                raise accesscontrol.AuthorizationFailed(authz_uid, "timed out")
+            # Time spent in the request itself (e.g. a long poll) counts
+            delay = min(delay - (now - started), deadline - now)
+            if cancel is not None:
+                if await base.wait_event(cancel, delay):
+                    raise accesscontrol.AuthorizationCancelled(authz_uid)
+            elif delay > 0:
+                await asyncio.sleep(delay)
+        if (status == accesscontrol._VAL_AUTHORIZATIONS_STATUS_GRANTED):
+            return authz[accesscontrol._KEY_AUTHORIZATIONS_TOKEN]
+        elif (status == accesscontrol._VAL_AUTHORIZATIONS_STATUS_DENIED):
+            raise accesscontrol.AuthorizationDenied(authz_uid, status)
+        else:
+            raise accesscontrol.AuthorizationFailed(authz_uid, status)
+
+    async def wait_tokens(self, authz_uids, timeout=accesscontrol._DEFAULT_TIMEOUT,
+                          cancel=None, polling=None):
+
+        # Poll every pending authorization in one round at a time. Returns
+        # (tokens, errors) keyed by authorization uid. cancel is an asyncio.Event
+        if polling is None:
+            polling = accesscontrol._DEFAULT_POLLING
+
+        tokens = {}
+        errors = {}
+        pending = list(authz_uids)
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        for delay in polling.delays():
+            if not pending:
+                break
+            started = loop.time()
+            authzs, fetch_errors = await self.fetch_many(
+                pending, wait=polling.wait_param(deadline - started))
+            pending = self._wait_tokens_round(pending, authzs, fetch_errors, tokens, errors)
+            if not pending:
+                break
+            now = loop.time()
+            if now > deadline:
+                for authz_uid in pending:
+                    errors[authz_uid] = accesscontrol.AuthorizationFailed(authz_uid, "timed out")
+                break
+            # Time spent in the request itself (e.g. a long poll) counts
+            delay = min(delay - (now - started), deadline - now)
+            if cancel is not None:
+                if await base.wait_event(cancel, delay):
+                    for authz_uid in pending:
+                        errors[authz_uid] = accesscontrol.AuthorizationCancelled(authz_uid)
+                    break
+            elif delay > 0:
+                await asyncio.sleep(delay)
+        return tokens, errors
+
+class AsyncVerifiersClient(AsyncAccessControlClient, accesscontrol.VerifiersClient):
+
+    async def create(self, tokens, uid=None, accounts=None, authenticators=None, userdata=None):
+
+        if uid:
+            if not isinstance(uid, uuid.UUID):
+                raise TypeError("uid must be uuid.UUID")
+        if not accounts:
+            accounts = []
+        else:
+            accounts = [str(a) for a in accounts]
+        if not authenticators:
+            authenticators = []
+        else:
+            authenticators = [str(a) for a in authenticators]
+        if userdata is None:
+            userdata = {}
+
+        ep = "{}".format(accesscontrol._EP_VERIFIERS)
+
+        json_out = {}
+        if uid:
+            json_out['uid'] = str(uid)
+        if accounts:
+            json_out['accounts'] = accounts
+        if authenticators:
+            json_out['authenticators'] = authenticators
+        if userdata:
+            json_out['userdata'] = userdata
+
+        res = await self._ac_connection.http_post(ep, json=json_out, tokens=tokens)
+        return uuid.UUID(res[accesscontrol._KEY_VERIFIERS][0])
+
+    async def fetch(self, tokens, uid):
+
+        if not isinstance(uid, uuid.UUID):
+            raise TypeError("uid must be uuid.UUID")
+
+        ep = "{}/{}/".format(accesscontrol._EP_VERIFIERS, str(uid))
+
+        verifier = await self._ac_connection.http_get(ep, tokens=tokens)
+        return verifier
+
+class AsyncPermissionsClient(AsyncAccessControlClient, accesscontrol.PermissionsClient):
+
+    async def create(self, tokens, objtype, objuid=None,
+                     v_create=None, v_read=None,
+                     v_modify=None, v_delete=None,
+                     v_ac=None, v_default=None):
+
+        ep = "{}".format(accesscontrol._EP_PERMISSIONS)
+
+        json_out = self._create_json(objtype, objuid=objuid,
+                                     v_create=v_create, v_read=v_read,
+                                     v_modify=v_modify, v_delete=v_delete,
+                                     v_ac=v_ac, v_default=v_default)
+
+        res = await self._ac_connection.http_post(ep, json=json_out, tokens=tokens)
+        res = res[accesscontrol._KEY_PERMISSIONS][0]
+        return self._create_result(res, objtype, objuid)
+
+    async def fetch(self, tokens, objtype, objuid):
+
+        ep = "{}/{}/{}/".format(accesscontrol._EP_PERMISSIONS, objtype, str(objuid))
+
+        perms = await self._ac_connection.http_get(ep, tokens=tokens)
+        return perms
+
+    async def create_many(self, tokens, records,
+                          batch_size=accesscontrol._PERMISSIONS_BATCH_SIZE,
+                          max_workers=accesscontrol._MAX_WORKERS):
+
+        # Each record is a dict of create() keyword arguments. Returns
+        # (results, errors) keyed by position in records.
+        if not isinstance(records, list):
+            raise TypeError("records must be list")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        results = {}
+        errors = {}
+        if not records:
+            return results, errors
+
+        # Send batches while the server takes them
+        ep = "{}".format(accesscontrol._EP_PERMISSIONS_BATCH)
+        idxs = list(range(len(records)))
+        while idxs and self._batch_supported(ep):
+            batch = idxs[:batch_size]
+            try:
+                await self._create_batch(tokens, records, batch, results, errors)
+            except aiohttp.ClientResponseError as err:
+                if self._batch_missing(ep, err):
+                    break
+                for idx in batch:
+                    errors[idx] = err
+            except Exception as err:
+                for idx in batch:
+                    errors[idx] = err
+            idxs = idxs[batch_size:]
+
+        # Otherwise run single creates concurrently
+        if idxs:
+            async def _create(idx):
+                return await self.create(tokens, **records[idx])
+            single_results, single_errors = await base.gather_many(_create, idxs, max_workers)
+            results.update(single_results)
+            errors.update(single_errors)
+
+        return results, errors
+
+    async def _create_batch(self, tokens, records, batch, results, errors):
+
+        ep = "{}".format(accesscontrol._EP_PERMISSIONS_BATCH)
+
+        json_out = {accesscontrol._KEY_PERMISSIONS: [self._create_json(**records[idx])
+                                                     for idx in batch]}
+
+        res = await self._ac_connection.http_post(ep, json=json_out, tokens=tokens)
+        self._create_batch_result(res, records, batch, results, errors)
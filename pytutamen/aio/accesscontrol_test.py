@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+
+# Andy Sayler
+# 2016
+# pytutamen Package
+# Access Control Client Tests (asyncio)
+
+
+### Imports ###
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+from builtins import *
+
+import unittest
+import uuid
+
+from .. import accesscontrol as sync_accesscontrol
+from ..accesscontrol_test import _AuthzServer, _serve
+from ..utilities_test import _conf
+
+# The asyncio client needs Python 3.5+ and aiohttp
+try:
+    import asyncio
+    from . import accesscontrol
+except (ImportError, SyntaxError):
+    accesscontrol = None
+
+
+### Tests ###
+
+@unittest.skipIf(accesscontrol is None, "asyncio client not available")
+class AsyncAuthorizationsClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.addCleanup(sync_accesscontrol._BATCH_UNSUPPORTED.clear)
+        self.polling = sync_accesscontrol.PollingStrategy(initial=0.05, maximum=0.1)
+
+    def _run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def _client(self, pending=0.0, batch_status=200):
+        srv = _serve(self, _AuthzServer(pending=pending))
+        srv.batch_status = batch_status
+        connection = accesscontrol.AsyncACServerConnection(server_name='ac0',
+                                                           conf=_conf({'ac0': srv}),
+                                                           no_client_crt=True)
+        self._run(connection.open())
+        self.addCleanup(self._run, connection.close())
+        return srv, accesscontrol.AsyncAuthorizationsClient(connection)
+
+    def _wait(self, client, specs):
+        authz_uids, errors = self._run(client.request_many(specs))
+        self.assertEqual(errors, {})
+        tokens, errors = self._run(client.wait_tokens(list(authz_uids.values()), timeout=5,
+                                                      polling=self.polling))
+        self.assertEqual(errors, {})
+        return authz_uids, tokens
+
+    def test_request(self):
+        srv, client = self._client()
+        authz_uid = self._run(client.request('collection', 'read', uuid.uuid4()))
+        self.assertIn(str(authz_uid), srv.created)
+
+    def test_batch(self):
+        srv, client = self._client(pending=0.2)
+        authz_uids, tokens = self._wait(client, [('collection', 'read', 'a'),
+                                                 ('collection', 'write', 'a')])
+        self.assertEqual(len(tokens), 2)
+        self.assertTrue(all('uids' in params for params in srv.gets))
+
+    def test_fallback(self):
+        for status in sync_accesscontrol._STATUS_NO_BATCH:
+            srv, client = self._client(batch_status=status)
+            for i in range(2):
+                authz_uids, tokens = self._wait(client, [('collection', 'read', 'a'),
+                                                         ('collection', 'write', 'a')])
+                self.assertEqual(len(tokens), 2)
+            self.assertEqual(srv.batches, [2])
+            self.assertFalse(any('uids' in params for params in srv.gets))
+
+@unittest.skipIf(accesscontrol is None, "asyncio client not available")
+class AsyncPermissionsClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.addCleanup(sync_accesscontrol._BATCH_UNSUPPORTED.clear)
+
+    def _run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def _client(self, batch_status=200):
+        srv = _serve(self, _AuthzServer())
+        srv.batch_status = batch_status
+        connection = accesscontrol.AsyncACServerConnection(server_name='ac0',
+                                                           conf=_conf({'ac0': srv}),
+                                                           no_client_crt=True)
+        self._run(connection.open())
+        self.addCleanup(self._run, connection.close())
+        return srv, accesscontrol.AsyncPermissionsClient(connection)
+
+    def _records(self, count):
+        return [{'objtype': 'collection', 'objuid': uuid.uuid4()} for i in range(count)]
+
+    def test_create(self):
+        srv, client = self._client()
+        objuid = uuid.uuid4()
+        self.assertEqual(self._run(client.create(['tok'], 'collection', objuid=objuid,
+                                                 v_default=[objuid])),
+                         ('collection', objuid))
+        self.assertEqual(srv.permissions[0]['default'], [str(objuid)])
+
+    def test_create_many(self):
+        srv, client = self._client()
+        records = self._records(3)
+        results, errors = self._run(client.create_many(['tok'], records, batch_size=2))
+        self.assertEqual(srv.batches, [2, 1])
+        self.assertEqual(sorted(results.keys()), [0, 1, 2])
+        self.assertEqual(errors, {})
+
+    def test_fallback(self):
+        for status in sync_accesscontrol._STATUS_NO_BATCH:
+            srv, client = self._client(batch_status=status)
+            results, errors = self._run(client.create_many(['tok'], self._records(3),
+                                                           batch_size=2))
+            self.assertEqual(sorted(results.keys()), [0, 1, 2])
+            self.assertEqual(srv.batches, [2])
+            self.assertEqual(len(srv.permissions), 3)
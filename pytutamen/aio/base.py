@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+
+# Andy Sayler
+# 2016
+# pytutamen Package
+# Tutamen Client Library (asyncio)
+
+
+### Imports ###
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+from builtins import *
+
+import asyncio
+
+import aiohttp
+
+from .. import base
+
+
+### Constants ###
+
+_POOL_SIZE = 100
+
+
+### Functions ###
+
+async def wait_event(event, timeout):
+    # asyncio counterpart of threading.Event.wait(timeout)
+    if event.is_set():
+        return True
+    try:
+        await asyncio.wait_for(event.wait(), max(timeout, 0))
+    except asyncio.TimeoutError:
+        pass
+    return event.is_set()
+
+async def gather_many(func, keys, max_workers):
+
+    # Await func(key) for every key, at most max_workers at once. Returns
+    # (results, errors) keyed by key.
+    limit = asyncio.Semaphore(max_workers)
+
+    async def _run(key):
+        async with limit:
+            return await func(key)
+
+    outs = await asyncio.gather(*[_run(key) for key in keys], return_exceptions=True)
+    results = {}
+    errors = {}
+    for key, out in zip(keys, outs):
+        if isinstance(out, BaseException):
+            errors[key] = out
+        else:
+            results[key] = out
+    return results, errors
+
+
+### Objects ###
+
+class AsyncServerConnection(base.ServerConnection):
+
+    def __init__(self, *args, pool_size=_POOL_SIZE, **kwargs):
+
+        # Check Args
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+
+        # Call Parent
+        super().__init__(*args, **kwargs)
+
+        # Setup Properties
+        self._pool_size = pool_size
+
+    def _ssl_context(self):
+        return base.get_ssl_context(self._path_ca, self._client_cert())
+
+    async def open(self):
+        if not self._session:
+            if self.url_srv.startswith("https"):
+                ssl_ctx = self._ssl_context()
+            else:
+                ssl_ctx = True
+            connector = aiohttp.TCPConnector(limit=self._pool_size, ssl=ssl_ctx)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  raise_for_status=True)
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def warm(self):
+        # Connect ahead of the first request; failures are left for that
+        # request to report
+        await self.open()
+        timeout = aiohttp.ClientTimeout(total=base._WARM_TIMEOUT)
+        try:
+            async with self._session.head(self.url_api, timeout=timeout):
+                pass
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+
+    def __enter__(self):
+        raise TypeError("Use 'async with' with {}".format(type(self).__name__))
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return False
+
+    def _auth(self, auth):
+        if auth is None or isinstance(auth, aiohttp.BasicAuth):
+            return auth
+        return aiohttp.BasicAuth(*auth)
+
+    async def _http(self, method, endpoint, json=None, tokens=None, auth=None, params=None):
+        url = "{:s}/{:s}/".format(self.url_api, endpoint)
+        header = self._tokens_to_header(tokens)
+        async with self._session.request(method, url, json=json, headers=header,
+                                         auth=self._auth(auth), params=params) as res:
+            return await res.json()
+
+    async def http_post(self, endpoint, json=None, tokens=None, auth=None):
+        return await self._http('POST', endpoint, json=json, tokens=tokens, auth=auth)
+
+    async def http_put(self, endpoint, json=None, tokens=None, auth=None):
+        return await self._http('PUT', endpoint, json=json, tokens=tokens, auth=auth)
+
+    async def http_get(self, endpoint=None, tokens=None, auth=None, params=None):
+        return await self._http('GET', endpoint, tokens=tokens, auth=auth, params=params)
+
+    async def http_delete(self, endpoint=None, tokens=None, auth=None):
+        return await self._http('DELETE', endpoint, tokens=tokens, auth=auth)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+
+# Andy Sayler
+# 2016
+# pytutamen Package
+# Storage Client (asyncio)
+
+
+### Imports ###
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+from future.utils import native_str
+from builtins import *
+
+import uuid
+
+from .. import storage
+from . import base
+
+
+### Connection Objects ###
+
+class AsyncStorageServerConnection(base.AsyncServerConnection, storage.StorageServerConnection):
+    pass
+
+
+### Client Objects ###
+
+class AsyncStorageClient(storage.StorageClient):
+
+    def __init__(self, storage_connection):
+
+        # Check Args
+        if not isinstance(storage_connection, AsyncStorageServerConnection):
+            msg = "'storage_connection' must of an instance of '{}'".format(AsyncStorageServerConnection)
+            raise(TypeError(msg))
+
+        # Call Parent
+        super().__init__(storage_connection)
+
+class AsyncCollectionsClient(AsyncStorageClient, storage.CollectionsClient):
+
+    async def create(self, tokens, ac_servers, userdata=None, uid=None):
+
+        if not isinstance(tokens, list):
+            raise TypeError("tokens must be list")
+        if not isinstance(ac_servers, list):
+            raise TypeError("ac_servers must be list")
+
+        ep = "{}".format(storage._KEY_COL)
+
+        json_out = {'ac_servers': ac_servers}
+        if userdata:
+            json_out['userdata'] = userdata
+        if uid:
+            json_out['uid'] = str(uid)
+
+        res = await self._storage_connection.http_post(ep, json=json_out, tokens=tokens)
+        res_uid = uuid.UUID(res[storage._KEY_COL][0])
+        if uid:
+            assert uid == res_uid
+
+        return res_uid
+
+class AsyncSecretsClient(AsyncStorageClient, storage.SecretsClient):
+
+    async def create(self, tokens, col_uid, data, userdata=None, uid=None):
+
+        if not isinstance(tokens, list):
+            raise TypeError("tokens must be list")
+        if not isinstance(col_uid, uuid.UUID):
+            raise TypeError("col_uid must be uuid")
+        if not (isinstance(data, str) or isinstance(data, native_str)):
+            raise TypeError("data must be string")
+
+        ep = "{}/{}/{}".format(storage._KEY_COL, str(col_uid), storage._KEY_COL_SEC)
+
+        json_out = {'data': data}
+        if userdata:
+            json_out['userdata'] = userdata
+        if uid:
+            json_out['uid'] = str(uid)
+
+        res = await self._storage_connection.http_post(ep, json=json_out, tokens=tokens)
+        res_uid = uuid.UUID(res[storage._KEY_COL_SEC][0])
+        if uid:
+            assert uid == res_uid
+
+        return res_uid
+
+    async def fetch(self, tokens, col_uid, key_uid):
+
+        if not isinstance(tokens, list):
+            raise TypeError("tokens must be list")
+        if not isinstance(col_uid, uuid.UUID):
+            raise TypeError("col_uid must be uuid")
+        if not isinstance(key_uid, uuid.UUID):
+            raise TypeError("key_uid must be uuid")
+
+        ep = "{}/{}/{}/{}/versions/latest".format(storage._KEY_COL, col_uid,
+                                                  storage._KEY_COL_SEC, key_uid)
+        sec = await self._storage_connection.http_get(ep, tokens=tokens)
+        return sec
+
+    async def fetch_many(self, tokens, col_uid, key_uids, max_workers=storage._MAX_WORKERS):
+
+        if not isinstance(tokens, list):
+            raise TypeError("tokens must be list")
+        if not isinstance(col_uid, uuid.UUID):
+            raise TypeError("col_uid must be uuid")
+        if not isinstance(key_uids, list):
+            raise TypeError("key_uids must be list")
+        for key_uid in key_uids:
+            if not isinstance(key_uid, uuid.UUID):
+                raise TypeError("key_uids must contain uuids")
+
+        # At most max_workers GETs in flight at once
+        async def _fetch(key_uid):
+            return await self.fetch(tokens, col_uid, key_uid)
+
+        return await base.gather_many(_fetch, key_uids, max_workers)
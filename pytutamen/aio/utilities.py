@@ -0,0 +1,555 @@
+# -*- coding: utf-8 -*-
+
+
+# Andy Sayler
+# 2016
+# pytutamen Package
+# Utility Functions (asyncio)
+
+
+### Imports ###
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+from builtins import *
+
+import asyncio
+import contextlib
+import uuid
+
+import aiohttp
+
+from .. import config
+from .. import constants
+from .. import accesscontrol as sync_accesscontrol
+from .. import utilities as sync_utilities
+from . import accesscontrol
+from . import storage
+
+
+### Helper Functions ###
+
+prep_connections = sync_utilities.prep_connections
+prep_clients = sync_utilities.prep_clients
+
+async def open_connections(connections):
+    opened = [connection for connection in connections if not connection.is_open]
+    await asyncio.gather(*[connection.open() for connection in opened])
+    return opened
+
+async def close_connections(opened):
+    await asyncio.gather(*[connection.close() for connection in opened])
+
+async def _gather_servers(clients, connection_attr, coro_func):
+    # Run coro_func against every client at once, keyed by server name
+    names = [getattr(client, connection_attr).server_name for client in clients]
+    results = await asyncio.gather(*[coro_func(client) for client in clients])
+    return dict(zip(names, results))
+
+
+### Token Functions ###
+
+@contextlib.contextmanager
+def _tokens_rejected(token_cache, objtype, objperm, objuid=None):
+    # Drop cached tokens for this permission if a server refuses them
+    try:
+        yield
+    except aiohttp.ClientResponseError as err:
+        token_cache = sync_utilities._token_cache(token_cache)
+        if token_cache is not None and err.status in sync_utilities._STATUS_REJECTED:
+            token_cache.invalidate(objtype, objperm, objuid)
+        raise
+
+async def _request_token(authz_client, objtype, objperm, objuid, polling=None):
+
+    uid = await authz_client.request(objtype, objperm, objuid)
+    return await authz_client.wait_token(uid, polling=polling)
+
+async def get_tokens(objtype, objperm, objuid=None, min_tokens=None, polling=None,
+                     token_cache=None,
+                     ac_connections=None, ac_server_names=None,
+                     conf=None, conf_path=None,
+                     account_uid=None, client_uid=None):
+
+    ## Setup Connections ##
+    if not ac_connections:
+        ac_connections = prep_connections(accesscontrol.AsyncACServerConnection,
+                                          server_names=ac_server_names,
+                                          conf=conf, conf_path=conf_path,
+                                          account_uid=account_uid, client_uid=client_uid)
+
+    ## Setup Clients ##
+    authz_clients = prep_clients(accesscontrol.AsyncAuthorizationsClient, ac_connections)
+
+    ## Check Quorum ##
+    if min_tokens is not None:
+        if (min_tokens < 1) or (min_tokens > len(authz_clients)):
+            msg = "min_tokens must be between 1 and {}".format(len(authz_clients))
+            raise ValueError(msg)
+        max_errors = len(authz_clients) - min_tokens
+
+    ## Check Cache ##
+    token_cache = sync_utilities._token_cache(token_cache)
+    tokens = {}
+    errors = {}
+    pending = []
+    for authz_client in authz_clients:
+        srv_name = authz_client.ac_connection.server_name
+        tok = None
+        if token_cache is not None:
+            tok = token_cache.get(authz_client.ac_connection, objtype, objperm, objuid)
+        if tok:
+            tokens[srv_name] = tok
+        else:
+            pending.append(authz_client)
+    if min_tokens is not None and len(tokens) >= min_tokens:
+        pending = []
+    if not pending:
+        return tokens, errors
+
+    ## Open Connections ##
+    ac_opened = await open_connections([client.ac_connection for client in pending])
+
+    ## Get tokens ##
+    # With a quorum, stop polling once min_tokens are granted or can no
+    # longer be granted; abandoned requests land in errors as cancelled.
+    tasks = {}
+    for authz_client in pending:
+        coro = _request_token(authz_client, objtype, objperm, objuid, polling=polling)
+        tasks[asyncio.ensure_future(coro)] = authz_client
+    waiting = set(tasks.keys())
+    try:
+        while waiting:
+            done, waiting = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                authz_client = tasks[task]
+                srv_name = authz_client.ac_connection.server_name
+                try:
+                    tok = task.result()
+                except sync_accesscontrol.AuthorizationException as err:
+                    errors[srv_name] = err
+                else:
+                    tokens[srv_name] = tok
+                    if token_cache is not None:
+                        token_cache.put(authz_client.ac_connection,
+                                        objtype, objperm, objuid, tok)
+            if min_tokens is not None:
+                if (len(tokens) >= min_tokens) or (len(errors) > max_errors):
+                    break
+        for task in waiting:
+            srv_name = tasks[task].ac_connection.server_name
+            errors[srv_name] = sync_accesscontrol.AuthorizationCancelled()
+    finally:
+        for task in waiting:
+            task.cancel()
+        if waiting:
+            await asyncio.wait(waiting)
+
+        ## Close Connections ##
+        await close_connections(ac_opened)
+
+    ## Return ##
+    return tokens, errors
+
+async def _required_tokens(objtype, objperm, objuid=None, min_tokens=None,
+                           token_cache=None, ac_connections=None):
+
+    # As get_tokens, but raise the first failure as the sync helpers do
+    tokens, errors = await get_tokens(objtype, objperm, objuid=objuid, min_tokens=min_tokens,
+                                      token_cache=token_cache, ac_connections=ac_connections)
+    return sync_utilities._require_tokens(tokens, errors, min_tokens)
+
+
+### Verifier Functions ###
+
+async def setup_verifiers(verifier_uid=None, accounts=None, authenticators=None, tokens=None,
+                          verifiers=None,
+                          token_cache=None,
+                          ac_connections=None, ac_server_names=None,
+                          conf=None, conf_path=None,
+                          account_uid=None, client_uid=None):
+
+    ## Arg Defaults ##
+    if not account_uid and ac_connections:
+        account_uid = ac_connections[0].account_uid
+    if not account_uid:
+        if not conf:
+            conf = config.ClientConfig(conf_path=conf_path)
+        account_uid = conf.defaults_get_account_uid()
+        if not account_uid:
+            raise(ValueError("Missing Default Account UID"))
+    if not verifier_uid:
+        verifier_uid = uuid.uuid4()
+    if not verifiers:
+        # Create self-referencing verifier
+        verifiers = [verifier_uid]
+
+    ## Setup Connections ##
+    if not ac_connections:
+        ac_connections = prep_connections(accesscontrol.AsyncACServerConnection,
+                                          server_names=ac_server_names,
+                                          conf=conf, conf_path=conf_path,
+                                          account_uid=account_uid, client_uid=client_uid)
+
+    ## Setup Clients ##
+    verifier_clients = prep_clients(accesscontrol.AsyncVerifiersClient, ac_connections)
+
+    ## Open Connections ##
+    ac_opened = await open_connections(ac_connections)
+
+    # Setup Permissions
+    verifiers = await setup_permissions(constants.TYPE_VERIFIER, objuid=verifier_uid,
+                                        verifiers=verifiers, token_cache=token_cache,
+                                        ac_connections=ac_connections)
+
+    ## Get Verifier Create Tokens ##
+    if not tokens:
+        tokens = await _required_tokens(constants.TYPE_SRV_AC, constants.PERM_CREATE,
+                                        token_cache=token_cache,
+                                        ac_connections=ac_connections)
+
+    ## Setup Verifiers ##
+    if not accounts:
+        accounts = [account_uid]
+    if not authenticators:
+        authenticators = []
+
+    async def _create(client):
+        token = tokens[client.ac_connection.server_name]
+        uid = await client.create([token], uid=verifier_uid,
+                                  accounts=accounts, authenticators=authenticators)
+        assert(uid == verifier_uid)
+
+    with _tokens_rejected(token_cache, constants.TYPE_SRV_AC, constants.PERM_CREATE):
+        await _gather_servers(verifier_clients, 'ac_connection', _create)
+
+    ## Close Connections ##
+    await close_connections(ac_opened)
+
+    ## Return ##
+    return [verifier_uid]
+
+async def fetch_verifiers(verifier_uid, tokens=None,
+                          token_cache=None,
+                          ac_connections=None, ac_server_names=None,
+                          conf=None, conf_path=None,
+                          account_uid=None, client_uid=None):
+
+    ## Setup Connections ##
+    if not ac_connections:
+        ac_connections = prep_connections(accesscontrol.AsyncACServerConnection,
+                                          server_names=ac_server_names,
+                                          conf=conf, conf_path=conf_path,
+                                          account_uid=account_uid, client_uid=client_uid)
+
+    ## Setup Clients ##
+    verifier_clients = prep_clients(accesscontrol.AsyncVerifiersClient, ac_connections)
+
+    ## Open Connections ##
+    ac_opened = await open_connections(ac_connections)
+
+    ## Get Verifier Read Tokens ##
+    if not tokens:
+        tokens = await _required_tokens(constants.TYPE_VERIFIER, constants.PERM_READ,
+                                        objuid=verifier_uid,
+                                        token_cache=token_cache,
+                                        ac_connections=ac_connections)
+
+    ## Fetch Verifiers ##
+    async def _fetch(client):
+        token = tokens[client.ac_connection.server_name]
+        return await client.fetch([token], verifier_uid)
+
+    errors = {}
+    with _tokens_rejected(token_cache, constants.TYPE_VERIFIER, constants.PERM_READ,
+                          verifier_uid):
+        verifiers = await _gather_servers(verifier_clients, 'ac_connection', _fetch)
+
+    ## Close Connections ##
+    await close_connections(ac_opened)
+
+    ## Return ##
+    return verifiers, errors
+
+
+### Permissions Functions ###
+
+async def setup_permissions(objtype, objuid=None, tokens=None,
+                            verifiers=None,
+                            token_cache=None,
+                            ac_connections=None, ac_server_names=None,
+                            conf=None, conf_path=None,
+                            account_uid=None, client_uid=None):
+
+    ## Setup Connections ##
+    if not ac_connections:
+        ac_connections = prep_connections(accesscontrol.AsyncACServerConnection,
+                                          server_names=ac_server_names,
+                                          conf=conf, conf_path=conf_path,
+                                          account_uid=account_uid, client_uid=client_uid)
+
+    ## Setup Clients ##
+    permissions_clients = prep_clients(accesscontrol.AsyncPermissionsClient, ac_connections)
+
+    ## Open Connections ##
+    ac_opened = await open_connections(ac_connections)
+
+    ## Setup Verifiers ##
+    if not verifiers:
+        verifiers = await setup_verifiers(token_cache=token_cache,
+                                          ac_connections=ac_connections)
+
+    ## Get Permission Create Tokens ##
+    if not tokens:
+        tokens = await _required_tokens(constants.TYPE_SRV_AC, constants.PERM_CREATE,
+                                        token_cache=token_cache,
+                                        ac_connections=ac_connections)
+
+    ## Setup Permissions ##
+    async def _create(client):
+        token = tokens[client.ac_connection.server_name]
+        return await client.create([token], objtype, objuid=objuid, v_default=verifiers)
+
+    with _tokens_rejected(token_cache, constants.TYPE_SRV_AC, constants.PERM_CREATE):
+        await _gather_servers(permissions_clients, 'ac_connection', _create)
+
+    ## Close Connections ##
+    await close_connections(ac_opened)
+
+    ## Return ##
+    return verifiers
+
+async def fetch_permissions(objtype, objuid=None, tokens=None,
+                            token_cache=None,
+                            ac_connections=None, ac_server_names=None,
+                            conf=None, conf_path=None,
+                            account_uid=None, client_uid=None):
+
+    ## Setup Connections ##
+    if not ac_connections:
+        ac_connections = prep_connections(accesscontrol.AsyncACServerConnection,
+                                          server_names=ac_server_names,
+                                          conf=conf, conf_path=conf_path,
+                                          account_uid=account_uid, client_uid=client_uid)
+
+    ## Setup Clients ##
+    permissions_clients = prep_clients(accesscontrol.AsyncPermissionsClient, ac_connections)
+
+    ## Open Connections ##
+    ac_opened = await open_connections(ac_connections)
+
+    ## Get Permission Read Tokens ##
+    if not tokens:
+        tokens = await _required_tokens(objtype, constants.PERM_PERMS, objuid=objuid,
+                                        token_cache=token_cache,
+                                        ac_connections=ac_connections)
+
+    ## Fetch Permissions ##
+    async def _fetch(client):
+        token = tokens[client.ac_connection.server_name]
+        return await client.fetch([token], objtype, objuid=objuid)
+
+    errors = {}
+    with _tokens_rejected(token_cache, objtype, constants.PERM_PERMS, objuid):
+        spermissions = await _gather_servers(permissions_clients, 'ac_connection', _fetch)
+
+    ## Close Connections ##
+    await close_connections(ac_opened)
+
+    ## Return ##
+    return spermissions, errors
+
+
+### Collection Functions ###
+
+async def setup_collection(col_uid=None, ac_server_urls=None, tokens=None,
+                           verifiers=None, min_tokens=None,
+                           storage_connections=None, storage_server_names=None,
+                           token_cache=None,
+                           ac_connections=None, ac_server_names=None,
+                           conf=None, conf_path=None,
+                           account_uid=None, client_uid=None):
+
+    ## Setup Connections ##
+    if not storage_connections:
+        storage_connections = prep_connections(storage.AsyncStorageServerConnection,
+                                               server_names=storage_server_names,
+                                               conf=conf, conf_path=conf_path,
+                                               account_uid=account_uid, client_uid=client_uid)
+    if not ac_connections:
+        ac_connections = prep_connections(accesscontrol.AsyncACServerConnection,
+                                          server_names=ac_server_names,
+                                          conf=conf, conf_path=conf_path,
+                                          account_uid=account_uid, client_uid=client_uid)
+
+    ## Setup Clients ##
+    collection_clients = prep_clients(storage.AsyncCollectionsClient, storage_connections)
+
+    ## Open Connections ##
+    storage_opened, ac_opened = await asyncio.gather(open_connections(storage_connections),
+                                                     open_connections(ac_connections))
+
+    ## Setup Collection ##
+
+    # Setup UID
+    if not col_uid:
+        col_uid = uuid.uuid4()
+
+    # Setup URLS
+    ac_server_urls = []
+    for ac_connection in ac_connections:
+        ac_server_urls.append(ac_connection.url_srv)
+
+    # Setup Permissions and Get Storage Server Create Tokens
+    perms = setup_permissions(constants.TYPE_COL, objuid=col_uid, verifiers=verifiers,
+                              token_cache=token_cache, ac_connections=ac_connections)
+    if not tokens:
+        verifiers, tokens = await asyncio.gather(
+            perms, _required_tokens(constants.TYPE_SRV_STORAGE, constants.PERM_CREATE,
+                                    min_tokens=min_tokens, token_cache=token_cache,
+                                    ac_connections=ac_connections))
+    else:
+        verifiers = await perms
+
+    # Create Collections
+    token_list = list(tokens.values())
+
+    async def _create(client):
+        uid = await client.create(token_list, ac_server_urls, uid=col_uid)
+        assert(uid == col_uid)
+
+    with _tokens_rejected(token_cache, constants.TYPE_SRV_STORAGE, constants.PERM_CREATE):
+        await _gather_servers(collection_clients, 'storage_connection', _create)
+
+    ## Close Connections ##
+    await asyncio.gather(close_connections(storage_opened), close_connections(ac_opened))
+
+    ## Return ##
+    return col_uid, verifiers
+
+
+### Secret Functions ###
+
+async def store_secret(sec_data, sec_uid=None, tokens=None,
+                       col_uid=None, verifiers=None, min_tokens=None,
+                       storage_connections=None, storage_server_names=None,
+                       token_cache=None,
+                       ac_connections=None, ac_server_names=None,
+                       conf=None, conf_path=None,
+                       account_uid=None, client_uid=None):
+
+    ## Setup Connections ##
+    if not storage_connections:
+        storage_connections = prep_connections(storage.AsyncStorageServerConnection,
+                                               server_names=storage_server_names,
+                                               conf=conf, conf_path=conf_path,
+                                               account_uid=account_uid, client_uid=client_uid)
+    if not ac_connections:
+        ac_connections = prep_connections(accesscontrol.AsyncACServerConnection,
+                                          server_names=ac_server_names,
+                                          conf=conf, conf_path=conf_path,
+                                          account_uid=account_uid, client_uid=client_uid)
+
+    ## Setup Clients ##
+    secret_clients = prep_clients(storage.AsyncSecretsClient, storage_connections)
+
+    ## Open Connections ##
+    storage_opened, ac_opened = await asyncio.gather(open_connections(storage_connections),
+                                                     open_connections(ac_connections))
+
+    ## Setup Secret ##
+
+    # Setup UID
+    if not sec_uid:
+        sec_uid = uuid.uuid4()
+
+    # Setup Collection
+    if not col_uid:
+        col_uid, verifiers = await setup_collection(verifiers=verifiers,
+                                                    min_tokens=min_tokens,
+                                                    token_cache=token_cache,
+                                                    storage_connections=storage_connections,
+                                                    ac_connections=ac_connections)
+
+    # Get Collection Create Tokens
+    if not tokens:
+        tokens = await _required_tokens(constants.TYPE_COL, constants.PERM_CREATE,
+                                        objuid=col_uid,
+                                        min_tokens=min_tokens,
+                                        token_cache=token_cache,
+                                        ac_connections=ac_connections)
+
+    # Create Secret
+    # Todo: shard
+    token_list = list(tokens.values())
+
+    async def _create(client):
+        uid = await client.create(token_list, col_uid, sec_data, uid=sec_uid)
+        assert(uid == sec_uid)
+
+    with _tokens_rejected(token_cache, constants.TYPE_COL, constants.PERM_CREATE, col_uid):
+        await _gather_servers(secret_clients, 'storage_connection', _create)
+
+    ## Close Connections ##
+    await asyncio.gather(close_connections(storage_opened), close_connections(ac_opened))
+
+    ## Return ##
+    return sec_uid, col_uid, verifiers
+
+async def fetch_secret(sec_uid, col_uid, tokens=None, min_tokens=None,
+                       storage_connections=None, storage_server_names=None,
+                       token_cache=None,
+                       ac_connections=None, ac_server_names=None,
+                       conf=None, conf_path=None,
+                       account_uid=None, client_uid=None):
+
+    ## Setup Connections ##
+    if not storage_connections:
+        storage_connections = prep_connections(storage.AsyncStorageServerConnection,
+                                               server_names=storage_server_names,
+                                               conf=conf, conf_path=conf_path,
+                                               account_uid=account_uid, client_uid=client_uid)
+    if not ac_connections:
+        ac_connections = prep_connections(accesscontrol.AsyncACServerConnection,
+                                          server_names=ac_server_names,
+                                          conf=conf, conf_path=conf_path,
+                                          account_uid=account_uid, client_uid=client_uid)
+
+    ## Setup Clients ##
+    secret_clients = prep_clients(storage.AsyncSecretsClient, storage_connections)
+
+    ## Open Connections ##
+    storage_opened, ac_opened = await asyncio.gather(open_connections(storage_connections),
+                                                     open_connections(ac_connections))
+
+    ## Fetch Secret ##
+
+    # Get Collection read Tokens
+    if not tokens:
+        tokens = await _required_tokens(constants.TYPE_COL, constants.PERM_READ,
+                                        objuid=col_uid,
+                                        min_tokens=min_tokens,
+                                        token_cache=token_cache,
+                                        ac_connections=ac_connections)
+
+    # Read Secret
+    # Todo: unshard
+    token_list = list(tokens.values())
+
+    async def _fetch(client):
+        return await client.fetch(token_list, col_uid, sec_uid)
+
+    with _tokens_rejected(token_cache, constants.TYPE_COL, constants.PERM_READ, col_uid):
+        secs = await _gather_servers(secret_clients, 'storage_connection', _fetch)
+    for sec in secs.values():
+        sec_data = sec['data']
+
+    ## Close Connections ##
+    await asyncio.gather(close_connections(storage_opened), close_connections(ac_opened))
+
+    ## Return ##
+    return str(sec_data)
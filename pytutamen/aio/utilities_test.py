@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+
+# Andy Sayler
+# 2016
+# pytutamen Package
+# Utility Function Tests (asyncio)
+
+
+### Imports ###
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+from builtins import *
+
+import unittest
+import uuid
+
+from .. import accesscontrol as sync_accesscontrol
+from ..accesscontrol_test import _AuthzServer, _serve
+from ..utilities_test import _StorageServer, _conf
+
+# The asyncio client needs Python 3.5+ and aiohttp
+try:
+    import asyncio
+    from . import accesscontrol
+    from . import storage
+    from . import utilities
+except (ImportError, SyntaxError):
+    utilities = None
+
+
+### Tests ###
+
+@unittest.skipIf(utilities is None, "asyncio client not available")
+class AsyncUtilitiesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def _run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def _connections(self, ac_statuses=('approved',), storage_count=1):
+
+        # Open connections to fresh stand-in servers until the end of the test
+        ac_srvs = {}
+        for idx, status in enumerate(ac_statuses):
+            ac_srvs["ac{}".format(idx)] = _serve(self, _AuthzServer(status=status))
+        storage_srvs = {}
+        for idx in range(storage_count):
+            storage_srvs["storage{}".format(idx)] = _serve(self, _StorageServer())
+        conf = _conf(ac_srvs, storage_srvs)
+
+        ac_connections = []
+        for name in sorted(ac_srvs):
+            ac_connections.append(accesscontrol.AsyncACServerConnection(
+                server_name=name, conf=conf, no_client_crt=True))
+        storage_connections = []
+        for name in sorted(storage_srvs):
+            storage_connections.append(storage.AsyncStorageServerConnection(
+                server_name=name, conf=conf))
+        for connection in ac_connections + storage_connections:
+            self._run(connection.open())
+            self.addCleanup(self._run, connection.close())
+        return ac_connections, storage_connections
+
+    def test_get_tokens(self):
+        ac_connections, storage_connections = self._connections(('approved', 'denied'))
+        tokens, errors = self._run(utilities.get_tokens('collection', 'read', objuid='a',
+                                                        ac_connections=ac_connections))
+        self.assertEqual(list(tokens.keys()), ['ac0'])
+        self.assertIsInstance(errors['ac1'], sync_accesscontrol.AuthorizationDenied)
+
+    def test_store_fetch(self):
+        ac_connections, storage_connections = self._connections(storage_count=2)
+        col_uid = uuid.uuid4()
+        sec_uid, col, verifiers = self._run(utilities.store_secret(
+            "data", col_uid=col_uid, verifiers=[uuid.uuid4()],
+            storage_connections=storage_connections, ac_connections=ac_connections))
+        self.assertEqual(col, col_uid)
+        sec_data = self._run(utilities.fetch_secret(
+            sec_uid, col_uid,
+            storage_connections=storage_connections, ac_connections=ac_connections))
+        self.assertEqual(sec_data, "data")
+
+    def test_denied(self):
+        # The server's own error, not a KeyError for the missing token
+        ac_connections, storage_connections = self._connections(('denied',))
+        kwargs = {'storage_connections': storage_connections,
+                  'ac_connections': ac_connections}
+        with self.assertRaises(sync_accesscontrol.AuthorizationDenied):
+            self._run(utilities.fetch_secret(uuid.uuid4(), uuid.uuid4(), **kwargs))
+        with self.assertRaises(sync_accesscontrol.AuthorizationDenied):
+            self._run(utilities.store_secret("data", col_uid=uuid.uuid4(), **kwargs))
+        with self.assertRaises(sync_accesscontrol.AuthorizationDenied):
+            self._run(utilities.setup_collection(verifiers=[uuid.uuid4()], **kwargs))
+        with self.assertRaises(sync_accesscontrol.AuthorizationDenied):
+            self._run(utilities.fetch_verifiers(uuid.uuid4(),
+                                                ac_connections=ac_connections))
+
+    def test_quorum(self):
+        ac_connections, storage_connections = self._connections(('approved', 'denied'))
+        kwargs = {'storage_connections': storage_connections,
+                  'ac_connections': ac_connections}
+        sec_uid, col_uid, verifiers = self._run(utilities.store_secret(
+            "data", col_uid=uuid.uuid4(), min_tokens=1, **kwargs))
+        self.assertEqual(self._run(utilities.fetch_secret(sec_uid, col_uid, min_tokens=1,
+                                                          **kwargs)), "data")
+        with self.assertRaises(sync_accesscontrol.AuthorizationDenied):
+            self._run(utilities.fetch_secret(sec_uid, col_uid, **kwargs))
@@ -19,8 +19,19 @@ from builtins import *
 
 import os
 import os.path
+import ssl
+import threading
+import weakref
+
+try:
+    from time import monotonic as _monotonic
+except ImportError:
+    from time import time as _monotonic
 
 import requests
+import requests.adapters
+import requests.utils
+import requests.packages.urllib3.util.ssl_
 
 
 ### Constants ###
@@ -30,6 +41,16 @@ _API_VERSION = 'v1'
 _TOKENS_DELIMINATOR = ':'
 _TOKENS_HEADER = 'tutamen-tokens'
 
+_POOL_SIZE = 10
+_POOL_IDLE_TIMEOUT = 60
+_WARM_TIMEOUT = 10
+
+_TLS_RESUMPTION = hasattr(ssl, 'SSLSession')
+
+# urllib3 1.13+ (requests 2.9+) pools accept a prebuilt ssl_context
+_TLS_CONTEXT_POOLS = (hasattr(ssl, 'SSLContext') and
+                      hasattr(requests.packages.urllib3.util.ssl_, 'create_urllib3_context'))
+
 
 ### Exceptions ###
 
@@ -40,13 +61,305 @@ class ClientException(Exception):
     pass
 
 
+### TLS Objects ###
+
+# Session resumption needs Python 3.6+; older interpreters lack the
+# ssl classes these extend
+if _TLS_RESUMPTION:
+
+    class _ResumingSSLSocket(ssl.SSLSocket):
+
+        def close(self):
+            # Tickets may only have arrived with the data, keep the latest
+            if self._sslobj is not None:
+                self.context._session_save(self)
+            super().close()
+
+    class _ResumingSSLObject(ssl.SSLObject):
+
+        def unwrap(self):
+            self.context._session_save(self)
+            return super().unwrap()
+
+    class _ResumingSSLContext(ssl.SSLContext):
+
+        # OpenSSL does not reuse client sessions on its own, so remember the
+        # last session per host and offer it on the next connection to skip
+        # the full handshake.
+
+        sslsocket_class = _ResumingSSLSocket
+        sslobject_class = _ResumingSSLObject
+
+        def __init__(self, *args, **kwargs):
+            super().__init__()
+            self._tls_lock = threading.Lock()
+            self._tls_sessions = {}
+            self._tls_conns = {}
+
+        def _session_get(self, server_hostname):
+            with self._tls_lock:
+                # TLS 1.3 tickets arrive after the handshake, so prefer the
+                # session of the last live connection over the stored one
+                ref = self._tls_conns.get(server_hostname)
+                conn = ref() if ref else None
+                session = getattr(conn, 'session', None) if conn is not None else None
+                if session is not None:
+                    self._tls_sessions[server_hostname] = session
+                return self._tls_sessions.get(server_hostname)
+
+        def _session_put(self, server_hostname, conn):
+            with self._tls_lock:
+                self._tls_conns[server_hostname] = weakref.ref(conn)
+            self._session_save(conn)
+
+        def _session_save(self, conn):
+            server_hostname = getattr(conn, 'server_hostname', None)
+            try:
+                session = conn.session
+            except (ValueError, AttributeError):
+                session = None
+            if server_hostname and session is not None:
+                with self._tls_lock:
+                    self._tls_sessions[server_hostname] = session
+
+        def wrap_socket(self, sock, *args, **kwargs):
+            server_hostname = kwargs.get('server_hostname')
+            if not server_hostname or kwargs.get('session'):
+                return super().wrap_socket(sock, *args, **kwargs)
+            kwargs['session'] = self._session_get(server_hostname)
+            conn = super().wrap_socket(sock, *args, **kwargs)
+            self._session_put(server_hostname, conn)
+            return conn
+
+        def wrap_bio(self, incoming, outgoing, *args, **kwargs):
+            # Used by asyncio transports
+            server_hostname = kwargs.get('server_hostname')
+            if not server_hostname or kwargs.get('session'):
+                return super().wrap_bio(incoming, outgoing, *args, **kwargs)
+            kwargs['session'] = self._session_get(server_hostname)
+            conn = super().wrap_bio(incoming, outgoing, *args, **kwargs)
+            self._session_put(server_hostname, conn)
+            return conn
+
+    _SSLContext = _ResumingSSLContext
+
+else:
+
+    _SSLContext = getattr(ssl, 'SSLContext', None)
+
+def _new_ssl_context(ca_path, client_cert):
+
+    protocol = getattr(ssl, 'PROTOCOL_TLS_CLIENT', ssl.PROTOCOL_SSLv23)
+    ctx = _SSLContext(protocol)
+    ctx.verify_mode = ssl.CERT_REQUIRED
+    ctx.check_hostname = True
+
+    # Match what requests verifies against when given no CA
+    if not ca_path:
+        ca_path = requests.utils.DEFAULT_CA_BUNDLE_PATH
+    if os.path.isdir(ca_path):
+        ctx.load_verify_locations(capath=ca_path)
+    else:
+        ctx.load_verify_locations(cafile=ca_path)
+
+    if client_cert:
+        ctx.load_cert_chain(*client_cert)
+    return ctx
+
+_SSL_CONTEXTS = {}
+_SSL_CONTEXTS_LOCK = threading.Lock()
+
+def get_ssl_context(ca_path=None, client_cert=None):
+
+    # One context per (CA, cert, key), kept for the life of the process
+    key = (ca_path, tuple(client_cert) if client_cert else None)
+    with _SSL_CONTEXTS_LOCK:
+        ctx = _SSL_CONTEXTS.get(key)
+        if ctx is None:
+            ctx = _new_ssl_context(ca_path, client_cert)
+            _SSL_CONTEXTS[key] = ctx
+    return ctx
+
+def clear_ssl_contexts():
+
+    # Forget cached contexts, e.g. after rotating a client cert in place
+    with _SSL_CONTEXTS_LOCK:
+        _SSL_CONTEXTS.clear()
+
+class SSLContextAdapter(requests.adapters.HTTPAdapter):
+
+    def __init__(self, ssl_context, *args, **kwargs):
+
+        # Setup Properties (the parent builds the pool manager)
+        self._ssl_context = ssl_context
+
+        # Call Parent
+        super().__init__(*args, **kwargs)
+
+    @property
+    def ssl_context(self):
+        return self._ssl_context
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self._ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, *args, **kwargs):
+        kwargs['ssl_context'] = self._ssl_context
+        return super().proxy_manager_for(*args, **kwargs)
+
+    def cert_verify(self, conn, url, verify, cert):
+        # CA and client cert already live in the context; passing the paths
+        # on would make urllib3 load them again for every connection
+        super().cert_verify(conn, url, verify, None)
+        conn.ca_certs = None
+        conn.ca_cert_dir = None
+        conn.cert_file = None
+        conn.key_file = None
+
+def new_session(server_url, ca_path=None, client_cert=None, pool_size=_POOL_SIZE):
+
+    ses = requests.Session()
+    if server_url.startswith("https") and _TLS_CONTEXT_POOLS:
+        adapter = SSLContextAdapter(get_ssl_context(ca_path, client_cert),
+                                    pool_connections=1, pool_maxsize=pool_size)
+    else:
+        # Older requests: urllib3 loads the CA and cert per connection
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=pool_size)
+        ses.verify = ca_path if ca_path else True
+        if client_cert:
+            ses.cert = tuple(client_cert)
+    ses.mount('https://', adapter)
+    ses.mount('http://', adapter)
+    return ses
+
+
+### Pool Objects ###
+
+class SessionPool(object):
+
+    def __init__(self, pool_size=_POOL_SIZE, idle_timeout=_POOL_IDLE_TIMEOUT, keep_alive=True):
+
+        # Check Args
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        if idle_timeout <= 0:
+            raise ValueError("idle_timeout must be positive")
+
+        # Call Parent
+        super().__init__()
+
+        # Setup Properties
+        self._pool_size = pool_size
+        self._idle_timeout = idle_timeout
+        self._keep_alive = keep_alive
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    @property
+    def pool_size(self):
+        return self._pool_size
+
+    @property
+    def idle_timeout(self):
+        return self._idle_timeout
+
+    @property
+    def keep_alive(self):
+        return self._keep_alive
+
+    def _key(self, server_url, ca_path, client_cert):
+        return (server_url, ca_path, tuple(client_cert) if client_cert else None)
+
+    def _new_session(self, server_url, ca_path, client_cert):
+
+        ses = new_session(server_url, ca_path, client_cert, pool_size=self._pool_size)
+        if not self._keep_alive:
+            ses.headers['Connection'] = 'close'
+        return ses
+
+    def _evict_idle(self, now):
+        # Caller must hold lock; returns sessions to close outside of it
+        evicted = []
+        for key in list(self._idle.keys()):
+            fresh = []
+            for ses, released in self._idle[key]:
+                if (now - released) > self._idle_timeout:
+                    evicted.append(ses)
+                else:
+                    fresh.append((ses, released))
+            if fresh:
+                self._idle[key] = fresh
+            else:
+                del self._idle[key]
+        return evicted
+
+    def borrow(self, server_url, ca_path=None, client_cert=None):
+
+        key = self._key(server_url, ca_path, client_cert)
+        ses = None
+        with self._lock:
+            evicted = self._evict_idle(_monotonic())
+            idle = self._idle.get(key)
+            if idle:
+                # Most recently used first, it is the most likely to be warm
+                ses, released = idle.pop()
+        for old in evicted:
+            old.close()
+        if ses is None:
+            ses = self._new_session(server_url, ca_path, client_cert)
+        return ses
+
+    def release(self, session, server_url, ca_path=None, client_cert=None):
+
+        if not self._keep_alive:
+            session.close()
+            return
+
+        key = self._key(server_url, ca_path, client_cert)
+        with self._lock:
+            now = _monotonic()
+            evicted = self._evict_idle(now)
+            idle = self._idle.setdefault(key, [])
+            idle.append((session, now))
+            while len(idle) > self._pool_size:
+                old, released = idle.pop(0)
+                evicted.append(old)
+        for old in evicted:
+            old.close()
+
+    def clear(self):
+
+        with self._lock:
+            idle = self._idle
+            self._idle = {}
+        for sessions in idle.values():
+            for ses, released in sessions:
+                ses.close()
+
+_SESSION_POOL = SessionPool()
+
+def get_session_pool():
+    return _SESSION_POOL
+
+def set_session_pool(pool):
+
+    global _SESSION_POOL
+    if not isinstance(pool, SessionPool):
+        raise TypeError("pool must be an instance of {}".format(SessionPool))
+    old = _SESSION_POOL
+    _SESSION_POOL = pool
+    old.clear()
+
+
 ### Objects ###
 
 class ServerConnection(object):
 
     def __init__(self, server_url=None, server_name=None, server_ca_crt_path=None,
                  account_uid=None, client_uid=None, no_client_crt=False,
-                 conf=None, conf_path=None):
+                 session_pool=None, conf=None, conf_path=None):
 
         # Check Args
         if not server_url:
@@ -62,6 +375,8 @@ class ServerConnection(object):
         self._server_name = server_name
         self._path_ca = server_ca_crt_path
         self._session = None
+        self._session_pool = session_pool
+        self._session_source = None
 
         # Setup Conf
         if not conf:
@@ -83,35 +398,52 @@ class ServerConnection(object):
         # Get Certs
         if not no_client_crt:
 
-            client_key_path = conf.path_client_key(account_uid, client_uid)
-            if not os.path.isfile(client_key_path):
+            if not conf.client_has_key(account_uid, client_uid):
                 raise(ServerConnectionException("Missing Client Key"))
-            self._client_key_path = client_key_path
+            self._client_key_path = conf.path_client_key(account_uid, client_uid)
 
-            client_crt_path = conf.path_client_crt(account_uid, client_uid, server_name)
-            if not os.path.isfile(client_crt_path):
+            if not conf.client_has_crt(account_uid, client_uid, server_name):
                 raise(ServerConnectionException("Missing Client Cert"))
-            self._client_crt_path = client_crt_path
+            self._client_crt_path = conf.path_client_crt(account_uid, client_uid, server_name)
 
         else:
             self._client_key_path = None
             self._client_crt_path = None
 
+    def _pool(self):
+        # None selects the process-wide pool, False disables pooling
+        if self._session_pool is None:
+            return get_session_pool()
+        return self._session_pool
+
+    def _client_cert(self):
+        if self._client_crt_path and self._client_key_path:
+            return (self._conf.path_real(self._client_crt_path),
+                    self._conf.path_real(self._client_key_path))
+        else:
+            return None
+
     def open(self):
         if not self._session:
-            ses = requests.Session()
-            if self._path_ca:
-                ses.verify = self._path_ca
+            pool = self._pool()
+            if pool:
+                ses = pool.borrow(self._url_server, ca_path=self._path_ca,
+                                  client_cert=self._client_cert())
             else:
-                ses.verify = True
-            if self._client_crt_path and self._client_key_path:
-                ses.cert = (self._client_crt_path, self._client_key_path)
+                ses = new_session(self._url_server, self._path_ca, self._client_cert())
             self._session = ses
+            self._session_source = pool
 
     def close(self):
         if self._session:
-            self._session.close()
+            pool = self._session_source
+            if pool:
+                pool.release(self._session, self._url_server, ca_path=self._path_ca,
+                             client_cert=self._client_cert())
+            else:
+                self._session.close()
             self._session = None
+            self._session_source = None
 
     def __enter__(self):
         self.open()
@@ -125,10 +457,31 @@ class ServerConnection(object):
     def is_open(self):
         return bool(self._session)
 
+    def warm(self):
+        # Connect ahead of the first request so TCP and TLS setup can
+        # overlap other work; failures are left for that request to report
+        self.open()
+        try:
+            self._session.head(self.url_api, timeout=_WARM_TIMEOUT).close()
+        except requests.RequestException:
+            pass
+
     @property
     def server_name(self):
         return self._server_name
 
+    @property
+    def conf(self):
+        return self._conf
+
+    @property
+    def account_uid(self):
+        return self._account_uid
+
+    @property
+    def client_uid(self):
+        return self._client_uid
+
     @property
     def url_srv(self):
         return self._url_server
@@ -165,10 +518,10 @@ class ServerConnection(object):
         res.raise_for_status()
         return res.json()
 
-    def http_get(self, endpoint=None, tokens=None, auth=None):
+    def http_get(self, endpoint=None, tokens=None, auth=None, params=None):
         url = "{:s}/{:s}/".format(self.url_api, endpoint)
         header = self._tokens_to_header(tokens)
-        res = self._session.get(url, headers=header, auth=auth)
+        res = self._session.get(url, headers=header, auth=auth, params=params)
         res.raise_for_status()
         return res.json()
 
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+
+# Andy Sayler
+# 2016
+# pytutamen Package
+# Base Connection Tests
+
+
+### Imports ###
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+from builtins import *
+
+import datetime
+import io
+import os.path
+import shutil
+import ssl
+import tempfile
+import threading
+import unittest
+
+import http.server
+import socketserver
+
+import requests
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from . import base
+
+
+### Test Certs ###
+
+def _name(common_name):
+    return x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+
+def _cert(common_name, key, issuer_name, issuer_key, ca=False, dns_name=None):
+
+    now = datetime.datetime.utcnow()
+    builder = x509.CertificateBuilder()
+    builder = builder.subject_name(_name(common_name))
+    builder = builder.issuer_name(issuer_name)
+    builder = builder.public_key(key.public_key())
+    builder = builder.serial_number(x509.random_serial_number())
+    builder = builder.not_valid_before(now - datetime.timedelta(minutes=5))
+    builder = builder.not_valid_after(now + datetime.timedelta(days=1))
+    builder = builder.add_extension(x509.BasicConstraints(ca=ca, path_length=None),
+                                    critical=True)
+    if dns_name:
+        builder = builder.add_extension(x509.SubjectAlternativeName([x509.DNSName(dns_name)]),
+                                        critical=False)
+    return builder.sign(issuer_key, hashes.SHA256(), default_backend())
+
+class _PKI(object):
+
+    # A throwaway CA with a 'localhost' server cert and a client cert, all
+    # written to a temp dir
+
+    def __init__(self, path):
+
+        ca_key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+        ca_crt = _cert("Test CA", ca_key, _name("Test CA"), ca_key, ca=True)
+        self.ca_path = self._write(path, "ca_crt.pem", ca_crt)
+
+        srv_key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+        srv_crt = _cert("localhost", srv_key, ca_crt.subject, ca_key, dns_name="localhost")
+        self.srv_cert = (self._write(path, "srv_crt.pem", srv_crt),
+                         self._write(path, "srv_key.pem", srv_key))
+
+        cli_key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+        cli_crt = _cert("client", cli_key, ca_crt.subject, ca_key)
+        self.client_cert = (self._write(path, "cli_crt.pem", cli_crt),
+                            self._write(path, "cli_key.pem", cli_key))
+
+    def _write(self, path, name, obj):
+        if isinstance(obj, x509.Certificate):
+            data = obj.public_bytes(serialization.Encoding.PEM)
+        else:
+            data = obj.private_bytes(serialization.Encoding.PEM,
+                                     serialization.PrivateFormat.TraditionalOpenSSL,
+                                     serialization.NoEncryption())
+        file_path = os.path.join(path, name)
+        with io.open(file_path, 'wb') as f:
+            f.write(data)
+        return file_path
+
+
+### Stand-in Server ###
+
+class _TLSServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+
+    # HTTPS server closing each connection after one request, so every
+    # request needs a new handshake. Records per request whether the
+    # handshake resumed a session and the client cert's common name.
+
+    daemon_threads = True
+
+    def __init__(self, pki):
+        http.server.HTTPServer.__init__(self, ('127.0.0.1', 0), _TLSHandler)
+        ctx = ssl.SSLContext(getattr(ssl, 'PROTOCOL_TLS_SERVER', ssl.PROTOCOL_SSLv23))
+        ctx.load_cert_chain(*pki.srv_cert)
+        ctx.load_verify_locations(cafile=pki.ca_path)
+        ctx.verify_mode = ssl.CERT_OPTIONAL
+        self.socket = ctx.wrap_socket(self.socket, server_side=True)
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def url(self, host="localhost"):
+        return "https://{}:{}".format(host, self.server_address[1])
+
+class _TLSHandler(http.server.BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        peer = self.connection.getpeercert() or {}
+        subject = dict(item[0] for item in peer.get('subject', ()))
+        with self.server.lock:
+            self.server.requests.append((getattr(self.connection, 'session_reused', None),
+                                         subject.get('commonName')))
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+
+### Tests ###
+
+@unittest.skipUnless(base._TLS_CONTEXT_POOLS, "requests too old for shared SSL contexts")
+class SessionTLSTestCase(unittest.TestCase):
+
+    def setUp(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        self.addCleanup(base.clear_ssl_contexts)
+        self.pki = _PKI(path)
+        self.srv = _TLSServer(self.pki)
+        thread = threading.Thread(target=self.srv.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.srv.server_close)
+        self.addCleanup(self.srv.shutdown)
+
+    def _session(self, ca_path=None, client_cert=None):
+        ses = base.new_session(self.srv.url(), ca_path or self.pki.ca_path,
+                               client_cert or self.pki.client_cert)
+        self.addCleanup(ses.close)
+        return ses
+
+    def test_verified(self):
+        ses = self._session()
+        res = ses.get(self.srv.url())
+        self.assertEqual(res.text, "ok")
+        # The client cert comes from the shared context
+        self.assertEqual(self.srv.requests[0][1], "client")
+
+    @unittest.skipUnless(base._TLS_RESUMPTION, "ssl lacks session resumption")
+    def test_session_reused(self):
+        ses = self._session()
+        for i in range(3):
+            ses.get(self.srv.url())
+        self.assertEqual([req[0] for req in self.srv.requests], [False, True, True])
+
+        # New sessions for the same CA and cert share the context, and so
+        # the TLS session too
+        self._session().get(self.srv.url())
+        self.assertTrue(self.srv.requests[-1][0])
+
+    def test_hostname(self):
+        ses = self._session()
+        with self.assertRaises(requests.exceptions.SSLError):
+            ses.get(self.srv.url(host="127.0.0.1"))
+        self.assertEqual(self.srv.requests, [])
+
+    def test_ca(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        other = _PKI(path)
+        ses = self._session(ca_path=other.ca_path, client_cert=other.client_cert)
+        with self.assertRaises(requests.exceptions.SSLError):
+            ses.get(self.srv.url())
+        self.assertEqual(self.srv.requests, [])
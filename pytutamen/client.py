@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+
+# Andy Sayler
+# 2016
+# pytutamen Package
+# Long-Lived Client
+
+
+### Imports ###
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+from builtins import *
+
+import threading
+
+from . import config
+from . import accesscontrol
+from . import storage
+from . import utilities
+
+
+### Client Objects ###
+
+class TutamenClient(object):
+
+    # Holds one config, one set of open AC and storage connections and a
+    # token cache for its lifetime, so each call only makes the requests
+    # it needs. Connections are built on first use.
+
+    def __init__(self, ac_server_names=None, storage_server_names=None,
+                 account_uid=None, client_uid=None,
+                 token_cache=None, session_pool=None, use_default_verifier=False,
+                 conf=None, conf_path=None):
+
+        # Call Parent
+        super().__init__()
+
+        # Setup Conf
+        if not conf:
+            conf = config.ClientConfig(conf_path=conf_path)
+
+        # Setup Token Cache (None builds one for this client, True shares the
+        # process-wide one, False disables)
+        if token_cache is None:
+            token_cache = accesscontrol.TokenCache()
+
+        # Setup Properties
+        self._conf = conf
+        self._ac_server_names = ac_server_names
+        self._storage_server_names = storage_server_names
+        self._account_uid = account_uid
+        self._client_uid = client_uid
+        self._token_cache = token_cache
+        self._session_pool = session_pool
+        self._use_default_verifier = use_default_verifier
+        self._ac_connections = None
+        self._storage_connections = None
+        self._lock = threading.Lock()
+
+    @property
+    def conf(self):
+        return self._conf
+
+    @property
+    def token_cache(self):
+        return self._token_cache
+
+    def _connections(self, connection_type, server_names):
+
+        if not server_names:
+            server_names = [None]
+        connections = []
+        try:
+            for server_name in server_names:
+                connection = connection_type(server_name=server_name, conf=self._conf,
+                                             account_uid=self._account_uid,
+                                             client_uid=self._client_uid,
+                                             session_pool=self._session_pool)
+                connection.open()
+                connections.append(connection)
+        except Exception:
+            utilities.close_connections(connections)
+            raise
+        return connections
+
+    @property
+    def ac_connections(self):
+        with self._lock:
+            if self._ac_connections is None:
+                self._ac_connections = self._connections(accesscontrol.ACServerConnection,
+                                                         self._ac_server_names)
+            return list(self._ac_connections)
+
+    @property
+    def storage_connections(self):
+        with self._lock:
+            if self._storage_connections is None:
+                self._storage_connections = self._connections(storage.StorageServerConnection,
+                                                              self._storage_server_names)
+            return list(self._storage_connections)
+
+    def close(self):
+        with self._lock:
+            ac_connections = self._ac_connections or []
+            storage_connections = self._storage_connections or []
+            self._ac_connections = None
+            self._storage_connections = None
+        utilities.close_connections(ac_connections)
+        utilities.close_connections(storage_connections)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _ac_kwargs(self, kwargs):
+        if 'ac_connections' not in kwargs:
+            kwargs['ac_connections'] = self.ac_connections
+        kwargs.setdefault('token_cache', self._token_cache)
+        kwargs.setdefault('conf', self._conf)
+        return kwargs
+
+    def _storage_kwargs(self, kwargs):
+        if 'storage_connections' not in kwargs:
+            kwargs['storage_connections'] = self.storage_connections
+        return self._ac_kwargs(kwargs)
+
+    def _verifier_kwargs(self, kwargs):
+        # Calls that create permissions reuse the account's default
+        # verifier only if this client opted in
+        kwargs.setdefault('use_default_verifier', self._use_default_verifier)
+        return kwargs
+
+    ## Tokens ##
+
+    def get_tokens(self, objtype, objperm, objuid=None, **kwargs):
+        return utilities.get_tokens(objtype, objperm, objuid=objuid,
+                                    **self._ac_kwargs(kwargs))
+
+    def get_tokens_many(self, objects, **kwargs):
+        return utilities.get_tokens_many(objects, **self._ac_kwargs(kwargs))
+
+    def invalidate_tokens(self, objtype=None, objperm=None, objuid=None):
+        token_cache = utilities._token_cache(self._token_cache)
+        if token_cache is not None:
+            token_cache.invalidate(objtype=objtype, objperm=objperm, objuid=objuid)
+
+    ## Access Control ##
+
+    def setup_authenticators(self, module_name, **kwargs):
+        kwargs = self._verifier_kwargs(kwargs)
+        return utilities.setup_authenticators(module_name, **self._ac_kwargs(kwargs))
+
+    def fetch_authenticators(self, authn_uid, **kwargs):
+        return utilities.fetch_authenticators(authn_uid, **self._ac_kwargs(kwargs))
+
+    def setup_verifiers(self, **kwargs):
+        return utilities.setup_verifiers(**self._ac_kwargs(kwargs))
+
+    def fetch_verifiers(self, verifier_uid, **kwargs):
+        return utilities.fetch_verifiers(verifier_uid, **self._ac_kwargs(kwargs))
+
+    def setup_permissions(self, objtype, **kwargs):
+        kwargs = self._verifier_kwargs(kwargs)
+        return utilities.setup_permissions(objtype, **self._ac_kwargs(kwargs))
+
+    def setup_permissions_many(self, objects, **kwargs):
+        kwargs = self._verifier_kwargs(kwargs)
+        return utilities.setup_permissions_many(objects, **self._ac_kwargs(kwargs))
+
+    def fetch_permissions(self, objtype, **kwargs):
+        return utilities.fetch_permissions(objtype, **self._ac_kwargs(kwargs))
+
+    ## Storage ##
+
+    def setup_collection(self, **kwargs):
+        kwargs = self._verifier_kwargs(kwargs)
+        return utilities.setup_collection(**self._storage_kwargs(kwargs))
+
+    def store_secret(self, sec_data, **kwargs):
+        kwargs = self._verifier_kwargs(kwargs)
+        return utilities.store_secret(sec_data, **self._storage_kwargs(kwargs))
+
+    def fetch_secret(self, sec_uid, col_uid, **kwargs):
+        return utilities.fetch_secret(sec_uid, col_uid, **self._storage_kwargs(kwargs))
+
+    def fetch_secrets(self, secrets, **kwargs):
+        return utilities.fetch_secrets(secrets, **self._storage_kwargs(kwargs))
@@ -17,11 +17,25 @@ from future import standard_library
 standard_library.install_aliases()
 from builtins import *
 
+import atexit
 import configparser
+import contextlib
+import hashlib
+import io
+import json
 import uuid
 import os
 import os.path
+import re
+import shutil
 import stat
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 ### Constants ###
@@ -38,6 +52,8 @@ _FILE_SRV = "servers.conf"
 _FILE_KEY = "key.pem"
 _FILE_CSR = "csr.pem"
 _FILE_CRT = "crt.pem"
+_FILE_LOCK = ".lock"
+_FILE_SNAPSHOT = "snapshot.json"
 
 _SEC_DEFAULTS = "defaults"
 
@@ -46,11 +62,322 @@ _KEY_ACCOUNT = "account"
 _KEY_CLIENT = "client"
 _KEY_ACSRV = "ac_server"
 _KEY_STORAGESRV = "storage_server"
+_KEY_VERIFIER = "verifier"
 
 _EXT_CONF = "conf"
 
+_ENV_PREFIX = "PYTUTAMEN_"
+
+_SNAPSHOT_VERSION = 1
+
 ### Exceptions ###
 
+class ConfigException(Exception):
+    pass
+
+class ConfigReadOnlyException(ConfigException):
+
+    def __init__(self, path):
+        super().__init__("Config backend is read-only: {}".format(path))
+        self.path = path
+
+
+### Functions ###
+
+# Temp dirs holding real_path copies, removed at exit if still present
+_REAL_DIRS = set()
+_REAL_DIRS_LOCK = threading.Lock()
+
+def _remove_real_dirs():
+    with _REAL_DIRS_LOCK:
+        real_dirs = list(_REAL_DIRS)
+        _REAL_DIRS.clear()
+    for real_dir in real_dirs:
+        shutil.rmtree(real_dir, ignore_errors=True)
+
+atexit.register(_remove_real_dirs)
+
+def _replace(src, dst):
+    # os.replace is atomic on POSIX and Windows, but Python 3.3+ only
+    replace = getattr(os, 'replace', None)
+    if replace:
+        replace(src, dst)
+    else:
+        os.rename(src, dst)
+
+
+### Backends ###
+
+class ConfigBackend(object):
+
+    # Storage for the files under a ClientConfig path. Paths passed in are
+    # always the logical paths built by ClientConfig. real_dir picks where
+    # real_path copies go, the system temp dir by default.
+
+    def __init__(self, real_dir=None):
+
+        # Call Parent
+        super().__init__()
+
+        # Setup Properties
+        self._real_parent = real_dir
+        self._real_dir = None
+        self._real_paths = {}
+        self._real_lock = threading.Lock()
+
+    def setup(self, conf_path):
+        pass
+
+    def stat(self, path):
+        raise NotImplementedError()
+
+    def exists(self, path):
+        return self.stat(path) is not None
+
+    def read(self, path):
+        raise NotImplementedError()
+
+    def write(self, path, data, mode=None):
+        raise NotImplementedError()
+
+    def lock(self):
+        pass
+
+    def unlock(self):
+        pass
+
+    def real_path(self, path):
+
+        # TLS libraries only load keys and certs from files, so backends
+        # without a filesystem copy the file out to a private temp dir the
+        # first time a connection needs it. The copies include private
+        # keys: they are readable by this user only and stay on disk until
+        # close(), or exit, so pass real_dir to keep them on a tmpfs or
+        # other chosen location.
+        data = self.read(path)
+        if data is None:
+            return None
+        with self._real_lock:
+            cached = self._real_paths.get(path)
+            if cached and cached[0] == data:
+                return cached[1]
+            if self._real_dir is None:
+                self._real_dir = tempfile.mkdtemp(prefix="pytutamen_", dir=self._real_parent)
+                with _REAL_DIRS_LOCK:
+                    _REAL_DIRS.add(self._real_dir)
+            fd, real_path = tempfile.mkstemp(dir=self._real_dir,
+                                             suffix="_{}".format(os.path.basename(path)))
+            with io.open(fd, 'w') as f:
+                f.write(data)
+            self._real_paths[path] = (data, real_path)
+            return real_path
+
+    def close(self):
+
+        # Remove any real_path copies; connections opened after this need
+        # real_path again
+        with self._real_lock:
+            real_dir = self._real_dir
+            self._real_dir = None
+            self._real_paths = {}
+        if real_dir is not None:
+            with _REAL_DIRS_LOCK:
+                _REAL_DIRS.discard(real_dir)
+            shutil.rmtree(real_dir, ignore_errors=True)
+
+class FileConfigBackend(ConfigBackend):
+
+    def __init__(self):
+
+        # Call Parent
+        super().__init__()
+
+        # Setup Properties
+        self._root = None
+        self._dirs = set()
+        self._lock_file = None
+
+    def setup(self, conf_path):
+        if not os.path.exists(conf_path):
+            os.makedirs(conf_path)
+        self._root = conf_path
+        self._dirs.add(conf_path)
+
+    def stat(self, path):
+
+        # Identifies a version of the file on disk, None if missing
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        mtime = getattr(st, 'st_mtime_ns', st.st_mtime)
+        return (st.st_ino, st.st_size, mtime)
+
+    def exists(self, path):
+        return os.path.isfile(path)
+
+    def read(self, path):
+        try:
+            with io.open(path, 'r') as f:
+                return f.read()
+        except (IOError, OSError):
+            return None
+
+    def write(self, path, data, mode=None):
+
+        file_dir = os.path.dirname(path)
+        if file_dir not in self._dirs:
+            if not os.path.exists(file_dir):
+                os.makedirs(file_dir)
+            self._dirs.add(file_dir)
+
+        fd, tmp_path = tempfile.mkstemp(dir=file_dir,
+                                        prefix=".{}.".format(os.path.basename(path)))
+        try:
+            with io.open(fd, 'w') as f:
+                # Keep the permissions of the file being replaced
+                if not mode and os.path.exists(path):
+                    mode = stat.S_IMODE(os.stat(path).st_mode)
+                if mode:
+                    os.fchmod(f.fileno(), mode)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            _replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def lock(self):
+        if fcntl is None:
+            return
+        lock_file = open(os.path.join(self._root, _FILE_LOCK), 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        except Exception:
+            lock_file.close()
+            raise
+        self._lock_file = lock_file
+
+    def unlock(self):
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def real_path(self, path):
+        return path
+
+class MemoryConfigBackend(ConfigBackend):
+
+    def __init__(self, files=None, real_dir=None):
+
+        # Call Parent
+        super().__init__(real_dir=real_dir)
+
+        # Setup Properties
+        self._files = {}
+        self._versions = {}
+        self._files_lock = threading.Lock()
+        self._seed = dict(files) if files else {}
+
+    def setup(self, conf_path):
+
+        # Seeded files are given relative to the config path
+        with self._files_lock:
+            for rel_path, data in self._seed.items():
+                path = os.path.join(conf_path, rel_path)
+                self._files[path] = data
+                self._versions[path] = 0
+            self._seed = {}
+
+    def stat(self, path):
+        with self._files_lock:
+            if path not in self._files:
+                return None
+            return (0, len(self._files[path]), self._versions[path])
+
+    def read(self, path):
+        with self._files_lock:
+            return self._files.get(path, None)
+
+    def write(self, path, data, mode=None):
+        with self._files_lock:
+            self._files[path] = data
+            self._versions[path] = self._versions.get(path, 0) + 1
+
+class EnvConfigBackend(ConfigBackend):
+
+    # Read-only config for containers. Each file is looked up first in an
+    # environment variable named after its path relative to the config
+    # path, e.g. PYTUTAMEN_CORE_CONF or PYTUTAMEN_SRV_AC_CONF, then under
+    # mount_path, e.g. a mounted secret volume holding key.pem files.
+
+    def __init__(self, environ=None, mount_path=None, prefix=_ENV_PREFIX, real_dir=None):
+
+        # Call Parent
+        super().__init__(real_dir=real_dir)
+
+        # Setup Properties
+        self._environ = environ if environ is not None else os.environ
+        self._mount_path = mount_path
+        self._prefix = prefix
+        self._root = None
+
+    def setup(self, conf_path):
+        self._root = conf_path
+
+    def _rel_path(self, path):
+        return os.path.relpath(path, self._root)
+
+    def env_name(self, path):
+        name = re.sub(r'[^0-9A-Za-z]', '_', self._rel_path(path))
+        return "{}{}".format(self._prefix, name.upper())
+
+    def _mount_file(self, path):
+        if not self._mount_path:
+            return None
+        return os.path.join(self._mount_path, self._rel_path(path))
+
+    def stat(self, path):
+        data = self._environ.get(self.env_name(path), None)
+        if data is not None:
+            digest = hashlib.sha256(data.encode('utf-8')).hexdigest()
+            return (0, len(data), digest)
+        mount_file = self._mount_file(path)
+        if mount_file is None:
+            return None
+        try:
+            st = os.stat(mount_file)
+        except OSError:
+            return None
+        mtime = getattr(st, 'st_mtime_ns', st.st_mtime)
+        return (st.st_ino, st.st_size, mtime)
+
+    def read(self, path):
+        data = self._environ.get(self.env_name(path), None)
+        if data is not None:
+            return data
+        mount_file = self._mount_file(path)
+        if mount_file is None:
+            return None
+        try:
+            with io.open(mount_file, 'r') as f:
+                return f.read()
+        except (IOError, OSError):
+            return None
+
+    def write(self, path, data, mode=None):
+        raise ConfigReadOnlyException(path)
+
+    def real_path(self, path):
+        if self.env_name(path) not in self._environ:
+            mount_file = self._mount_file(path)
+            if mount_file and os.path.isfile(mount_file):
+                return mount_file
+        return super().real_path(path)
+
 
 ### Config Objects ###
 
@@ -58,78 +385,269 @@ class ClientConfig(object):
 
     ## Internals ##
 
-    def __init__(self, conf_path=None):
+    def __init__(self, conf_path=None, use_snapshot=False, backend=None):
 
         if not conf_path:
             conf_path = _DEFAULT_CONFIG_PATH
+        if backend is None:
+            backend = FileConfigBackend()
 
         conf_path = os.path.expanduser(conf_path)
         conf_path = os.path.normpath(conf_path)
-        if not os.path.exists(conf_path):
-            os.makedirs(conf_path)
+        backend.setup(conf_path)
 
         self._path = conf_path
+        self._backend = backend
+        self._parsed = {}
+        self._parsed_lock = threading.Lock()
+        self._txn_lock = threading.RLock()
+        self._txn_owner = None
+        self._txn_depth = 0
+        self._txn_confs = {}
+        self._txn_files = {}
+        self._use_snapshot = use_snapshot
+        self._known_files = (None, frozenset())
+
+        if use_snapshot and not self.snapshot_load():
+            try:
+                self.snapshot_save()
+            except (IOError, OSError, ConfigReadOnlyException):
+                # The snapshot is only a startup shortcut
+                pass
+
+    def _conf_stat(self, conf_path):
+        return self._backend.stat(conf_path)
+
+    def _conf_read(self, conf_path):
+
+        conf_obj = configparser.ConfigParser()
+        data = self._backend.read(conf_path)
+        if data is not None:
+            conf_obj.read_file(io.StringIO(data), source=conf_path)
+        return conf_obj
+
+    def _conf_parse(self, conf_path):
+
+        # Parsed sections of conf_path, re-read only when the file changes
+        sig = self._conf_stat(conf_path)
+        with self._parsed_lock:
+            cached = self._parsed.get(conf_path)
+            if cached and cached[0] == sig:
+                return cached[1]
+
+        conf_obj = self._conf_read(conf_path) if sig is not None else configparser.ConfigParser()
+        sections = {}
+        for section in conf_obj.sections():
+            sections[section] = dict(conf_obj.items(section))
+
+        with self._parsed_lock:
+            self._parsed[conf_path] = (sig, sections)
+        return sections
 
     def _conf_set_section(self, conf_path, section, conf):
 
-        conf_obj = configparser.ConfigParser()
-        if os.path.isfile(conf_path):
-            conf_obj.read(conf_path)
+        with self.transaction():
 
-        if not conf_obj.has_section(section):
-            conf_obj.add_section(section)
+            conf_obj = self._txn_confs.get(conf_path)
+            if conf_obj is None:
+                conf_obj = self._conf_read(conf_path)
+                self._txn_confs[conf_path] = conf_obj
 
-        for key, val in conf.items():
-            conf_obj.set(section, key, val)
+            if not conf_obj.has_section(section):
+                conf_obj.add_section(section)
 
-        conf_dir = os.path.dirname(conf_path)
-        if not os.path.exists(conf_dir):
-            os.makedirs(conf_dir)
-        with open(conf_path, 'w') as conf_file:
-            conf_obj.write(conf_file)
+            for key, val in conf.items():
+                conf_obj.set(section, key, val)
 
     def _conf_get_section(self, conf_path, section):
 
-        conf_obj = configparser.ConfigParser()
-        if os.path.isfile(conf_path):
-            conf_obj.read(conf_path)
+        if self._in_transaction() and conf_path in self._txn_confs:
+            conf_obj = self._txn_confs[conf_path]
+            if not conf_obj.has_section(section):
+                return {}
+            return dict(conf_obj.items(section))
 
-        if not conf_obj.has_section(section):
-            return {}
+        sections = self._conf_parse(conf_path)
+        return dict(sections.get(section, {}))
 
-        conf = dict(conf_obj.items(section))
+    def _write_file(self, file_path, data, mode=None):
 
-        return conf
+        with self.transaction():
+            self._txn_files[file_path] = (data, mode)
 
-    def _write_file(self, file_path, data, mode=None):
+    def _file_exists(self, file_path):
 
-        file_dir = os.path.dirname(file_path)
-        if not os.path.exists(file_dir):
-            os.makedirs(file_dir)
-        with open(file_path, 'w') as f:
-            if mode:
-                os.fchmod(f.fileno(), mode)
-            f.write(data)
+        if self._in_transaction() and file_path in self._txn_files:
+            return True
+        # Files the snapshot listed are trusted while their directory is
+        # unchanged, as any write or delete there changes its signature
+        known_sig, known_files = self._known_files
+        if (file_path in known_files) and (known_sig is not None):
+            if self._conf_stat(os.path.dirname(file_path)) == known_sig:
+                return True
+        return self._backend.exists(file_path)
 
     def _read_file(self, file_path):
 
-        if os.path.isfile(file_path):
-            with open(file_path, 'r') as f:
-                data = f.read()
-            return data
-        else:
-            return None
+        if self._in_transaction() and file_path in self._txn_files:
+            return self._txn_files[file_path][0]
+
+        return self._backend.read(file_path)
+
+    ## Transactions ##
+
+    def _in_transaction(self):
+        return self._txn_owner is threading.current_thread()
+
+    @contextlib.contextmanager
+    def transaction(self):
+
+        # Changes made inside the block are held in memory and flushed once
+        # per file when the outermost transaction exits, each through a
+        # temp file and rename. An advisory lock on the config directory
+        # keeps other processes out for the duration. A setter called
+        # outside a transaction runs in one of its own, so with the file
+        # backend each such call pays a lock, a full file write and an
+        # fsync; group related setters in one transaction to pay once per
+        # file, and keep slow work (key generation, network calls) outside.
+        with self._txn_lock:
+            if self._txn_depth == 0:
+                self._backend.lock()
+                self._txn_owner = threading.current_thread()
+            self._txn_depth += 1
+            try:
+                yield self
+                if self._txn_depth == 1:
+                    self._txn_flush()
+            finally:
+                self._txn_depth -= 1
+                if self._txn_depth == 0:
+                    self._txn_confs = {}
+                    self._txn_files = {}
+                    self._txn_owner = None
+                    self._backend.unlock()
+
+    def _txn_flush(self):
+
+        for conf_path, conf_obj in self._txn_confs.items():
+            buf = io.StringIO()
+            conf_obj.write(buf)
+            self._backend.write(conf_path, buf.getvalue())
+            with self._parsed_lock:
+                self._parsed.pop(conf_path, None)
+        for file_path, (data, mode) in self._txn_files.items():
+            self._backend.write(file_path, data, mode=mode)
+        self._known_files = (None, frozenset())
+
+        if self._use_snapshot:
+            self.snapshot_save()
+
+    ## Snapshot ##
+
+    def _snapshot_sources(self, account_uid=None, client_uid=None):
+
+        # Files and directories whose signatures decide snapshot freshness
+        sources = [self.path_core_conf, self.path_srv_ac_conf, self.path_srv_storage_conf]
+        if account_uid and client_uid:
+            sources.append(self.path_client(account_uid, client_uid))
+        return sources
+
+    def _snapshot_sig(self, path):
+        sig = self._conf_stat(path)
+        return list(sig) if sig is not None else None
+
+    def snapshot_save(self):
+
+        # Parse the sources fresh, then record the files the default
+        # client identity needs so connections can skip probing for them
+        sources = self._snapshot_sources()
+        sigs = {}
+        sections = {}
+        for conf_path in sources:
+            sigs[conf_path] = self._snapshot_sig(conf_path)
+            sections[conf_path] = self._conf_parse(conf_path)
+
+        defaults = sections[self.path_core_conf].get(_SEC_DEFAULTS, {})
+        account_uid = defaults.get(_KEY_ACCOUNT, None)
+        client_uid = defaults.get(_KEY_CLIENT, None)
+
+        files = []
+        if account_uid and client_uid:
+            client_path = self.path_client(account_uid, client_uid)
+            sigs[client_path] = self._snapshot_sig(client_path)
+            candidates = [self.path_client_key(account_uid, client_uid)]
+            for server_name in sections[self.path_srv_ac_conf]:
+                candidates.append(self.path_client_crt(account_uid, client_uid, server_name))
+            files = [path for path in candidates if self._backend.exists(path)]
+
+        snapshot = {'version': _SNAPSHOT_VERSION,
+                    'sources': sigs,
+                    'sections': sections,
+                    'files': files}
+        self._backend.write(self.path_snapshot, json.dumps(snapshot, sort_keys=True))
+
+    def snapshot_load(self):
+
+        # Returns False if the snapshot is missing or any source changed
+        data = self._backend.read(self.path_snapshot)
+        if data is None:
+            return False
+        try:
+            snapshot = json.loads(data)
+        except ValueError:
+            return False
+
+        if snapshot.get('version') != _SNAPSHOT_VERSION:
+            return False
+
+        sigs = snapshot.get('sources', {})
+        defaults = snapshot.get('sections', {}).get(self.path_core_conf, {})
+        defaults = defaults.get(_SEC_DEFAULTS, {})
+        account_uid = defaults.get(_KEY_ACCOUNT, None)
+        client_uid = defaults.get(_KEY_CLIENT, None)
+        sources = self._snapshot_sources(account_uid, client_uid)
+        if set(sources) != set(sigs):
+            return False
+        for path in sources:
+            if self._snapshot_sig(path) != sigs[path]:
+                return False
+
+        with self._parsed_lock:
+            for conf_path, sections in snapshot['sections'].items():
+                self._parsed[conf_path] = (tuple(sigs[conf_path]) if sigs[conf_path] else None,
+                                           sections)
+        known_sig = None
+        if account_uid and client_uid:
+            known_sig = sigs[self.path_client(account_uid, client_uid)]
+        self._known_files = (tuple(known_sig) if known_sig else None,
+                             frozenset(snapshot.get('files', [])))
+        return True
 
     ## Paths ##
 
+    @property
+    def backend(self):
+        return self._backend
+
     @property
     def path(self):
         return self._path
 
+    def path_real(self, path):
+        # A filesystem path holding the file, for libraries that need one
+        return self._backend.real_path(path)
+
+    def close(self):
+        self._backend.close()
+
     @property
     def path_core_conf(self):
         return os.path.join(self._path, _FILE_CORE)
 
+    @property
+    def path_snapshot(self):
+        return os.path.join(self._path, _FILE_SNAPSHOT)
+
     @property
     def path_srv_ac(self):
         return os.path.join(self.path, _SUB_AC)
@@ -153,6 +671,9 @@ class ClientConfig(object):
     def path_account(self, account_uid):
         return os.path.join(self.path_accounts, str(account_uid))
 
+    def path_account_conf(self, account_uid):
+        return "{}.{}".format(self.path_account(account_uid), _EXT_CONF)
+
     def path_clients(self, account_uid):
         return os.path.join(self.path_account(account_uid), _SUB_CLIENTS)
 
@@ -243,6 +764,21 @@ class ClientConfig(object):
         conf = self._conf_get_section(self.path_srv_storage_conf, name)
         return conf.get(_KEY_URL, None)
 
+    ## Account ##
+
+    def account_get_default_verifier(self, account_uid):
+
+        conf = self._conf_get_section(self.path_account_conf(account_uid), _SEC_DEFAULTS)
+        uid = conf.get(_KEY_VERIFIER, None)
+        return uuid.UUID(uid) if uid else None
+
+    def account_set_default_verifier(self, account_uid, uid):
+
+        # None clears the default
+        conf = self._conf_get_section(self.path_account_conf(account_uid), _SEC_DEFAULTS)
+        conf[_KEY_VERIFIER] = str(uid) if uid else ""
+        self._conf_set_section(self.path_account_conf(account_uid), _SEC_DEFAULTS, conf)
+
     ## Client ##
 
     def path_client_key(self, account_uid, client_uid):
@@ -260,6 +796,11 @@ class ClientConfig(object):
         key_path = self.path_client_key(account_uid, client_uid)
         return self._read_file(key_path)
 
+    def client_has_key(self, account_uid, client_uid):
+
+        key_path = self.path_client_key(account_uid, client_uid)
+        return self._file_exists(key_path)
+
     def path_client_csr(self, account_uid, client_uid, server_name):
 
         client_path = self.path_client(account_uid, client_uid)
@@ -289,3 +830,8 @@ class ClientConfig(object):
 
         crt_path = self.path_client_crt(account_uid, client_uid, server_name)
         return self._read_file(crt_path)
+
+    def client_has_crt(self, account_uid, client_uid, server_name):
+
+        crt_path = self.path_client_crt(account_uid, client_uid, server_name)
+        return self._file_exists(crt_path)
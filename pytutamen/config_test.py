@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+
+# Andy Sayler
+# 2016
+# pytutamen Package
+# Client Config Tests
+
+
+### Imports ###
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+from builtins import *
+
+import io
+import os
+import os.path
+import shutil
+import stat
+import tempfile
+import unittest
+import uuid
+
+from . import config
+
+
+### Tests ###
+
+class _BackendTests(object):
+
+    # Shared checks for writable backends; subclasses set up self.conf
+
+    def test_defaults(self):
+        account_uid = uuid.uuid4()
+        self.assertIsNone(self.conf.defaults_get_account_uid())
+        self.conf.defaults_set_account_uid(account_uid)
+        self.conf.defaults_set_ac_server('ac')
+        self.assertEqual(self.conf.defaults_get_account_uid(), account_uid)
+        self.assertEqual(self.conf.defaults_get_ac_server(), 'ac')
+
+    def test_files(self):
+        account_uid = uuid.uuid4()
+        client_uid = uuid.uuid4()
+        self.assertFalse(self.conf.client_has_key(account_uid, client_uid))
+        self.conf.client_set_key(account_uid, client_uid, "KEY")
+        self.conf.client_set_crt(account_uid, client_uid, 'ac', "CRT")
+        self.assertTrue(self.conf.client_has_key(account_uid, client_uid))
+        self.assertEqual(self.conf.client_get_key(account_uid, client_uid), "KEY")
+        self.assertEqual(self.conf.client_get_crt(account_uid, client_uid, 'ac'), "CRT")
+
+    def test_transaction(self):
+        with self.conf.transaction():
+            self.conf.ac_server_set_url('ac', "https://ac.example.com")
+            self.conf.defaults_set_ac_server('ac')
+            # Visible inside the transaction before the flush
+            self.assertEqual(self.conf.ac_server_get_url('ac'), "https://ac.example.com")
+        self.assertEqual(self.conf.ac_server_get_url('ac'), "https://ac.example.com")
+        self.assertEqual(self.conf.defaults_get_ac_server(), 'ac')
+
+    def test_transaction_error(self):
+        with self.assertRaises(ValueError):
+            with self.conf.transaction():
+                self.conf.defaults_set_ac_server('ac')
+                raise ValueError()
+        self.assertIsNone(self.conf.defaults_get_ac_server())
+
+    def test_snapshot(self):
+        self.conf.defaults_set_ac_server('ac')
+        self.conf.snapshot_save()
+        self.assertTrue(self.conf.snapshot_load())
+        self.conf.defaults_set_ac_server('other')
+        self.assertFalse(self.conf.snapshot_load())
+
+class FileConfigBackendTestCase(_BackendTests, unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.conf = config.ClientConfig(conf_path=self.path)
+
+    def test_key_mode(self):
+        account_uid = uuid.uuid4()
+        client_uid = uuid.uuid4()
+        self.conf.client_set_key(account_uid, client_uid, "KEY")
+        key_path = self.conf.path_client_key(account_uid, client_uid)
+        self.assertEqual(stat.S_IMODE(os.stat(key_path).st_mode), 0o600)
+        self.assertEqual(self.conf.path_real(key_path), key_path)
+
+    def test_shared(self):
+        # A second config on the same path sees every write
+        self.conf.defaults_set_ac_server('ac')
+        other = config.ClientConfig(conf_path=self.path)
+        self.assertEqual(other.defaults_get_ac_server(), 'ac')
+        other.defaults_set_ac_server('other')
+        self.assertEqual(self.conf.defaults_get_ac_server(), 'other')
+
+class MemoryConfigBackendTestCase(_BackendTests, unittest.TestCase):
+
+    def setUp(self):
+        self.conf = config.ClientConfig(conf_path="/pytutamen_test",
+                                        backend=config.MemoryConfigBackend())
+        self.addCleanup(self.conf.close)
+
+    def test_no_disk(self):
+        self.conf.defaults_set_ac_server('ac')
+        self.assertFalse(os.path.exists("/pytutamen_test"))
+
+    def test_seed(self):
+        backend = config.MemoryConfigBackend(files={'core.conf': "[defaults]\nac_server = ac\n"})
+        conf = config.ClientConfig(conf_path="/pytutamen_test", backend=backend)
+        self.assertEqual(conf.defaults_get_ac_server(), 'ac')
+
+    def test_real_path(self):
+        real_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, real_dir)
+        conf = config.ClientConfig(conf_path="/pytutamen_test",
+                                   backend=config.MemoryConfigBackend(real_dir=real_dir))
+        account_uid = uuid.uuid4()
+        client_uid = uuid.uuid4()
+        conf.client_set_key(account_uid, client_uid, "KEY")
+        key_path = conf.path_real(conf.path_client_key(account_uid, client_uid))
+
+        # A private copy under real_dir, reused until the data changes
+        self.assertTrue(key_path.startswith(real_dir + os.sep))
+        self.assertEqual(stat.S_IMODE(os.stat(key_path).st_mode), 0o600)
+        with io.open(key_path, 'r') as f:
+            self.assertEqual(f.read(), "KEY")
+        self.assertEqual(conf.path_real(conf.path_client_key(account_uid, client_uid)),
+                         key_path)
+
+        conf.close()
+        self.assertFalse(os.path.exists(key_path))
+        self.assertEqual(os.listdir(real_dir), [])
+
+class EnvConfigBackendTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.mount_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.mount_path)
+        self.environ = {'PYTUTAMEN_CORE_CONF': "[defaults]\nac_server = ac\n"}
+        backend = config.EnvConfigBackend(environ=self.environ, mount_path=self.mount_path)
+        self.conf = config.ClientConfig(conf_path="/pytutamen_test", backend=backend)
+        self.addCleanup(self.conf.close)
+
+    def test_env(self):
+        self.assertEqual(self.conf.defaults_get_ac_server(), 'ac')
+        self.assertEqual(self.conf.backend.env_name(self.conf.path_srv_ac_conf),
+                         'PYTUTAMEN_SRV_AC_CONF')
+
+    def test_mount(self):
+        account_uid = uuid.uuid4()
+        client_uid = uuid.uuid4()
+        key_path = self.conf.path_client_key(account_uid, client_uid)
+        mount_file = os.path.join(self.mount_path,
+                                  os.path.relpath(key_path, self.conf.path))
+        os.makedirs(os.path.dirname(mount_file))
+        with io.open(mount_file, 'w') as f:
+            f.write("KEY")
+        self.assertEqual(self.conf.client_get_key(account_uid, client_uid), "KEY")
+        # Mounted files need no copy
+        self.assertEqual(self.conf.path_real(key_path), mount_file)
+
+    def test_read_only(self):
+        with self.assertRaises(config.ConfigReadOnlyException):
+            self.conf.defaults_set_ac_server('other')
+        self.assertEqual(self.conf.defaults_get_ac_server(), 'ac')
@@ -17,33 +17,69 @@ from future import standard_library
 standard_library.install_aliases()
 from builtins import *
 
+import collections
+import concurrent.futures
+import errno
+import hashlib
+import multiprocessing
+import os
+import os.path
+import stat
+import threading
+import uuid
+
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives.asymmetric import rsa
 
+try:
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+except ImportError:
+    ed25519 = None
+
 
 ### Constants ###
 
 TYPE_RSA = 'RSA'
+TYPE_EC_P256 = 'EC-P256'
+TYPE_EC_P384 = 'EC-P384'
+TYPE_ED25519 = 'ED25519'
 
 _RSA_SUPPORTED_LENGTH = [2048, 4096]
 _RSA_SUPPORTED_EXP = [3, 65537]
 
+_EC_CURVES = {TYPE_EC_P256: ec.SECP256R1,
+              TYPE_EC_P384: ec.SECP384R1}
+_SUPPORTED_TYPES = [TYPE_RSA, TYPE_EC_P256, TYPE_EC_P384, TYPE_ED25519]
+
+_POOL_DEPTH = 4
+_KEY_CACHE_SIZE = 32
+_POOL_EXT = ".pem"
+
 
 ### Functions ###
 
 def gen_key(length=4096, pub_exp=65537, typ=TYPE_RSA, password=None):
 
-    if length not in _RSA_SUPPORTED_LENGTH:
-        raise TypeError("Length must be one of '{}'".format(_RSA_SUPPORTED_LENGTH))
-    if pub_exp not in _RSA_SUPPORTED_EXP:
-        raise TypeError("pub_exp must be one of '{}'".format(_RSA_SUPPORTED_EXP))
-    if typ != TYPE_RSA:
-        raise TypeError("Only type '{}' supported".format(TYPE_RSA))
+    # length and pub_exp only apply to RSA keys
+    if typ not in _SUPPORTED_TYPES:
+        raise TypeError("Type must be one of '{}'".format(_SUPPORTED_TYPES))
 
-    key = rsa.generate_private_key(pub_exp, length, default_backend())
+    if typ == TYPE_RSA:
+        if length not in _RSA_SUPPORTED_LENGTH:
+            raise TypeError("Length must be one of '{}'".format(_RSA_SUPPORTED_LENGTH))
+        if pub_exp not in _RSA_SUPPORTED_EXP:
+            raise TypeError("pub_exp must be one of '{}'".format(_RSA_SUPPORTED_EXP))
+        key = rsa.generate_private_key(pub_exp, length, default_backend())
+    elif typ in _EC_CURVES:
+        key = ec.generate_private_key(_EC_CURVES[typ](), default_backend())
+    else:
+        if ed25519 is None:
+            raise TypeError("Type '{}' requires a newer cryptography".format(typ))
+        key = ed25519.Ed25519PrivateKey.generate()
 
     if not password:
         encryption = serialization.NoEncryption()
@@ -57,6 +93,11 @@ def gen_key(length=4096, pub_exp=65537, typ=TYPE_RSA, password=None):
 
 def gen_csr(key_pem, country, state, locality, email=None, password=None):
 
+    key = load_key(key_pem, password)
+    return gen_csr_from_key(key, country, state, locality, email)
+
+def gen_csr_from_key(key, country, state, locality, email=None):
+
     # Check Args
     if len(country) != 2:
         raise ValueError("Country must be 2-letter code")
@@ -70,12 +111,295 @@ def gen_csr(key_pem, country, state, locality, email=None, password=None):
     if email:
         sub_attr.append(x509.NameAttribute(x509.NameOID.EMAIL_ADDRESS, email))
 
-    key = serialization.load_pem_private_key(key_pem.encode(), password, be)
-
     builder = x509.CertificateSigningRequestBuilder()
     builder = builder.subject_name(x509.Name(sub_attr))
 
-    csr = builder.sign(key, hashes.SHA256(), be)
+    csr = builder.sign(key, _sign_hash(key), be)
     csr_pem = csr.public_bytes(serialization.Encoding.PEM).decode()
 
     return csr_pem
+
+_KEY_CACHE = collections.OrderedDict()
+_KEY_CACHE_LOCK = threading.Lock()
+
+def load_key(key_pem, password=None):
+
+    # Parsing runs the PBKDF again for encrypted keys, so keep the most
+    # recently used keys loaded. Only hashes of the PEM and password are
+    # kept as the cache key.
+    key_bytes = key_pem.encode()
+    cache_key = (hashlib.sha256(key_bytes).digest(),
+                 hashlib.sha256(password).digest() if password else None)
+    with _KEY_CACHE_LOCK:
+        key = _KEY_CACHE.pop(cache_key, None)
+        if key is not None:
+            _KEY_CACHE[cache_key] = key
+            return key
+
+    key = serialization.load_pem_private_key(key_bytes, password, default_backend())
+
+    with _KEY_CACHE_LOCK:
+        _KEY_CACHE.pop(cache_key, None)
+        _KEY_CACHE[cache_key] = key
+        while len(_KEY_CACHE) > _KEY_CACHE_SIZE:
+            _KEY_CACHE.popitem(last=False)
+    return key
+
+def clear_key_cache():
+    with _KEY_CACHE_LOCK:
+        _KEY_CACHE.clear()
+
+def _sign_hash(key):
+
+    # Ed25519 signs without a separate digest; P-384 pairs with SHA-384
+    if ed25519 is not None and isinstance(key, ed25519.Ed25519PrivateKey):
+        return None
+    if isinstance(key, ec.EllipticCurvePrivateKey) and key.curve.key_size >= 384:
+        return hashes.SHA384()
+    return hashes.SHA256()
+
+def _process_pool(max_workers=None):
+
+    # Workers start from a fresh interpreter (forkserver, else spawn)
+    # rather than a fork of this one, so they never inherit threads or
+    # locks held elsewhere in the caller. Python 2 and before 3.7 can only
+    # fork.
+    try:
+        methods = multiprocessing.get_all_start_methods()
+        method = 'forkserver' if 'forkserver' in methods else 'spawn'
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context(method))
+    except (AttributeError, TypeError):
+        return concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+
+def _pool_gen_key(key_args, password):
+
+    # Runs in a worker process, so must stay a module-level function
+    key_pem = gen_key(**key_args)
+    if password:
+        key = serialization.load_pem_private_key(key_pem.encode(), None, default_backend())
+        encryption = serialization.BestAvailableEncryption(password)
+        enc_pem = key.private_bytes(encoding=serialization.Encoding.PEM,
+                                    format=serialization.PrivateFormat.PKCS8,
+                                    encryption_algorithm=encryption).decode()
+    else:
+        enc_pem = None
+    return key_pem, enc_pem
+
+
+def _pool_key_tag(key_args):
+
+    # Names the parameters keys are made with, so persisted keys are only
+    # handed out by pools configured the same way
+    typ = key_args.get('typ', TYPE_RSA)
+    if typ == TYPE_RSA:
+        return "{}-{}-{}".format(typ, key_args.get('length', 4096),
+                                 key_args.get('pub_exp', 65537))
+    return typ
+
+
+### Objects ###
+
+class KeyPool(object):
+
+    def __init__(self, depth=_POOL_DEPTH, max_workers=None, key_args=None,
+                 persist_path=None, persist_password=None):
+
+        # Check Args
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        if persist_path and not persist_password:
+            raise ValueError("persist_password required to persist keys")
+
+        # Call Parent
+        super().__init__()
+
+        # Setup Properties
+        self._depth = depth
+        self._key_args = dict(key_args) if key_args else {}
+        self._persist_path = persist_path
+        self._persist_password = persist_password
+        self._ready = collections.deque()
+        self._pending = set()
+        self._error = None
+        self._tag = _pool_key_tag(self._key_args)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._max_workers = max_workers
+        self._executor = None
+
+        # Load Persisted Keys
+        if persist_path:
+            if not os.path.exists(persist_path):
+                os.makedirs(persist_path)
+            self._load()
+
+    @property
+    def depth(self):
+        return self._depth
+
+    @property
+    def key_args(self):
+        return dict(self._key_args)
+
+    @property
+    def ready(self):
+        with self._cond:
+            return len(self._ready)
+
+    def _load(self):
+
+        # Keys made with other parameters are left for their own pools
+        be = default_backend()
+        prefix = "{}_".format(self._tag)
+        for name in sorted(os.listdir(self._persist_path)):
+            if not (name.startswith(prefix) and name.endswith(_POOL_EXT)):
+                continue
+            file_path = os.path.join(self._persist_path, name)
+            with open(file_path, 'rb') as f:
+                key = serialization.load_pem_private_key(f.read(), self._persist_password, be)
+            key_pem = key.private_bytes(encoding=serialization.Encoding.PEM,
+                                        format=serialization.PrivateFormat.PKCS8,
+                                        encryption_algorithm=serialization.NoEncryption()).decode()
+            self._ready.append((key_pem, file_path))
+
+    def _save(self, enc_pem):
+
+        file_name = "{}_{}{}".format(self._tag, uuid.uuid4().hex, _POOL_EXT)
+        file_path = os.path.join(self._persist_path, file_name)
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, stat.S_IREAD | stat.S_IWRITE)
+        with os.fdopen(fd, 'w') as f:
+            f.write(enc_pem)
+        return file_path
+
+    def _done(self, future):
+
+        # The key is persisted before taking cond, so get() never waits on
+        # file I/O; the future stays pending until then so fill() does not
+        # over-submit. Failures are kept for the next get() to raise.
+        key_pem = None
+        file_path = None
+        error = None
+        if not future.cancelled():
+            try:
+                key_pem, enc_pem = future.result()
+                if self._persist_path:
+                    file_path = self._save(enc_pem)
+            except Exception as err:
+                error = err
+        with self._cond:
+            self._pending.discard(future)
+            if error is not None:
+                self._error = error
+            elif key_pem is not None:
+                self._ready.append((key_pem, file_path))
+            self._cond.notify_all()
+
+    def fill(self):
+
+        # Worker processes start on the first fill, not with the pool;
+        # get() and get_ready() fill behind themselves, or call fill()
+        # to start generating ahead of use
+        with self._cond:
+            if self._closed:
+                return
+            if self._executor is None:
+                self._executor = _process_pool(self._max_workers)
+            password = self._persist_password if self._persist_path else None
+            while (len(self._ready) + len(self._pending)) < self._depth:
+                future = self._executor.submit(_pool_gen_key, self._key_args, password)
+                self._pending.add(future)
+                future.add_done_callback(self._done)
+
+    def _pop(self):
+
+        # Caller must hold cond. Persisted keys are claimed by renaming
+        # their file first, as pools sharing persist_path load the same
+        # files; a key another pool claimed is skipped. None if none left.
+        while self._ready:
+            key_pem, file_path = self._ready.popleft()
+            if not file_path:
+                return key_pem
+            claimed = "{}.{}".format(file_path, uuid.uuid4().hex)
+            try:
+                os.rename(file_path, claimed)
+            except OSError as err:
+                if err.errno == errno.ENOENT:
+                    continue
+                raise
+            os.remove(claimed)
+            return key_pem
+        return None
+
+    def get(self, timeout=None):
+
+        # Take a ready key, or wait on one in flight; generate inline only
+        # if there is nothing to wait for. A failed background generation
+        # is raised here when no key is left to hand out.
+        with self._cond:
+            if not self._ready and self._pending:
+                self._cond.wait_for(lambda: self._ready or not self._pending, timeout)
+            key_pem = self._pop()
+            error = None
+            if key_pem is None:
+                error, self._error = self._error, None
+        self.fill()
+        if error is not None:
+            raise error
+        if key_pem is None:
+            key_pem = gen_key(**self._key_args)
+        return key_pem
+
+    def get_ready(self):
+
+        # A key only if one is ready now, else None
+        with self._cond:
+            key_pem = self._pop()
+        self.fill()
+        return key_pem
+
+    def close(self):
+
+        # Keys already persisted stay on disk for the next pool
+        with self._cond:
+            self._closed = True
+            pending = list(self._pending)
+            executor = self._executor
+        for future in pending:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+_KEY_POOL = None
+
+def get_key_pool():
+    return _KEY_POOL
+
+def set_key_pool(pool):
+
+    global _KEY_POOL
+    if pool is not None and not isinstance(pool, KeyPool):
+        raise TypeError("pool must be an instance of {}".format(KeyPool))
+    old = _KEY_POOL
+    _KEY_POOL = pool
+    if old is not None and old is not pool:
+        old.close()
+
+def pool_key(key_pool=None, typ=None):
+
+    # None selects the process-wide pool if one is set, False disables it.
+    # Keys of another type than the pool makes are generated inline.
+    if key_pool is None:
+        key_pool = get_key_pool()
+    if key_pool and typ in (None, key_pool.key_args.get('typ', TYPE_RSA)):
+        return key_pool.get()
+    if typ:
+        return gen_key(typ=typ)
+    return gen_key()
@@ -18,6 +18,7 @@ standard_library.install_aliases()
 from future.utils import native_str
 from builtins import *
 
+import concurrent.futures
 import uuid
 
 from . import config
@@ -30,6 +31,8 @@ from . import base
 _KEY_COL = "collections"
 _KEY_COL_SEC = "secrets"
 
+_MAX_WORKERS = 16
+
 
 ### Exceptions ###
 
@@ -80,6 +83,10 @@ class StorageClient(object):
         # Setup Properties
         self._storage_connection = storage_connection
 
+    @property
+    def storage_connection(self):
+        return self._storage_connection
+
 class CollectionsClient(StorageClient):
 
     @property
@@ -162,3 +169,30 @@ class SecretsClient(StorageClient):
         ep = "{}/{}/{}/{}/versions/latest".format(_KEY_COL, col_uid, _KEY_COL_SEC, key_uid)
         sec = self._storage_connection.http_get(ep, tokens=tokens)
         return sec
+
+    def fetch_many(self, tokens, col_uid, key_uids, max_workers=_MAX_WORKERS):
+
+        if not isinstance(tokens, list):
+            raise TypeError("tokens must be list")
+        if not isinstance(col_uid, uuid.UUID):
+            raise TypeError("col_uid must be uuid")
+        if not isinstance(key_uids, list):
+            raise TypeError("key_uids must be list")
+        for key_uid in key_uids:
+            if not isinstance(key_uid, uuid.UUID):
+                raise TypeError("key_uids must contain uuids")
+
+        # GETs run concurrently over this connection's session pool
+        secs = {}
+        errors = {}
+        workers = min(len(key_uids), max_workers) or 1
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for key_uid in key_uids:
+                futures[key_uid] = executor.submit(self.fetch, tokens, col_uid, key_uid)
+            for key_uid, future in futures.items():
+                try:
+                    secs[key_uid] = future.result()
+                except Exception as err:
+                    errors[key_uid] = err
+        return secs, errors
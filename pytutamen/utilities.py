@@ -17,11 +17,24 @@ from future import standard_library
 standard_library.install_aliases()
 from builtins import *
 
+import collections
+import concurrent.futures
+import contextlib
+import math
+import threading
 import uuid
 
+try:
+    from time import monotonic as _monotonic
+except ImportError:
+    from time import time as _monotonic
+
+import requests
+
 from . import config
 from . import crypto
 from . import constants
+from . import base
 from . import accesscontrol
 from . import storage
 
@@ -32,6 +45,88 @@ _DEFAULT_COUNTRY = 'US'
 _DEFAULT_STATE = 'Colorado'
 _DEFAULT_LOCALITY = 'Boulder'
 
+_MAX_WORKERS = 16
+
+_STATUS_REJECTED = (401, 403)
+
+_TOKEN_CACHE = accesscontrol.TokenCache()
+
+READ_ALL = 'all'
+READ_FIRST = 'first'
+READ_HEDGED = 'hedged'
+_READ_POLICIES = (READ_ALL, READ_FIRST, READ_HEDGED)
+
+WRITE_ALL = 'all'
+WRITE_MAJORITY = 'majority'
+
+_HEDGE_PERCENTILE = 95
+_HEDGE_DELAY = 0.05
+_HEDGE_MIN_SAMPLES = 5
+_LATENCY_SAMPLES = 100
+
+_VERIFIER_CHECK_TTL = 300
+
+
+### Exceptions ###
+
+class WriteQuorumException(base.ClientException):
+
+    def __init__(self, required, succeeded, errors):
+        msg = "Write quorum not met: {} of {} required replicas succeeded: {}".format(
+            succeeded, required, errors)
+        super().__init__(msg)
+        self.errors = errors
+
+
+### Result Objects ###
+
+class WriteResult(tuple):
+
+    # The usual result tuple, plus the replicas that had failed under a
+    # partial write quorum by the time it returned, in write_errors by
+    # server name, for later repair. Writes may still be running then;
+    # finished is a future for every failed replica once they are all done.
+
+    def __new__(cls, values, write_errors=None, finished=None):
+        obj = tuple.__new__(cls, values)
+        obj.write_errors = write_errors if write_errors is not None else {}
+        if finished is None:
+            finished = concurrent.futures.Future()
+            finished.set_result(dict(obj.write_errors))
+        obj.finished = finished
+        return obj
+
+
+### Latency Tracking ###
+
+class _LatencyTracker(object):
+
+    def __init__(self, samples=_LATENCY_SAMPLES):
+
+        # Call Parent
+        super().__init__()
+
+        # Setup Properties
+        self._samples = samples
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def record(self, server_name, latency):
+        with self._lock:
+            if server_name not in self._latencies:
+                self._latencies[server_name] = collections.deque(maxlen=self._samples)
+            self._latencies[server_name].append(latency)
+
+    def percentile(self, server_name, pct, default=None):
+        with self._lock:
+            latencies = sorted(self._latencies.get(server_name, []))
+        if len(latencies) < _HEDGE_MIN_SAMPLES:
+            return default
+        idx = int(math.ceil((pct / 100) * len(latencies))) - 1
+        return latencies[max(idx, 0)]
+
+_READ_LATENCY = _LatencyTracker()
+
 
 ### Config Functions ###
 
@@ -41,18 +136,20 @@ def config_new_ac_server(name, url, conf=None, conf_path=None):
     if not conf:
         conf = config.ClientConfig(conf_path=conf_path)
 
-    # Save Server Config
-    if conf.ac_server_configured(name):
-        old_url = conf.ac_server_get_url(name)
-        if url != old_url:
-            msg = "AC Server '{}' already configured with different URL".format(name)
-            raise Exception(msg)
-    else:
-        conf.ac_server_set_url(name, url)
+    with conf.transaction():
 
-    # Update Defaults
-    if not conf.defaults_get_ac_server():
-        conf.defaults_set_ac_server(name)
+        # Save Server Config
+        if conf.ac_server_configured(name):
+            old_url = conf.ac_server_get_url(name)
+            if url != old_url:
+                msg = "AC Server '{}' already configured with different URL".format(name)
+                raise Exception(msg)
+        else:
+            conf.ac_server_set_url(name, url)
+
+        # Update Defaults
+        if not conf.defaults_get_ac_server():
+            conf.defaults_set_ac_server(name)
 
 def config_new_storage_server(name, url, conf=None, conf_path=None):
 
@@ -60,18 +157,20 @@ def config_new_storage_server(name, url, conf=None, conf_path=None):
     if not conf:
         conf = config.ClientConfig(conf_path=conf_path)
 
-    # Save Server Config
-    if conf.storage_server_configured(name):
-        old_url = conf.storage_server_get_url(name)
-        if url != old_url:
-            msg = "Storage Server '{}' already configured with different URL".format(name)
-            raise Exception(msg)
-    else:
-        conf.storage_server_set_url(name, url)
+    with conf.transaction():
 
-    # Update Defaults
-    if not conf.defaults_get_storage_server():
-        conf.defaults_set_storage_server(name)
+        # Save Server Config
+        if conf.storage_server_configured(name):
+            old_url = conf.storage_server_get_url(name)
+            if url != old_url:
+                msg = "Storage Server '{}' already configured with different URL".format(name)
+                raise Exception(msg)
+        else:
+            conf.storage_server_set_url(name, url)
+
+        # Update Defaults
+        if not conf.defaults_get_storage_server():
+            conf.defaults_set_storage_server(name)
 
 
 ### Bootstrap Functions ###
@@ -79,7 +178,7 @@ def config_new_storage_server(name, url, conf=None, conf_path=None):
 def bootstrap_new_account(country=None, state=None, locality=None, email=None,
                           account_userdata=None, account_uid=None,
                           client_userdata=None, client_uid=None,
-                          ac_server_name=None,
+                          ac_server_name=None, key_pool=None, key_type=None,
                           conf=None, conf_path=None):
 
     # Normalize Args
@@ -114,29 +213,46 @@ def bootstrap_new_account(country=None, state=None, locality=None, email=None,
         msg = "Client already configured for server {}".format(ac_server_name)
         raise Exception(msg)
 
-    # Update Defaults
-    if not conf.defaults_get_account_uid():
-        conf.defaults_set_account_uid(account_uid)
-    if not conf.defaults_get_client_uid():
-        conf.defaults_set_client_uid(client_uid)
-
-    # Generate and Save Key (if necessary)
-    key_pem = conf.client_get_key(account_uid, client_uid)
-    if not key_pem:
-        key_pem = crypto.gen_key()
-        conf.client_set_key(account_uid, client_uid, key_pem)
-
-    # Generate and Save CSR
-    csr_pem = crypto.gen_csr(key_pem, country, state, locality, email)
-    conf.client_set_csr(account_uid, client_uid, ac_server_name, csr_pem)
-
-    # Bootstrap Account and Save CRT
+    # Setup Connection
     ac_connection = accesscontrol.ACServerConnection(server_name=ac_server_name,
                                                      account_uid=account_uid,
                                                      client_uid=client_uid,
                                                      no_client_crt=True,
                                                      conf=conf)
-    with ac_connection:
+    with ac_connection, concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+
+        # Warm the connection while the key and CSR are generated
+        warming = executor.submit(ac_connection.warm)
+
+        # Generate Key (if necessary) and CSR, without the config lock
+        key_pem = conf.client_get_key(account_uid, client_uid)
+        if not key_pem:
+            key_pem = crypto.pool_key(key_pool, typ=key_type)
+        csr_pem = crypto.gen_csr(key_pem, country, state, locality, email)
+
+        # Save Key, CSR and Defaults before the account exists anywhere, so
+        # a failed or retried bootstrap reuses the same key. The lock is
+        # held only for the writes.
+        with conf.transaction():
+            old_crt = conf.client_get_crt(account_uid, client_uid, ac_server_name)
+            if old_crt:
+                msg = "Client already configured for server {}".format(ac_server_name)
+                raise Exception(msg)
+            saved_key = conf.client_get_key(account_uid, client_uid)
+            if not saved_key:
+                conf.client_set_key(account_uid, client_uid, key_pem)
+            elif saved_key != key_pem:
+                # Another bootstrap saved its key first
+                key_pem = saved_key
+                csr_pem = crypto.gen_csr(key_pem, country, state, locality, email)
+            conf.client_set_csr(account_uid, client_uid, ac_server_name, csr_pem)
+            if not conf.defaults_get_account_uid():
+                conf.defaults_set_account_uid(account_uid)
+            if not conf.defaults_get_client_uid():
+                conf.defaults_set_client_uid(client_uid)
+
+        # Bootstrap Account, with no lock held
+        warming.result()
         bootstrap = accesscontrol.BootstrapClient(ac_connection)
         ret = bootstrap.account(account_userdata=account_userdata,
                                 account_uid=account_uid,
@@ -144,7 +260,10 @@ def bootstrap_new_account(country=None, state=None, locality=None, email=None,
                                 client_uid=client_uid,
                                 client_csr=csr_pem)
     ret_account_uid, ret_client_uid, client_crt = ret
-    conf.client_set_crt(account_uid, client_uid, ac_server_name, client_crt)
+
+    # Save CRT
+    with conf.transaction():
+        conf.client_set_crt(account_uid, client_uid, ac_server_name, client_crt)
 
     # Check and Return
     assert account_uid == ret_account_uid
@@ -152,6 +271,148 @@ def bootstrap_new_account(country=None, state=None, locality=None, email=None,
     return account_uid, client_uid, client_crt
 
 
+def _bulk_key_csr(key_pem, key_type, country, state, locality, email):
+
+    # Runs in a worker process, so must stay a module-level function
+    if not key_pem:
+        key_pem = crypto.gen_key(typ=key_type) if key_type else crypto.gen_key()
+    csr_pem = crypto.gen_csr(key_pem, country, state, locality, email)
+    return key_pem, csr_pem
+
+def bootstrap_new_accounts(identities, ac_server_name=None, key_pool=None, key_type=None,
+                           max_workers=_MAX_WORKERS, max_processes=None,
+                           conf=None, conf_path=None):
+
+    # Each identity is a dict of bootstrap_new_account's per-identity
+    # arguments, key_type included. Returns (results, errors) keyed by
+    # position in identities, results holding (account_uid, client_uid,
+    # client_crt).
+
+    # Check Args
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+
+    # Setup Conf
+    if not conf:
+        conf = config.ClientConfig(conf_path=conf_path)
+
+    # Pick up pooled keys only if they are already made
+    if key_pool is None:
+        key_pool = crypto.get_key_pool()
+    pool_type = key_pool.key_args.get('typ', crypto.TYPE_RSA) if key_pool else None
+
+    # Get Server Name
+    if not ac_server_name:
+        ac_server_name = conf.defaults_get_ac_server()
+
+    # Normalize Identities
+    results = {}
+    errors = {}
+    specs = {}
+    for idx, identity in enumerate(identities):
+        spec = dict(identity)
+        if not spec.get('country'):
+            spec['country'] = _DEFAULT_COUNTRY
+        if not spec.get('state'):
+            spec['state'] = _DEFAULT_STATE
+        if not spec.get('locality'):
+            spec['locality'] = _DEFAULT_LOCALITY
+        if not spec.get('key_type'):
+            spec['key_type'] = key_type
+        if not spec.get('account_uid'):
+            spec['account_uid'] = uuid.uuid4()
+        if not spec.get('client_uid'):
+            spec['client_uid'] = uuid.uuid4()
+        if conf.client_get_crt(spec['account_uid'], spec['client_uid'], ac_server_name):
+            msg = "Client already configured for server {}".format(ac_server_name)
+            errors[idx] = Exception(msg)
+            continue
+        key_pem = conf.client_get_key(spec['account_uid'], spec['client_uid'])
+        if not key_pem and key_pool and spec['key_type'] in (None, pool_type):
+            key_pem = key_pool.get_ready()
+        spec['key_pem'] = key_pem
+        specs[idx] = spec
+    if not specs:
+        return results, errors
+
+    # Generate Keys and CSRs, bootstrapping each as soon as it is ready
+    csrs = {}
+    workers = min(len(specs), max_workers)
+    with crypto._process_pool(max_processes) as processes:
+
+        key_futures = {}
+        for idx, spec in specs.items():
+            future = processes.submit(_bulk_key_csr, spec['key_pem'], spec['key_type'],
+                                      spec['country'], spec['state'],
+                                      spec['locality'], spec.get('email'))
+            key_futures[future] = idx
+
+        # Setup Connection
+        first = next(iter(specs.values()))
+        ac_connection = accesscontrol.ACServerConnection(server_name=ac_server_name,
+                                                         account_uid=first['account_uid'],
+                                                         client_uid=first['client_uid'],
+                                                         no_client_crt=True,
+                                                         conf=conf)
+        bootstrap = accesscontrol.BootstrapClient(ac_connection)
+
+        with ac_connection, \
+             concurrent.futures.ThreadPoolExecutor(max_workers=workers) as threads:
+
+            # Warm the connection while the first keys are generated
+            threads.submit(ac_connection.warm)
+
+            post_futures = {}
+            for future in concurrent.futures.as_completed(key_futures):
+                idx = key_futures[future]
+                spec = specs[idx]
+                try:
+                    spec['key_pem'], csrs[idx] = future.result()
+                except Exception as err:
+                    errors[idx] = err
+                    continue
+                post = threads.submit(bootstrap.account,
+                                      account_userdata=spec.get('account_userdata'),
+                                      account_uid=spec['account_uid'],
+                                      client_userdata=spec.get('client_userdata'),
+                                      client_uid=spec['client_uid'],
+                                      client_csr=csrs[idx])
+                post_futures[post] = idx
+
+            for future in concurrent.futures.as_completed(post_futures):
+                idx = post_futures[future]
+                try:
+                    results[idx] = future.result()
+                except Exception as err:
+                    errors[idx] = err
+
+    # Save Keys, CSRs and CRTs in one batch, holding the config lock only
+    # for the writes
+    with conf.transaction():
+
+        for idx in sorted(results):
+            spec = specs[idx]
+            account_uid, client_uid, client_crt = results[idx]
+            if conf.client_get_crt(account_uid, client_uid, ac_server_name):
+                msg = "Client already configured for server {}".format(ac_server_name)
+                errors[idx] = Exception(msg)
+                del results[idx]
+                continue
+            conf.client_set_key(account_uid, client_uid, spec['key_pem'])
+            conf.client_set_csr(account_uid, client_uid, ac_server_name, csrs[idx])
+            conf.client_set_crt(account_uid, client_uid, ac_server_name, client_crt)
+
+        # Update Defaults
+        if results:
+            account_uid, client_uid, client_crt = results[min(results)]
+            if not conf.defaults_get_account_uid():
+                conf.defaults_set_account_uid(account_uid)
+            if not conf.defaults_get_client_uid():
+                conf.defaults_set_client_uid(client_uid)
+
+    return results, errors
+
+
 ### Helper Functions ###
 
 def prep_connections(connection_type,
@@ -195,10 +456,133 @@ def close_connections(opened):
     for connection in opened:
         connection.close()
 
+def _quorum_size(quorum, count):
+
+    if quorum == WRITE_ALL:
+        return count
+    if quorum == WRITE_MAJORITY:
+        return (count // 2) + 1
+    if isinstance(quorum, int) and (1 <= quorum <= count):
+        return quorum
+    msg = "write_quorum must be '{}', '{}' or between 1 and {}".format(
+        WRITE_ALL, WRITE_MAJORITY, count)
+    raise ValueError(msg)
+
+def _write_replicas(storage_clients, write_func, write_quorum, opened):
+
+    # Write to every storage server at once. Once write_quorum of them
+    # succeed, return the replicas failed so far, by server name, and a
+    # future for every failed replica once all writes are done. Writes
+    # still in flight then keep going only on connections from opened,
+    # which each close when their own write is done. Writes on other
+    # connections are waited for, as the caller may close those as soon as
+    # this returns, so a quorum below WRITE_ALL only saves time on
+    # connections opened here.
+    required = _quorum_size(write_quorum, len(storage_clients))
+    write_errors = {}
+    lock = threading.Lock()
+    finished = concurrent.futures.Future()
+    unfinished = [len(storage_clients)]
+    if not storage_clients:
+        finished.set_result({})
+
+    def _record(future, srv_name, connection):
+        if connection is not None:
+            connection.close()
+        with lock:
+            if not future.cancelled() and future.exception() is not None:
+                write_errors[srv_name] = future.exception()
+            unfinished[0] -= 1
+            if unfinished[0]:
+                return
+            final = dict(write_errors)
+        finished.set_result(final)
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(storage_clients) or 1)
+    futures = {}
+    borrowed = set()
+    for client in storage_clients:
+        srv_name = client.storage_connection.server_name
+        connection = client.storage_connection
+        if connection in opened:
+            opened.remove(connection)
+        else:
+            connection = None
+        future = executor.submit(write_func, client)
+        future.add_done_callback(
+            lambda f, n=srv_name, c=connection: _record(f, n, c))
+        futures[future] = srv_name
+        if connection is None:
+            borrowed.add(future)
+    executor.shutdown(wait=False)
+
+    succeeded = 0
+    failed = 0
+    pending = set(futures.keys())
+    while pending and succeeded < required:
+        done, pending = concurrent.futures.wait(
+            pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                succeeded += 1
+            else:
+                with lock:
+                    write_errors[futures[future]] = future.exception()
+                failed += 1
+        if failed > (len(storage_clients) - required):
+            break
+
+    # Drain writes on the caller's connections
+    concurrent.futures.wait(pending & borrowed)
+    with lock:
+        for future in pending:
+            if future.done() and future.exception() is not None:
+                write_errors[futures[future]] = future.exception()
+        snapshot = dict(write_errors)
+
+    if succeeded < required:
+        raise WriteQuorumException(required, succeeded, snapshot)
+    return snapshot, finished
+
 
 ### Token Functions ###
 
-def get_tokens(objtype, objperm, objuid=None,
+def _token_cache(token_cache):
+    # Caching is opt-in: True selects the process-wide cache, None and
+    # False disable it
+    if token_cache is None or token_cache is False:
+        return None
+    if token_cache is True:
+        return _TOKEN_CACHE
+    return token_cache
+
+def _rejected(err):
+    if isinstance(err, WriteQuorumException):
+        return any(_rejected(e) for e in err.errors.values())
+    if isinstance(err, requests.exceptions.HTTPError) and err.response is not None:
+        return err.response.status_code in _STATUS_REJECTED
+    return False
+
+@contextlib.contextmanager
+def _tokens_rejected(token_cache, objtype, objperm, objuid=None):
+    # Drop cached tokens for this permission if a server refuses them
+    try:
+        yield
+    except (requests.exceptions.HTTPError, WriteQuorumException) as err:
+        token_cache = _token_cache(token_cache)
+        if token_cache is not None and _rejected(err):
+            token_cache.invalidate(objtype, objperm, objuid)
+        raise
+
+def _request_token(authz_client, objtype, objperm, objuid, cancel=None, polling=None):
+
+    if cancel is not None and cancel.is_set():
+        raise accesscontrol.AuthorizationCancelled()
+    uid = authz_client.request(objtype, objperm, objuid)
+    return authz_client.wait_token(uid, cancel=cancel, polling=polling)
+
+def get_tokens(objtype, objperm, objuid=None, min_tokens=None, polling=None,
+               token_cache=None, cancel=None,
                ac_connections=None, ac_server_names=None,
                conf=None, conf_path=None,
                account_uid=None, client_uid=None):
@@ -213,43 +597,310 @@ def get_tokens(objtype, objperm, objuid=None,
     ## Setup Clients ##
     authz_clients = prep_clients(accesscontrol.AuthorizationsClient, ac_connections)
 
-    ## Open Connections ##
-    ac_opened = open_connections(ac_connections)
+    ## Check Quorum ##
+    if min_tokens is not None:
+        if (min_tokens < 1) or (min_tokens > len(authz_clients)):
+            msg = "min_tokens must be between 1 and {}".format(len(authz_clients))
+            raise ValueError(msg)
+        max_errors = len(authz_clients) - min_tokens
 
-    ## Get tokens ##
+    ## Check Cache ##
+    token_cache = _token_cache(token_cache)
     tokens = {}
     errors = {}
+    pending = []
     for authz_client in authz_clients:
         srv_name = authz_client.ac_connection.server_name
-        uid = authz_client.request(objtype, objperm, objuid)
-        try:
-            tok = authz_client.wait_token(uid)
-        except accesscontrol.AuthorizationException as err:
-            errors[srv_name] = err
-        else:
+        tok = None
+        if token_cache is not None:
+            tok = token_cache.get(authz_client.ac_connection, objtype, objperm, objuid)
+        if tok:
             tokens[srv_name] = tok
+        else:
+            pending.append(authz_client)
+    if min_tokens is not None and len(tokens) >= min_tokens:
+        pending = []
+    if not pending:
+        return tokens, errors
 
-    ## Close Connections ##
-    close_connections(ac_opened)
+    ## Open Connections ##
+    ac_opened = open_connections([client.ac_connection for client in pending])
+
+    ## Get tokens ##
+    # With a quorum, return as soon as min_tokens are granted or can no
+    # longer be granted; abandoned requests land in errors as cancelled and
+    # stop at their next poll without being waited for. A caller's cancel
+    # event stops them all the same way, and is set on return.
+    if cancel is None:
+        cancel = threading.Event()
+    workers = min(len(pending), _MAX_WORKERS)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {}
+        for authz_client in pending:
+            future = executor.submit(_request_token, authz_client,
+                                     objtype, objperm, objuid,
+                                     cancel=cancel, polling=polling)
+            futures[future] = authz_client
+        for future in concurrent.futures.as_completed(futures):
+            authz_client = futures[future]
+            srv_name = authz_client.ac_connection.server_name
+            try:
+                tok = future.result()
+            except accesscontrol.AuthorizationException as err:
+                errors[srv_name] = err
+            else:
+                tokens[srv_name] = tok
+                if token_cache is not None:
+                    token_cache.put(authz_client.ac_connection, objtype, objperm, objuid, tok)
+            if min_tokens is not None:
+                if (len(tokens) >= min_tokens) or (len(errors) > max_errors):
+                    break
+        for authz_client in futures.values():
+            srv_name = authz_client.ac_connection.server_name
+            if (srv_name not in tokens) and (srv_name not in errors):
+                errors[srv_name] = accesscontrol.AuthorizationCancelled()
+    finally:
+        cancel.set()
+        executor.shutdown(wait=False)
+
+        ## Close Connections ##
+        close_connections(ac_opened)
+
+    ## Return ##
+    return tokens, errors
+
+
+def _request_tokens_many(authz_client, objects, cancel=None, polling=None):
+
+    # Returns (tokens, errors) keyed by position in objects
+    authz_uids, errors = authz_client.request_many(list(objects))
+    positions = dict((authz_uid, idx) for idx, authz_uid in authz_uids.items())
+    tokens, wait_errors = authz_client.wait_tokens(list(positions.keys()),
+                                                   cancel=cancel, polling=polling)
+    tokens = dict((positions[authz_uid], tok) for authz_uid, tok in tokens.items())
+    for authz_uid, err in wait_errors.items():
+        errors[positions[authz_uid]] = err
+    return tokens, errors
+
+def get_tokens_many(objects, min_tokens=None, polling=None,
+                    token_cache=None,
+                    ac_connections=None, ac_server_names=None,
+                    conf=None, conf_path=None,
+                    account_uid=None, client_uid=None):
+
+    # objects is a list of (objtype, objperm, objuid). Each AC server gets
+    # one batch request and polls all of its pending authorizations
+    # together. Returns (tokens, errors), each keyed by object and then by
+    # server name.
+
+    ## Setup Connections ##
+    if not ac_connections:
+        ac_connections = prep_connections(accesscontrol.ACServerConnection,
+                                          server_names=ac_server_names,
+                                          conf=conf, conf_path=conf_path,
+                                          account_uid=account_uid, client_uid=client_uid)
+
+    ## Setup Clients ##
+    authz_clients = prep_clients(accesscontrol.AuthorizationsClient, ac_connections)
+
+    ## Check Quorum ##
+    if min_tokens is not None:
+        if (min_tokens < 1) or (min_tokens > len(authz_clients)):
+            msg = "min_tokens must be between 1 and {}".format(len(authz_clients))
+            raise ValueError(msg)
+        max_errors = len(authz_clients) - min_tokens
+
+    def _settled(obj):
+        return ((len(tokens[obj]) >= min_tokens) or (len(errors[obj]) > max_errors))
+
+    ## Check Cache ##
+    objects = [tuple(obj) for obj in objects]
+    token_cache = _token_cache(token_cache)
+    tokens = dict((obj, {}) for obj in objects)
+    errors = dict((obj, {}) for obj in objects)
+    pending = collections.OrderedDict()
+    for authz_client in authz_clients:
+        srv_name = authz_client.ac_connection.server_name
+        for obj in tokens:
+            tok = None
+            if token_cache is not None:
+                tok = token_cache.get(authz_client.ac_connection, *obj)
+            if tok:
+                tokens[obj][srv_name] = tok
+            else:
+                pending.setdefault(authz_client, []).append(obj)
+    if min_tokens is not None:
+        for authz_client in list(pending.keys()):
+            pending[authz_client] = [obj for obj in pending[authz_client] if not _settled(obj)]
+            if not pending[authz_client]:
+                del pending[authz_client]
+    if not pending:
+        return tokens, errors
+
+    ## Open Connections ##
+    ac_opened = open_connections([client.ac_connection for client in pending])
+
+    ## Get tokens ##
+    # As in get_tokens: return once every object's quorum settles, leaving
+    # the other servers' requests to stop at their next poll
+    cancel = threading.Event()
+    workers = min(len(pending), _MAX_WORKERS)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {}
+        for authz_client, objs in pending.items():
+            future = executor.submit(_request_tokens_many, authz_client, objs,
+                                     cancel=cancel, polling=polling)
+            futures[future] = authz_client
+        for future in concurrent.futures.as_completed(futures):
+            authz_client = futures[future]
+            srv_name = authz_client.ac_connection.server_name
+            objs = pending[authz_client]
+            srv_tokens, srv_errors = future.result()
+            for idx, tok in srv_tokens.items():
+                tokens[objs[idx]][srv_name] = tok
+                if token_cache is not None:
+                    token_cache.put(authz_client.ac_connection, *(objs[idx] + (tok,)))
+            for idx, err in srv_errors.items():
+                errors[objs[idx]][srv_name] = err
+            if min_tokens is not None:
+                if all(_settled(obj) for obj in objects):
+                    break
+        for authz_client, objs in pending.items():
+            srv_name = authz_client.ac_connection.server_name
+            for obj in objs:
+                if (srv_name not in tokens[obj]) and (srv_name not in errors[obj]):
+                    errors[obj][srv_name] = accesscontrol.AuthorizationCancelled()
+    finally:
+        cancel.set()
+        executor.shutdown(wait=False)
+
+        ## Close Connections ##
+        close_connections(ac_opened)
 
     ## Return ##
     return tokens, errors
 
 
+### Request Planning ###
+
+class RequestPlan(object):
+
+    # Multi-step workflows need the same tokens at several steps. A plan
+    # requests each distinct (objtype, objperm, objuid) once, all of them
+    # in parallel as soon as they are known, and hands the results to the
+    # steps as they run. The AC connections are opened once for the plan
+    # and closed only after every request has finished.
+
+    def __init__(self, min_tokens=None, polling=None, token_cache=None,
+                 ac_connections=None):
+
+        # Setup Connections
+        if not ac_connections:
+            ac_connections = prep_connections(accesscontrol.ACServerConnection)
+
+        # Call Parent
+        super().__init__()
+
+        # Setup Properties
+        self._min_tokens = min_tokens
+        self._polling = polling
+        self._token_cache = token_cache
+        self._ac_connections = ac_connections
+        self._ac_opened = open_connections(ac_connections)
+        self._futures = {}
+        self._cancels = []
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=_MAX_WORKERS)
+
+    def _key(self, objtype, objperm, objuid):
+        return (objtype, objperm, str(objuid) if objuid else None)
+
+    def request(self, objtype, objperm, objuid=None, min_tokens=None):
+
+        # Start requesting in the background, once per key
+        key = self._key(objtype, objperm, objuid)
+        if min_tokens is None:
+            min_tokens = self._min_tokens
+        with self._lock:
+            if key not in self._futures:
+                cancel = threading.Event()
+                self._cancels.append(cancel)
+                self._futures[key] = self._executor.submit(get_tokens, objtype, objperm,
+                                                           objuid=objuid,
+                                                           min_tokens=min_tokens,
+                                                           polling=self._polling,
+                                                           token_cache=self._token_cache,
+                                                           cancel=cancel,
+                                                           ac_connections=self._ac_connections)
+        return key
+
+    def result(self, objtype, objperm, objuid=None, min_tokens=None):
+        key = self.request(objtype, objperm, objuid=objuid, min_tokens=min_tokens)
+        return self._futures[key].result()
+
+    def tokens(self, objtype, objperm, objuid=None, min_tokens=None):
+        if min_tokens is None:
+            min_tokens = self._min_tokens
+        tokens, errors = self.result(objtype, objperm, objuid=objuid, min_tokens=min_tokens)
+        return _require_tokens(tokens, errors, min_tokens)
+
+    def close(self):
+
+        # Requests no step waited on, e.g. after a failed step, stop at
+        # their next poll instead of holding close() until they time out
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            for cancel in self._cancels:
+                cancel.set()
+        self._executor.shutdown(wait=True)
+        close_connections(self._ac_opened)
+        self._ac_opened = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+def _require_tokens(tokens, errors, min_tokens=None):
+
+    # Tokens from every server, or min_tokens of them, else the first
+    # failure rather than a missing server name later on
+    if errors and (min_tokens is None or len(tokens) < min_tokens):
+        raise list(errors.values())[0]
+    return tokens
+
+def _plan_tokens(plan, objtype, objperm, objuid=None, min_tokens=None,
+                 token_cache=None, ac_connections=None):
+
+    if plan is not None:
+        return plan.tokens(objtype, objperm, objuid=objuid, min_tokens=min_tokens)
+    tokens, errors = get_tokens(objtype, objperm, objuid=objuid, min_tokens=min_tokens,
+                                token_cache=token_cache, ac_connections=ac_connections)
+    return _require_tokens(tokens, errors, min_tokens)
+
+
 ### Verifier Authenticator ###
 
 def setup_authenticators(module_name, module_kwargs=None,\
                          authn_userdata=None,
                          authn_uid=None, tokens=None,
-                         verifiers=None,
+                         verifiers=None, plan=None, use_default_verifier=False,
+                         token_cache=None,
                          ac_connections=None, ac_server_names=None,
                          conf=None, conf_path=None,
                          account_uid=None, client_uid=None):
 
     ## Arg Defaults ##
-    if not conf:
-        conf = config.ClientConfig(conf_path=conf_path)
+    if not account_uid and ac_connections:
+        account_uid = ac_connections[0].account_uid
     if not account_uid:
+        if not conf:
+            conf = config.ClientConfig(conf_path=conf_path)
         account_uid = conf.defaults_get_account_uid()
         if not account_uid:
             raise(ValueError("Missing Default Account UID"))
@@ -271,23 +922,28 @@ def setup_authenticators(module_name, module_kwargs=None,\
     ## Open Connections ##
     ac_opened = open_connections(ac_connections)
 
+    ## Get Authenticator Create Tokens ##
+    # The same tokens cover the permissions and verifier creates below
+    if not tokens:
+        tokens = _plan_tokens(plan, constants.TYPE_SRV_AC, constants.PERM_CREATE,
+                              token_cache=token_cache, ac_connections=ac_connections)
+
     # Setup Permissions
     # TODO - bind authenticator to self-verifier
     verifiers = setup_permissions(constants.TYPE_AUTHENTICATOR, objuid=authn_uid,
-                                  verifiers=verifiers, ac_connections=ac_connections)
-
-    ## Get Authenticator Create Tokens ##
-    if not tokens:
-        tokens, errors = get_tokens(constants.TYPE_SRV_AC, constants.PERM_CREATE,
-                                    ac_connections=ac_connections)
+                                  tokens=tokens, verifiers=verifiers,
+                                  use_default_verifier=use_default_verifier,
+                                  token_cache=token_cache,
+                                  ac_connections=ac_connections)
 
     ## Setup Authenticators ##
-    for client in authn_clients:
-        srv_name = client.ac_connection.server_name
-        token = tokens[srv_name]
-        uid = client.create([token], module_name, module_kwargs=module_kwargs,
-                            userdata=authn_userdata, uid=authn_uid)
-        assert(uid == authn_uid)
+    with _tokens_rejected(token_cache, constants.TYPE_SRV_AC, constants.PERM_CREATE):
+        for client in authn_clients:
+            srv_name = client.ac_connection.server_name
+            token = tokens[srv_name]
+            uid = client.create([token], module_name, module_kwargs=module_kwargs,
+                                userdata=authn_userdata, uid=authn_uid)
+            assert(uid == authn_uid)
 
     ## Close Connections ##
     close_connections(ac_opened)
@@ -296,6 +952,7 @@ def setup_authenticators(module_name, module_kwargs=None,\
     return [authn_uid]
 
 def fetch_authenticators(authn_uid, tokens=None,
+                         token_cache=None,
                          ac_connections=None, ac_server_names=None,
                          conf=None, conf_path=None,
                          account_uid=None, client_uid=None):
@@ -315,17 +972,20 @@ def fetch_authenticators(authn_uid, tokens=None,
 
     ## Get Verifier Read Tokens ##
     if not tokens:
-        tokens, errors = get_tokens(constants.TYPE_AUTHENTICATOR, constants.PERM_READ,
-                                    objuid=authn_uid,
-                                    ac_connections=ac_connections)
+        tokens = _plan_tokens(None, constants.TYPE_AUTHENTICATOR, constants.PERM_READ,
+                              objuid=authn_uid,
+                              token_cache=token_cache,
+                              ac_connections=ac_connections)
 
     ## Fetch Authenticators ##
     authenticators = {}
     errors = {}
-    for client in authn_clients:
-        srv_name = client.ac_connection.server_name
-        token = tokens[srv_name]
-        authenticators[srv_name] = client.fetch([token], authn_uid)
+    with _tokens_rejected(token_cache, constants.TYPE_AUTHENTICATOR, constants.PERM_READ,
+                          authn_uid):
+        for client in authn_clients:
+            srv_name = client.ac_connection.server_name
+            token = tokens[srv_name]
+            authenticators[srv_name] = client.fetch([token], authn_uid)
 
     ## Close Connections ##
     close_connections(ac_opened)
@@ -336,16 +996,78 @@ def fetch_authenticators(authn_uid, tokens=None,
 
 ### Verifier Functions ###
 
+_VERIFIER_CHECKS = {}
+_VERIFIER_CHECKS_LOCK = threading.Lock()
+
+def _verifier_check_key(verifier_uid, ac_connections):
+    servers = tuple(sorted(connection.server_name for connection in ac_connections))
+    return (servers, str(ac_connections[0].account_uid), str(verifier_uid))
+
+def _verifier_checked(verifier_uid, ac_connections):
+    key = _verifier_check_key(verifier_uid, ac_connections)
+    with _VERIFIER_CHECKS_LOCK:
+        _VERIFIER_CHECKS[key] = _monotonic() + _VERIFIER_CHECK_TTL
+
+def _verifier_valid(verifier_uid, token_cache=None, ac_connections=None):
+
+    # A verifier is usable if every AC server still returns it with this
+    # account among its accounts; a passing check is trusted for
+    # _VERIFIER_CHECK_TTL seconds. Only a 404 or a missing account marks it
+    # unusable: other failures are raised rather than replacing a default
+    # that may still be fine.
+    key = _verifier_check_key(verifier_uid, ac_connections)
+    with _VERIFIER_CHECKS_LOCK:
+        expires = _VERIFIER_CHECKS.get(key)
+        if expires is not None and _monotonic() < expires:
+            return True
+        _VERIFIER_CHECKS.pop(key, None)
+
+    try:
+        verifiers, errors = fetch_verifiers(verifier_uid, token_cache=token_cache,
+                                            ac_connections=ac_connections)
+    except requests.exceptions.HTTPError as err:
+        if getattr(err.response, 'status_code', None) == 404:
+            return False
+        raise
+    account_uid = str(ac_connections[0].account_uid)
+    for verifier in verifiers.values():
+        if account_uid not in [str(uid) for uid in verifier.get('accounts', [])]:
+            return False
+
+    _verifier_checked(verifier_uid, ac_connections)
+    return True
+
+def _default_verifiers(use_default_verifier=False, tokens=None, token_cache=None,
+                       ac_connections=None):
+
+    # A new self-referencing verifier, unless the caller opts in to reusing
+    # the account's recorded default while it checks out; a missing or
+    # stale default is then replaced by the new verifier
+    if not use_default_verifier:
+        return setup_verifiers(tokens=tokens, token_cache=token_cache,
+                               ac_connections=ac_connections)
+    conf = ac_connections[0].conf
+    account_uid = ac_connections[0].account_uid
+    default_uid = conf.account_get_default_verifier(account_uid)
+    if default_uid and _verifier_valid(default_uid, token_cache=token_cache,
+                                       ac_connections=ac_connections):
+        return [default_uid]
+    return setup_verifiers(tokens=tokens, set_default=True,
+                           token_cache=token_cache, ac_connections=ac_connections)
+
 def setup_verifiers(verifier_uid=None, accounts=None, authenticators=None, tokens=None,
-                    verifiers=None,
+                    verifiers=None, plan=None, set_default=False,
+                    token_cache=None,
                     ac_connections=None, ac_server_names=None,
                     conf=None, conf_path=None,
                     account_uid=None, client_uid=None):
 
     ## Arg Defaults ##
-    if not conf:
-        conf = config.ClientConfig(conf_path=conf_path)
+    if not account_uid and ac_connections:
+        account_uid = ac_connections[0].account_uid
     if not account_uid:
+        if not conf:
+            conf = config.ClientConfig(conf_path=conf_path)
         account_uid = conf.defaults_get_account_uid()
         if not account_uid:
             raise(ValueError("Missing Default Account UID"))
@@ -367,35 +1089,53 @@ def setup_verifiers(verifier_uid=None, accounts=None, authenticators=None, token
 
     ## Open Connections ##
     ac_opened = open_connections(ac_connections)
-
-    # Setup Permissions
-    verifiers = setup_permissions(constants.TYPE_VERIFIER, objuid=verifier_uid,
-                                  verifiers=verifiers, ac_connections=ac_connections)
-
-    ## Get Verifier Create Tokens ##
-    if not tokens:
-        tokens, errors = get_tokens(constants.TYPE_SRV_AC, constants.PERM_CREATE,
-                                    ac_connections=ac_connections)
-
-    ## Setup Verifiers ##
-    if not accounts:
-        accounts = [account_uid]
-    if not authenticators:
-        authenticators = []
-    for client in verifier_clients:
-        srv_name = client.ac_connection.server_name
-        token = tokens[srv_name]
-        uid = client.create([token], uid=verifier_uid,
-                            accounts=accounts, authenticators=authenticators)
-        assert(uid == verifier_uid)
-
-    ## Close Connections ##
-    close_connections(ac_opened)
+    try:
+
+        ## Get Verifier Create Tokens ##
+        # The same tokens cover the permissions create below
+        if not tokens:
+            tokens = _plan_tokens(plan, constants.TYPE_SRV_AC, constants.PERM_CREATE,
+                                  token_cache=token_cache, ac_connections=ac_connections)
+
+        # Setup Permissions
+        verifiers = setup_permissions(constants.TYPE_VERIFIER, objuid=verifier_uid,
+                                      tokens=tokens, verifiers=verifiers,
+                                      token_cache=token_cache,
+                                      ac_connections=ac_connections)
+
+        ## Setup Verifiers ##
+        if not accounts:
+            accounts = [account_uid]
+        if not authenticators:
+            authenticators = []
+        with _tokens_rejected(token_cache, constants.TYPE_SRV_AC, constants.PERM_CREATE):
+            for client in verifier_clients:
+                srv_name = client.ac_connection.server_name
+                token = tokens[srv_name]
+                uid = client.create([token], uid=verifier_uid,
+                                    accounts=accounts, authenticators=authenticators)
+                assert(uid == verifier_uid)
+
+        ## Record Account Default ##
+        # A read-only config keeps its default; the verifier is still used
+        if set_default:
+            try:
+                ac_connections[0].conf.account_set_default_verifier(account_uid, verifier_uid)
+            except config.ConfigReadOnlyException:
+                pass
+            else:
+                _verifier_checked(verifier_uid, ac_connections)
+
+    finally:
+
+        ## Close Connections ##
+        close_connections(ac_opened)
 
     ## Return ##
     return [verifier_uid]
 
 def fetch_verifiers(verifier_uid, tokens=None,
+                    token_cache=None,
                     ac_connections=None, ac_server_names=None,
                     conf=None, conf_path=None,
                     account_uid=None, client_uid=None):
@@ -415,17 +1155,20 @@ def fetch_verifiers(verifier_uid, tokens=None,
 
     ## Get Verifier Read Tokens ##
     if not tokens:
-        tokens, errors = get_tokens(constants.TYPE_VERIFIER, constants.PERM_READ,
-                                    objuid=verifier_uid,
-                                    ac_connections=ac_connections)
+        tokens = _plan_tokens(None, constants.TYPE_VERIFIER, constants.PERM_READ,
+                              objuid=verifier_uid,
+                              token_cache=token_cache,
+                              ac_connections=ac_connections)
 
     ## Fetch Verifiers ##
     verifiers = {}
     errors = {}
-    for client in verifier_clients:
-        srv_name = client.ac_connection.server_name
-        token = tokens[srv_name]
-        verifiers[srv_name] = client.fetch([token], verifier_uid)
+    with _tokens_rejected(token_cache, constants.TYPE_VERIFIER, constants.PERM_READ,
+                          verifier_uid):
+        for client in verifier_clients:
+            srv_name = client.ac_connection.server_name
+            token = tokens[srv_name]
+            verifiers[srv_name] = client.fetch([token], verifier_uid)
 
     ## Close Connections ##
     close_connections(ac_opened)
@@ -437,7 +1180,8 @@ def fetch_verifiers(verifier_uid, tokens=None,
 ### Permissions Functions ###
 
 def setup_permissions(objtype, objuid=None, tokens=None,
-                      verifiers=None,
+                      verifiers=None, plan=None, use_default_verifier=False,
+                      token_cache=None,
                       ac_connections=None, ac_server_names=None,
                       conf=None, conf_path=None,
                       account_uid=None, client_uid=None):
@@ -454,29 +1198,105 @@ def setup_permissions(objtype, objuid=None, tokens=None,
 
     ## Open Connections ##
     ac_opened = open_connections(ac_connections)
+    try:
 
-    ## Setup Verifiers ##
-    if not verifiers:
-        verifiers = setup_verifiers(ac_connections=ac_connections)
+        ## Get Permission Create Tokens ##
+        # The same tokens cover the verifier create below
+        if not tokens:
+            tokens = _plan_tokens(plan, constants.TYPE_SRV_AC, constants.PERM_CREATE,
+                                  token_cache=token_cache, ac_connections=ac_connections)
 
-    ## Get Permission Create Tokens ##
-    if not tokens:
-        tokens, errors = get_tokens(constants.TYPE_SRV_AC, constants.PERM_CREATE,
-                                    ac_connections=ac_connections)
+        ## Setup Verifiers ##
+        if not verifiers:
+            verifiers = _default_verifiers(use_default_verifier, tokens=tokens,
+                                           token_cache=token_cache,
+                                           ac_connections=ac_connections)
 
-    ## Setup Permissions ##
-    for client in permissions_clients:
-        srv_name = client.ac_connection.server_name
-        token = tokens[srv_name]
-        outtype, outuid = client.create([token], objtype, objuid=objuid, v_default=verifiers)
+        ## Setup Permissions ##
+        with _tokens_rejected(token_cache, constants.TYPE_SRV_AC, constants.PERM_CREATE):
+            for client in permissions_clients:
+                srv_name = client.ac_connection.server_name
+                token = tokens[srv_name]
+                outtype, outuid = client.create([token], objtype, objuid=objuid,
+                                                v_default=verifiers)
 
-    ## Close Connections ##
-    close_connections(ac_opened)
+    finally:
+
+        ## Close Connections ##
+        close_connections(ac_opened)
 
     ## Return ##
     return verifiers
 
+def setup_permissions_many(objects, tokens=None,
+                           verifiers=None, plan=None, use_default_verifier=False,
+                           token_cache=None,
+                           ac_connections=None, ac_server_names=None,
+                           conf=None, conf_path=None,
+                           account_uid=None, client_uid=None):
+
+    # objects is a list of (objtype, objuid) sharing the same verifiers.
+    # Returns (verifiers, errors), errors mapping (objtype, objuid) to the
+    # exception from each AC server that failed it.
+
+    ## Setup Connections ##
+    if not ac_connections:
+        ac_connections = prep_connections(accesscontrol.ACServerConnection,
+                                          server_names=ac_server_names,
+                                          conf=conf, conf_path=conf_path,
+                                          account_uid=account_uid, client_uid=client_uid)
+
+    ## Setup Clients ##
+    permissions_clients = prep_clients(accesscontrol.PermissionsClient, ac_connections)
+
+    ## Open Connections ##
+    ac_opened = open_connections(ac_connections)
+    try:
+
+        ## Get Permission Create Tokens ##
+        if not tokens:
+            tokens = _plan_tokens(plan, constants.TYPE_SRV_AC, constants.PERM_CREATE,
+                                  token_cache=token_cache, ac_connections=ac_connections)
+
+        ## Setup Verifiers ##
+        if not verifiers:
+            verifiers = _default_verifiers(use_default_verifier, tokens=tokens,
+                                           token_cache=token_cache,
+                                           ac_connections=ac_connections)
+
+        ## Setup Permissions ##
+        records = []
+        for objtype, objuid in objects:
+            records.append({'objtype': objtype, 'objuid': objuid, 'v_default': verifiers})
+
+        errors = {}
+        workers = len(permissions_clients) or 1
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for client in permissions_clients:
+                srv_name = client.ac_connection.server_name
+                futures[srv_name] = executor.submit(client.create_many,
+                                                    [tokens[srv_name]], records)
+            for srv_name, future in futures.items():
+                results, srv_errors = future.result()
+                for idx, err in srv_errors.items():
+                    errors.setdefault(tuple(objects[idx]), {})[srv_name] = err
+
+        if any(_rejected(err) for errs in errors.values() for err in errs.values()):
+            cache = _token_cache(token_cache)
+            if cache is not None:
+                cache.invalidate(constants.TYPE_SRV_AC, constants.PERM_CREATE)
+
+    finally:
+
+        ## Close Connections ##
+        close_connections(ac_opened)
+
+    ## Return ##
+    return verifiers, errors
+
 def fetch_permissions(objtype, objuid=None, tokens=None,
+                      token_cache=None,
                       ac_connections=None, ac_server_names=None,
                       conf=None, conf_path=None,
                       account_uid=None, client_uid=None):
@@ -496,16 +1316,18 @@ def fetch_permissions(objtype, objuid=None, tokens=None,
 
     ## Get Permission Read Tokens ##
     if not tokens:
-        tokens, errors = get_tokens(objtype, constants.PERM_PERMS, objuid=objuid,
-                                    ac_connections=ac_connections)
+        tokens = _plan_tokens(None, objtype, constants.PERM_PERMS, objuid=objuid,
+                              token_cache=token_cache,
+                              ac_connections=ac_connections)
 
     ## Setup Permissions ##
     spermissions = {}
     errors = {}
-    for client in permissions_clients:
-        srv_name = client.ac_connection.server_name
-        token = tokens[srv_name]
-        spermissions[srv_name] = client.fetch([token], objtype, objuid=objuid)
+    with _tokens_rejected(token_cache, objtype, constants.PERM_PERMS, objuid):
+        for client in permissions_clients:
+            srv_name = client.ac_connection.server_name
+            token = tokens[srv_name]
+            spermissions[srv_name] = client.fetch([token], objtype, objuid=objuid)
 
     ## Close Connections ##
     close_connections(ac_opened)
@@ -516,9 +1338,29 @@ def fetch_permissions(objtype, objuid=None, tokens=None,
 
 ### Collection Functions ###
 
+def _create_collection(collection_clients, col_uid, tokens, write_quorum, opened,
+                       token_cache=None, ac_connections=None):
+
+    # Setup URLS
+    ac_server_urls = []
+    for ac_connection in ac_connections:
+        ac_server_urls.append(ac_connection.url_srv)
+
+    # Create Collections
+    token_list = list(tokens.values())
+
+    def _create(client):
+        uid = client.create(token_list, ac_server_urls, uid=col_uid)
+        assert(uid == col_uid)
+
+    with _tokens_rejected(token_cache, constants.TYPE_SRV_STORAGE, constants.PERM_CREATE):
+        return _write_replicas(collection_clients, _create, write_quorum, opened)
+
 def setup_collection(col_uid=None, ac_server_urls=None, tokens=None,
-                     verifiers=None,
+                     verifiers=None, min_tokens=None,
+                     write_quorum=WRITE_ALL, plan=None, use_default_verifier=False,
                      storage_connections=None, storage_server_names=None,
+                     token_cache=None,
                      ac_connections=None, ac_server_names=None,
                      conf=None, conf_path=None,
                      account_uid=None, client_uid=None):
@@ -535,6 +1377,9 @@ def setup_collection(col_uid=None, ac_server_urls=None, tokens=None,
                                           conf=conf, conf_path=conf_path,
                                           account_uid=account_uid, client_uid=client_uid)
 
+    ## Check Args ##
+    _quorum_size(write_quorum, len(storage_connections))
+
     ## Setup Clients ##
     collection_clients = prep_clients(storage.CollectionsClient, storage_connections)
 
@@ -548,37 +1393,49 @@ def setup_collection(col_uid=None, ac_server_urls=None, tokens=None,
     if not col_uid:
         col_uid = uuid.uuid4()
 
-    # Setup URLS
-    ac_server_urls = []
-    for ac_connection in ac_connections:
-        ac_server_urls.append(ac_connection.url_srv)
-
-    # Setup Permissions
-    verifiers = setup_permissions(constants.TYPE_COL, objuid=col_uid, verifiers=verifiers,
-                                  ac_connections=ac_connections)
-
-    # Get Storage Server Create Tokens
-    if not tokens:
-        tokens, errors = get_tokens(constants.TYPE_SRV_STORAGE, constants.PERM_CREATE,
-                                    ac_connections=ac_connections)
-
-    # Create Collections
-    for client in collection_clients:
-        token_list = list(tokens.values())
-        uid = client.create(token_list, ac_server_urls, uid=col_uid)
-        assert(uid == col_uid)
+    # Request AC and Storage Server Create Tokens together
+    own_plan = plan is None
+    if own_plan:
+        plan = RequestPlan(token_cache=token_cache, ac_connections=ac_connections)
+    try:
+        plan.request(constants.TYPE_SRV_AC, constants.PERM_CREATE)
+        if not tokens:
+            plan.request(constants.TYPE_SRV_STORAGE, constants.PERM_CREATE,
+                         min_tokens=min_tokens)
+
+        # Setup Permissions
+        verifiers = setup_permissions(constants.TYPE_COL, objuid=col_uid, verifiers=verifiers,
+                                      plan=plan, use_default_verifier=use_default_verifier,
+                                      token_cache=token_cache,
+                                      ac_connections=ac_connections)
+
+        # Create Collections
+        if not tokens:
+            tokens = plan.tokens(constants.TYPE_SRV_STORAGE, constants.PERM_CREATE,
+                                 min_tokens=min_tokens)
+        write_errors, finished = _create_collection(collection_clients, col_uid, tokens,
+                                                    write_quorum, storage_opened,
+                                                    token_cache=token_cache,
+                                                    ac_connections=ac_connections)
+    finally:
+        if own_plan:
+            plan.close()
 
     ## Close Connections ##
+    close_connections(storage_opened)
+    close_connections(ac_opened)
 
     ## Return ##
-    return col_uid, verifiers
+    return WriteResult((col_uid, verifiers), write_errors, finished)
 
 
 ### Secret Functions ###
 
 def store_secret(sec_data, sec_uid=None, tokens=None,
-                 col_uid=None, verifiers=None,
+                 col_uid=None, verifiers=None, min_tokens=None,
+                 write_quorum=WRITE_ALL, plan=None, use_default_verifier=False,
                  storage_connections=None, storage_server_names=None,
+                 token_cache=None,
                  ac_connections=None, ac_server_names=None,
                  conf=None, conf_path=None,
                  account_uid=None, client_uid=None):
@@ -595,6 +1452,9 @@ def store_secret(sec_data, sec_uid=None, tokens=None,
                                           conf=conf, conf_path=conf_path,
                                           account_uid=account_uid, client_uid=client_uid)
 
+    ## Check Args ##
+    _quorum_size(write_quorum, len(storage_connections))
+
     ## Setup Clients ##
     secret_clients = prep_clients(storage.SecretsClient, storage_connections)
 
@@ -608,33 +1468,144 @@ def store_secret(sec_data, sec_uid=None, tokens=None,
     if not sec_uid:
         sec_uid = uuid.uuid4()
 
-    # Setup Collection
-    if not col_uid:
-        col_uid, verifiers = setup_collection(verifiers=verifiers,
-                                              storage_connections=storage_connections,
-                                              ac_connections=ac_connections)
-
-    # Get Collection Create Tokens
-    if not tokens:
-        tokens, errors = get_tokens(constants.TYPE_COL, constants.PERM_CREATE, objuid=col_uid,
-                                    ac_connections=ac_connections)
+    # A new collection takes four create steps; request every token they
+    # need up front and each one only once
+    col_errors = {}
+    own_plan = plan is None
+    if own_plan:
+        plan = RequestPlan(token_cache=token_cache, ac_connections=ac_connections)
+    try:
+
+        # Setup Collection
+        if not col_uid:
+            col_uid = uuid.uuid4()
+            plan.request(constants.TYPE_SRV_AC, constants.PERM_CREATE)
+            plan.request(constants.TYPE_SRV_STORAGE, constants.PERM_CREATE,
+                         min_tokens=min_tokens)
+
+            # Verifiers, then Collection Permissions
+            verifiers = setup_permissions(constants.TYPE_COL, objuid=col_uid,
+                                          verifiers=verifiers, plan=plan,
+                                          use_default_verifier=use_default_verifier,
+                                          token_cache=token_cache,
+                                          ac_connections=ac_connections)
+
+            # Secret tokens can be granted once the permissions exist, so
+            # request them while the collection is created
+            if not tokens:
+                plan.request(constants.TYPE_COL, constants.PERM_CREATE, objuid=col_uid,
+                             min_tokens=min_tokens)
+            collection_clients = prep_clients(storage.CollectionsClient, storage_connections)
+            col_tokens = plan.tokens(constants.TYPE_SRV_STORAGE, constants.PERM_CREATE,
+                                     min_tokens=min_tokens)
+            # Connections stay open for the secret write that follows.
+            # Every replica's collection write is waited for, even past
+            # the quorum, as the secret write there depends on it.
+            col_errors, col_finished = _create_collection(collection_clients, col_uid,
+                                                          col_tokens, write_quorum, [],
+                                                          token_cache=token_cache,
+                                                          ac_connections=ac_connections)
+
+        # Get Collection Create Tokens
+        if not tokens:
+            tokens = plan.tokens(constants.TYPE_COL, constants.PERM_CREATE, objuid=col_uid,
+                                 min_tokens=min_tokens)
+
+    finally:
+        if own_plan:
+            plan.close()
 
     # Create Secret
     # Todo: shard
-    for client in secret_clients:
-        token_list = list(tokens.values())
+    token_list = list(tokens.values())
+
+    def _create(client):
+        # No collection on this replica to write into
+        srv_name = client.storage_connection.server_name
+        if srv_name in col_errors:
+            raise col_errors[srv_name]
         uid = client.create(token_list, col_uid, sec_data, uid=sec_uid)
         assert(uid == sec_uid)
 
+    with _tokens_rejected(token_cache, constants.TYPE_COL, constants.PERM_CREATE, col_uid):
+        write_errors, finished = _write_replicas(secret_clients, _create, write_quorum,
+                                                 storage_opened)
+
     ## Close Connections ##
     close_connections(storage_opened)
     close_connections(ac_opened)
 
     ## Return ##
-    return sec_uid, col_uid, verifiers
+    return WriteResult((sec_uid, col_uid, verifiers), write_errors, finished)
+
+def _timed_fetch(client, token_list, col_uid, sec_uid):
+
+    started = _monotonic()
+    sec = client.fetch(token_list, col_uid, sec_uid)
+    _READ_LATENCY.record(client.storage_connection.server_name, _monotonic() - started)
+    return sec
+
+def _fetch_replicas(secret_clients, token_list, col_uid, sec_uid, hedged, opened):
+
+    # Try the historically fastest replicas first
+    def _median(client):
+        return _READ_LATENCY.percentile(client.storage_connection.server_name, 50, 0)
+    remaining = sorted(secret_clients, key=_median)
+
+    # Connections in opened are closed as soon as their read is done, so
+    # slow replicas never hold up the caller. Reads already running on
+    # other connections are waited for, as the caller may close those as
+    # soon as this returns.
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(remaining) or 1)
+    pending = set()
+    borrowed = set()
+    errors = []
+
+    def _submit():
+        client = remaining.pop(0)
+        future = executor.submit(_timed_fetch, client, token_list, col_uid, sec_uid)
+        connection = client.storage_connection
+        if connection in opened:
+            opened.remove(connection)
+            future.add_done_callback(lambda f, c=connection: c.close())
+        else:
+            borrowed.add(future)
+        pending.add(future)
+        return client
 
-def fetch_secret(sec_uid, col_uid, tokens=None,
+    try:
+        if hedged:
+            last = _submit()
+        else:
+            while remaining:
+                _submit()
+        while pending:
+            timeout = None
+            if hedged and remaining:
+                timeout = _READ_LATENCY.percentile(last.storage_connection.server_name,
+                                                   _HEDGE_PERCENTILE, _HEDGE_DELAY)
+            done, not_done = concurrent.futures.wait(
+                pending, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+            pending = set(not_done)
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as err:
+                    errors.append(err)
+            if remaining and (hedged or done):
+                # Hedge a slow read, or replace a failed one
+                last = _submit()
+        raise errors[-1]
+    finally:
+        for future in pending:
+            future.cancel()
+        concurrent.futures.wait(pending & borrowed)
+        executor.shutdown(wait=False)
+
+def fetch_secret(sec_uid, col_uid, tokens=None, min_tokens=None,
+                 read_policy=READ_ALL,
                  storage_connections=None, storage_server_names=None,
+                 token_cache=None,
                  ac_connections=None, ac_server_names=None,
                  conf=None, conf_path=None,
                  account_uid=None, client_uid=None):
@@ -651,6 +1622,10 @@ def fetch_secret(sec_uid, col_uid, tokens=None,
                                           conf=conf, conf_path=conf_path,
                                           account_uid=account_uid, client_uid=client_uid)
 
+    ## Check Args ##
+    if read_policy not in _READ_POLICIES:
+        raise ValueError("read_policy must be one of '{}'".format(_READ_POLICIES))
+
     ## Setup Clients ##
     secret_clients = prep_clients(storage.SecretsClient, storage_connections)
 
@@ -662,15 +1637,24 @@ def fetch_secret(sec_uid, col_uid, tokens=None,
 
     # Get Collection read Tokens
     if not tokens:
-        tokens, errors = get_tokens(constants.TYPE_COL, constants.PERM_READ, objuid=col_uid,
-                                    ac_connections=ac_connections)
+        tokens = _plan_tokens(None, constants.TYPE_COL, constants.PERM_READ, objuid=col_uid,
+                              min_tokens=min_tokens,
+                              token_cache=token_cache,
+                              ac_connections=ac_connections)
 
     # Read Secret
     # Todo: unshard
-    for client in secret_clients:
-        token_list = list(tokens.values())
-        sec = client.fetch(token_list, col_uid, sec_uid)
-        sec_data = sec['data']
+    token_list = list(tokens.values())
+    with _tokens_rejected(token_cache, constants.TYPE_COL, constants.PERM_READ, col_uid):
+        if read_policy == READ_ALL:
+            for client in secret_clients:
+                sec = _timed_fetch(client, token_list, col_uid, sec_uid)
+                sec_data = sec['data']
+        else:
+            hedged = (read_policy == READ_HEDGED)
+            sec = _fetch_replicas(secret_clients, token_list, col_uid, sec_uid,
+                                  hedged, storage_opened)
+            sec_data = sec['data']
 
     ## Close Connections ##
     close_connections(storage_opened)
@@ -678,3 +1662,99 @@ def fetch_secret(sec_uid, col_uid, tokens=None,
 
     ## Return ##
     return str(sec_data)
+
+def _fetch_collection(secret_clients, tokens, col_uid, sec_uids):
+
+    # Read from the first storage server, falling back to the others only
+    # for the secrets it could not return
+    token_list = list(tokens.values())
+    secs = {}
+    errors = {}
+    remaining = sec_uids
+    for client in secret_clients:
+        got, errors = client.fetch_many(token_list, col_uid, remaining)
+        secs.update(got)
+        remaining = list(errors.keys())
+        if not remaining:
+            break
+    return secs, errors
+
+def fetch_secrets(secrets, min_tokens=None,
+                  storage_connections=None, storage_server_names=None,
+                  token_cache=None,
+                  ac_connections=None, ac_server_names=None,
+                  conf=None, conf_path=None,
+                  account_uid=None, client_uid=None):
+
+    ## Setup Connections ##
+    if not storage_connections:
+        storage_connections = prep_connections(storage.StorageServerConnection,
+                                               server_names=storage_server_names,
+                                               conf=conf, conf_path=conf_path,
+                                               account_uid=account_uid, client_uid=client_uid)
+    if not ac_connections:
+        ac_connections = prep_connections(accesscontrol.ACServerConnection,
+                                          server_names=ac_server_names,
+                                          conf=conf, conf_path=conf_path,
+                                          account_uid=account_uid, client_uid=client_uid)
+
+    ## Group by Collection ##
+    collections_secrets = collections.OrderedDict()
+    for col_uid, sec_uid in secrets:
+        collections_secrets.setdefault(col_uid, []).append(sec_uid)
+
+    ## Setup Clients ##
+    secret_clients = prep_clients(storage.SecretsClient, storage_connections)
+
+    ## Open Connections ##
+    storage_opened = open_connections(storage_connections)
+    ac_opened = open_connections(ac_connections)
+
+    ## Fetch Secrets ##
+    secs = {}
+    errors = {}
+    workers = min(len(collections_secrets), _MAX_WORKERS) or 1
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+
+        # Get Collection Read Tokens, one batch per AC server
+        objects = [(constants.TYPE_COL, constants.PERM_READ, col_uid)
+                   for col_uid in collections_secrets]
+        col_tokens, col_token_errors = get_tokens_many(objects, min_tokens=min_tokens,
+                                                       token_cache=token_cache,
+                                                       ac_connections=ac_connections)
+
+        # Read Secrets for every collection that got tokens
+        read_futures = {}
+        for obj in objects:
+            col_uid = obj[2]
+            sec_uids = collections_secrets[col_uid]
+            tokens = col_tokens[obj]
+            if not tokens:
+                token_errors = list(col_token_errors.get(obj, {}).values())
+                if token_errors:
+                    err = token_errors[0]
+                else:
+                    err = accesscontrol.AuthorizationFailed(col_uid, "no tokens")
+                for sec_uid in sec_uids:
+                    errors[(col_uid, sec_uid)] = err
+                continue
+            read_futures[col_uid] = executor.submit(_fetch_collection, secret_clients,
+                                                    tokens, col_uid, sec_uids)
+
+        for col_uid, future in read_futures.items():
+            col_secs, col_errors = future.result()
+            for sec_uid, sec in col_secs.items():
+                secs[(col_uid, sec_uid)] = str(sec['data'])
+            for sec_uid, err in col_errors.items():
+                errors[(col_uid, sec_uid)] = err
+            if any(_rejected(err) for err in col_errors.values()):
+                cache = _token_cache(token_cache)
+                if cache is not None:
+                    cache.invalidate(constants.TYPE_COL, constants.PERM_READ, col_uid)
+
+    ## Close Connections ##
+    close_connections(storage_opened)
+    close_connections(ac_opened)
+
+    ## Return ##
+    return secs, errors
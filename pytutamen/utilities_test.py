@@ -0,0 +1,493 @@
+# -*- coding: utf-8 -*-
+
+
+# Andy Sayler
+# 2016
+# pytutamen Package
+# Utility Function Tests
+
+
+### Imports ###
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+from builtins import *
+
+import json
+import threading
+import time
+import unittest
+import uuid
+
+import http.server
+import socketserver
+
+import requests
+
+from . import config
+from . import crypto
+from . import accesscontrol
+from . import storage
+from . import utilities
+from .accesscontrol_test import _AuthzServer, _serve, _connection
+
+
+### Stand-in Server ###
+
+class _StorageServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+
+    # Minimal storage server: answers after 'delay' seconds with 'status',
+    # keeping secrets in memory. 'served' lists each finished request.
+
+    daemon_threads = True
+
+    def __init__(self, delay=0.0, status=200):
+        http.server.HTTPServer.__init__(self, ('127.0.0.1', 0), _StorageHandler)
+        self.delay = delay
+        self.status = status
+        self.secrets = {}
+        self.served = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+class _StorageHandler(http.server.BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, obj):
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.served.append((self.command, self.path))
+        if self.server.status != 200:
+            self.send_error(self.server.status)
+            return
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length).decode('utf-8'))
+        parts = [part for part in self.path.split('/') if part]
+        uid = body.get('uid') or str(uuid.uuid4())
+        if parts[-1] == storage._KEY_COL_SEC:
+            with self.server.lock:
+                self.server.secrets[uid] = body['data']
+        self._send({parts[-1]: [uid]})
+
+    def do_GET(self):
+        parts = [part for part in self.path.split('/') if part]
+        sec_uid = parts[parts.index(storage._KEY_COL_SEC) + 1]
+        with self.server.lock:
+            data = self.server.secrets.get(sec_uid)
+        self._send({'data': data})
+
+class _BootstrapServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+
+    # Minimal AC bootstrap endpoint: signs nothing, but answers each client
+    # with a stand-in cert, or 'status' for client uids in 'fail'
+
+    daemon_threads = True
+
+    def __init__(self, status=200):
+        http.server.HTTPServer.__init__(self, ('127.0.0.1', 0), _BootstrapHandler)
+        self.status = status
+        self.fail = set()
+        self.posts = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+class _BootstrapHandler(http.server.BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length).decode('utf-8'))
+        with self.server.lock:
+            self.server.posts.append(body)
+        if (self.server.status != 200) or (body['client_uid'] in self.server.fail):
+            self.send_error(self.server.status if self.server.status != 200 else 500)
+            return
+        out = {'accounts': [body['account_uid']],
+               'clients_certs': {body['client_uid']: "CRT-{}".format(body['client_uid'])}}
+        data = json.dumps(out).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+### Helpers ###
+
+def _conf(ac_srvs=None, storage_srvs=None):
+
+    # In-memory config naming each server by its key
+    conf = config.ClientConfig(conf_path="/pytutamen_test",
+                               backend=config.MemoryConfigBackend())
+    conf.defaults_set_account_uid(uuid.uuid4())
+    conf.defaults_set_client_uid(uuid.uuid4())
+    for name, srv in (ac_srvs or {}).items():
+        conf.ac_server_set_url(name, srv.url)
+    for name, srv in (storage_srvs or {}).items():
+        conf.storage_server_set_url(name, srv.url)
+    return conf
+
+def _http_error(status):
+    res = requests.models.Response()
+    res.status_code = status
+    return requests.exceptions.HTTPError("HTTP {}".format(status), response=res)
+
+
+### Tests ###
+
+class TokenCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.srv = _serve(self, _AuthzServer())
+        self.connection = _connection(self, self.srv.url)
+
+    def test_off_by_default(self):
+        for i in range(2):
+            tokens, errors = utilities.get_tokens('collection', 'read', objuid='a',
+                                                  ac_connections=[self.connection])
+            self.assertEqual(list(tokens.keys()), ['test'])
+        self.assertEqual(len(self.srv.created), 2)
+
+    def test_opt_in(self):
+        cache = accesscontrol.TokenCache()
+        for i in range(2):
+            tokens, errors = utilities.get_tokens('collection', 'read', objuid='a',
+                                                  token_cache=cache,
+                                                  ac_connections=[self.connection])
+            self.assertEqual(list(tokens.keys()), ['test'])
+        self.assertEqual(len(self.srv.created), 1)
+        self.assertEqual(len(cache), 1)
+
+    def test_rejected(self):
+        cache = accesscontrol.TokenCache()
+        cache.put(self.connection, 'collection', 'read', 'a', 'tok-a')
+        cache.put(self.connection, 'collection', 'read', 'b', 'tok-b')
+
+        # Other failures leave the cache alone
+        with self.assertRaises(requests.exceptions.HTTPError):
+            with utilities._tokens_rejected(cache, 'collection', 'read', 'a'):
+                raise _http_error(500)
+        self.assertEqual(len(cache), 2)
+
+        # A refused token drops that permission's tokens
+        with self.assertRaises(requests.exceptions.HTTPError):
+            with utilities._tokens_rejected(cache, 'collection', 'read', 'a'):
+                raise _http_error(401)
+        self.assertIsNone(cache.get(self.connection, 'collection', 'read', 'a'))
+        self.assertEqual(cache.get(self.connection, 'collection', 'read', 'b'), 'tok-b')
+
+class GetTokensManyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(accesscontrol._BATCH_UNSUPPORTED.clear)
+        self.objects = [('collection', 'read', 'a'), ('collection', 'read', 'b'),
+                        ('collection', 'write', 'a')]
+
+    def _connections(self, *srvs):
+        return [_connection(self, srv.url, server_name="ac{}".format(idx))
+                for idx, srv in enumerate(srvs)]
+
+    def _get(self, connections, **kwargs):
+        polling = accesscontrol.PollingStrategy(initial=0.05, maximum=0.1)
+        return utilities.get_tokens_many(self.objects, polling=polling,
+                                         ac_connections=connections, **kwargs)
+
+    def test_batch(self):
+        srvs = [_serve(self, _AuthzServer()) for i in range(2)]
+        tokens, errors = self._get(self._connections(*srvs))
+        for obj in self.objects:
+            self.assertEqual(sorted(tokens[obj].keys()), ['ac0', 'ac1'])
+            self.assertEqual(errors[obj], {})
+        # One request for all objects, one poll for all authorizations
+        for srv in srvs:
+            self.assertEqual(srv.batches, [3, 3])
+
+    def test_fallback(self):
+        srv = _serve(self, _AuthzServer())
+        srv.batch_status = 404
+        tokens, errors = self._get(self._connections(srv))
+        for obj in self.objects:
+            self.assertEqual(list(tokens[obj].keys()), ['ac0'])
+        self.assertEqual(srv.batches, [3])
+        self.assertEqual(len(srv.created), 3)
+
+    def test_quorum(self):
+        # Returns once every object has its quorum, without the slow server
+        fast = _serve(self, _AuthzServer())
+        slow = _serve(self, _AuthzServer(pending=60))
+        started = time.time()
+        tokens, errors = self._get(self._connections(fast, slow), min_tokens=1)
+        self.assertLess(time.time() - started, 5)
+        for obj in self.objects:
+            self.assertEqual(list(tokens[obj].keys()), ['ac0'])
+            self.assertIsInstance(errors[obj]['ac1'], accesscontrol.AuthorizationCancelled)
+
+class RequestPlanTestCase(unittest.TestCase):
+
+    def _plan(self, pending=0.0):
+        self.srv = _serve(self, _AuthzServer(pending=pending))
+        connection = _connection(self, self.srv.url)
+        polling = accesscontrol.PollingStrategy(initial=0.05, maximum=0.1)
+        return utilities.RequestPlan(polling=polling, ac_connections=[connection])
+
+    def test_shared(self):
+        # Steps asking for the same permission share one request
+        with self._plan() as plan:
+            plan.request('collection', 'read', objuid='a')
+            first = plan.tokens('collection', 'read', objuid='a')
+            second = plan.tokens('collection', 'read', objuid='a')
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.srv.created), 1)
+
+    def test_close(self):
+        # Requests left waiting are cancelled, not waited out
+        plan = self._plan(pending=60)
+        plan.request('collection', 'read', objuid='a')
+        time.sleep(0.2)
+        started = time.time()
+        plan.close()
+        self.assertLess(time.time() - started, 2)
+        tokens, errors = plan.result('collection', 'read', objuid='a')
+        self.assertEqual(tokens, {})
+        self.assertIsInstance(errors['test'], accesscontrol.AuthorizationCancelled)
+
+class DefaultVerifierTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.srv = _serve(self, _AuthzServer())
+        self.conf = config.ClientConfig(conf_path="/pytutamen_test",
+                                        backend=config.MemoryConfigBackend())
+        self.connection = _connection(self, self.srv.url, conf=self.conf)
+        self.account_uid = self.connection.account_uid
+
+    def _setup(self, **kwargs):
+        return utilities.setup_permissions('collection', objuid=uuid.uuid4(),
+                                           ac_connections=[self.connection], **kwargs)
+
+    def test_off_by_default(self):
+        first = self._setup()
+        second = self._setup()
+        self.assertNotEqual(first, second)
+        self.assertEqual(len(self.srv.verifiers), 2)
+        self.assertIsNone(self.conf.account_get_default_verifier(self.account_uid))
+
+    def test_opt_in(self):
+        first = self._setup(use_default_verifier=True)
+        self.assertEqual(self.conf.account_get_default_verifier(self.account_uid), first[0])
+        self.assertEqual(self._setup(use_default_verifier=True), first)
+        self.assertEqual(len(self.srv.verifiers), 1)
+        self.assertEqual([perm['default'] for perm in self.srv.permissions],
+                         [[str(first[0])]] * 3)
+
+    def test_stale(self):
+        # A default the server no longer has is replaced
+        stale = uuid.uuid4()
+        self.conf.account_set_default_verifier(self.account_uid, stale)
+        verifiers = self._setup(use_default_verifier=True)
+        self.assertNotEqual(verifiers, [stale])
+        self.assertEqual(self.conf.account_get_default_verifier(self.account_uid),
+                         verifiers[0])
+
+    def test_error(self):
+        # Other failures are raised, keeping the default
+        default = uuid.uuid4()
+        self.conf.account_set_default_verifier(self.account_uid, default)
+        self.srv.verifier_status = 500
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self._setup(use_default_verifier=True)
+        self.assertEqual(self.conf.account_get_default_verifier(self.account_uid), default)
+        self.assertEqual(self.srv.verifiers, {})
+
+    def test_read_only(self):
+        # A read-only config still gets a verifier, just not a recorded one
+        environ = {'PYTUTAMEN_SRV_AC_CONF': "[test]\nurl = {}\n".format(self.srv.url)}
+        conf = config.ClientConfig(conf_path="/pytutamen_test",
+                                   backend=config.EnvConfigBackend(environ=environ))
+        self.addCleanup(conf.close)
+        connection = accesscontrol.ACServerConnection(server_name='test', conf=conf,
+                                                      account_uid=uuid.uuid4(),
+                                                      client_uid=uuid.uuid4(),
+                                                      no_client_crt=True,
+                                                      session_pool=False)
+        connection.open()
+        self.addCleanup(connection.close)
+        verifiers = utilities.setup_permissions('collection', objuid=uuid.uuid4(),
+                                                use_default_verifier=True,
+                                                ac_connections=[connection])
+        self.assertEqual(list(self.srv.verifiers.keys()), [str(verifiers[0])])
+        self.assertIsNone(conf.account_get_default_verifier(connection.account_uid))
+
+class FetchReplicasTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.fast = _serve(self, _StorageServer())
+        self.slow = _serve(self, _StorageServer(delay=0.5))
+        self.conf = _conf(storage_srvs={'fast': self.fast, 'slow': self.slow})
+        self.ac_connection = _connection(self, "http://127.0.0.1:9", server_name='ac')
+        self.col_uid = uuid.uuid4()
+        self.sec_uid = uuid.uuid4()
+        for srv in (self.fast, self.slow):
+            srv.secrets[str(self.sec_uid)] = "data"
+
+    def _fetch(self, **kwargs):
+        return utilities.fetch_secret(self.sec_uid, self.col_uid, tokens={'ac': 'tok'},
+                                      read_policy=utilities.READ_FIRST,
+                                      ac_connections=[self.ac_connection], conf=self.conf,
+                                      **kwargs)
+
+    def test_borrowed(self):
+        # Losing reads on the caller's connections finish before return
+        connections = []
+        for name in ('fast', 'slow'):
+            connection = storage.StorageServerConnection(server_name=name, conf=self.conf,
+                                                         session_pool=False)
+            connection.open()
+            self.addCleanup(connection.close)
+            connections.append(connection)
+        self.assertEqual(self._fetch(storage_connections=connections), "data")
+        self.assertEqual(len(self.slow.served), 1)
+
+    def test_opened(self):
+        # Losing reads on connections opened here are left to finish alone
+        started = time.time()
+        self.assertEqual(self._fetch(storage_server_names=['fast', 'slow']), "data")
+        self.assertLess(time.time() - started, 0.4)
+
+class WriteReplicasTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.srvs = {'fast0': _serve(self, _StorageServer()),
+                     'fast1': _serve(self, _StorageServer()),
+                     'slow': _serve(self, _StorageServer(delay=0.5, status=500))}
+        self.conf = _conf(storage_srvs=self.srvs)
+        self.ac_connection = _connection(self, "http://127.0.0.1:9", server_name='ac')
+
+    def _store(self, write_quorum=utilities.WRITE_MAJORITY, **kwargs):
+        return utilities.store_secret("data", col_uid=uuid.uuid4(), tokens={'ac': 'tok'},
+                                      write_quorum=write_quorum,
+                                      ac_connections=[self.ac_connection], conf=self.conf,
+                                      **kwargs)
+
+    def test_opened(self):
+        # Returns at the quorum; the late failure only shows in finished
+        res = self._store(storage_server_names=sorted(self.srvs))
+        self.assertEqual(res.write_errors, {})
+        final = res.finished.result(timeout=5)
+        self.assertEqual(list(final.keys()), ['slow'])
+        self.assertIsInstance(final['slow'], requests.exceptions.HTTPError)
+        self.assertEqual(res.write_errors, {})
+
+    def test_borrowed(self):
+        # Writes on the caller's connections all finish before return
+        connections = []
+        for name in sorted(self.srvs):
+            connection = storage.StorageServerConnection(server_name=name, conf=self.conf,
+                                                         session_pool=False)
+            connection.open()
+            self.addCleanup(connection.close)
+            connections.append(connection)
+        res = self._store(storage_connections=connections)
+        self.assertEqual(list(res.write_errors.keys()), ['slow'])
+        self.assertTrue(res.finished.done())
+        self.assertEqual(res.finished.result(), res.write_errors)
+
+    def test_quorum(self):
+        with self.assertRaises(utilities.WriteQuorumException):
+            self._store(storage_server_names=sorted(self.srvs),
+                        write_quorum=utilities.WRITE_ALL)
+
+class BootstrapTestCase(unittest.TestCase):
+
+    def _conf(self, status=200):
+        self.srv = _serve(self, _BootstrapServer(status=status))
+        conf = config.ClientConfig(conf_path="/pytutamen_test",
+                                   backend=config.MemoryConfigBackend())
+        conf.ac_server_set_url('ac', self.srv.url)
+        conf.defaults_set_ac_server('ac')
+        return conf
+
+    def test_account(self):
+        conf = self._conf()
+        account_uid, client_uid, client_crt = utilities.bootstrap_new_account(
+            key_type=crypto.TYPE_EC_P256, conf=conf)
+        self.assertEqual(conf.defaults_get_account_uid(), account_uid)
+        self.assertEqual(conf.defaults_get_client_uid(), client_uid)
+        self.assertTrue(conf.client_get_key(account_uid, client_uid))
+        self.assertEqual(conf.client_get_crt(account_uid, client_uid, 'ac'), client_crt)
+        with self.assertRaises(Exception):
+            utilities.bootstrap_new_account(key_type=crypto.TYPE_EC_P256, conf=conf)
+
+    def test_retry_keeps_key(self):
+        # The key is saved before the POST, so a retry offers the same one
+        conf = self._conf(status=503)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            utilities.bootstrap_new_account(key_type=crypto.TYPE_EC_P256, conf=conf)
+        account_uid = conf.defaults_get_account_uid()
+        client_uid = conf.defaults_get_client_uid()
+        key_pem = conf.client_get_key(account_uid, client_uid)
+        self.assertTrue(key_pem)
+        self.assertIsNone(conf.client_get_crt(account_uid, client_uid, 'ac'))
+
+        self.srv.status = 200
+        ret = utilities.bootstrap_new_account(key_type=crypto.TYPE_EC_P256, conf=conf)
+        self.assertEqual(ret[:2], (account_uid, client_uid))
+        self.assertEqual(conf.client_get_key(account_uid, client_uid), key_pem)
+        self.assertEqual(len(self.srv.posts), 2)
+
+    def test_accounts_errors(self):
+        # One identity failing leaves the others bootstrapped
+        conf = self._conf()
+        identities = [{'key_type': crypto.TYPE_EC_P256, 'client_uid': uuid.uuid4()}
+                      for i in range(3)]
+        self.srv.fail.add(str(identities[1]['client_uid']))
+        results, errors = utilities.bootstrap_new_accounts(identities, max_processes=1,
+                                                           conf=conf)
+        self.assertEqual(sorted(results.keys()), [0, 2])
+        self.assertEqual(list(errors.keys()), [1])
+        self.assertIsInstance(errors[1], requests.exceptions.HTTPError)
+        for idx, (account_uid, client_uid, client_crt) in results.items():
+            self.assertEqual(client_uid, identities[idx]['client_uid'])
+            self.assertEqual(conf.client_get_crt(account_uid, client_uid, 'ac'), client_crt)
+        self.assertEqual(conf.defaults_get_client_uid(), identities[0]['client_uid'])
+
+    def test_accounts_configured(self):
+        # Identities already holding a cert are reported, not posted
+        conf = self._conf()
+        done = {'account_uid': uuid.uuid4(), 'client_uid': uuid.uuid4(),
+                'key_type': crypto.TYPE_EC_P256}
+        conf.client_set_crt(done['account_uid'], done['client_uid'], 'ac', "CRT")
+        identities = [done, {'key_type': crypto.TYPE_EC_P256}]
+        results, errors = utilities.bootstrap_new_accounts(identities, max_processes=1,
+                                                           conf=conf)
+        self.assertEqual(list(results.keys()), [1])
+        self.assertEqual(list(errors.keys()), [0])
+        self.assertEqual(len(self.srv.posts), 1)
+        self.assertEqual(conf.client_get_crt(done['account_uid'], done['client_uid'], 'ac'),
+                         "CRT")